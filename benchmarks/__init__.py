@@ -0,0 +1,6 @@
+"""
+Benchmarks for the data pipeline and the dashboard callback over synthetic corpora.
+
+    python -m benchmarks --sizes 50 500 --save benchmarks/baseline.json
+    python -m benchmarks --sizes 50 500 --compare benchmarks/baseline.json
+"""
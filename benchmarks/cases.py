@@ -0,0 +1,93 @@
+"""
+Benchmark cases. Each case takes the corpus' song codes, does its untimed preparation and
+returns the function to time. Cases import the app modules lazily, since the runner only sets
+TOKAPI_DATA_DIR / TOKAPI_STORE_DIR in the child process that runs them.
+"""
+import os
+
+CASES = {}
+
+def case(name):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+def clear_caches():
+    # Every run starts cold: the process-wide series, analysis and figure caches are emptied.
+    # The memory-mapped stores stay open, as they do in a running server
+    from utils.series_cache import series_cache
+    from utils.song_graphs import analysis_cache
+    from utils.figure_cache import figure_cache
+    series_cache.clear()
+    analysis_cache.clear()
+    figure_cache.clear()
+
+@case('parse_tiktok_series_csv')
+def parse_tiktok(codes):
+    from utils.categorize_data import parse_tiktok_series_csv
+    # The parsers read paths relative to the working directory
+    os.chdir(os.environ['TOKAPI_DATA_DIR'])
+    return lambda: [parse_tiktok_series_csv(code) for code in codes]
+
+@case('parse_spotify_reach_csv')
+def parse_spotify_reach(codes):
+    from utils.categorize_data import parse_spotify_reach_csv
+    os.chdir(os.environ['TOKAPI_DATA_DIR'])
+    return lambda: [parse_spotify_reach_csv(code) for code in codes]
+
+@case('read_series_csv')
+def read_csv(codes):
+    from utils.series_store import dataset_path, read_series_csv
+    paths = [dataset_path(platform, code) for platform in ('spotify_reach', 'tiktok') for code in codes]
+    return lambda: [read_series_csv(path) for path in paths]
+
+@case('get_series')
+def get_series(codes):
+    from utils.song_graphs import get_spotify_playlist_series, get_spotify_reach_series, get_tiktok_series
+    def run():
+        for code in codes:
+            get_spotify_playlist_series(code)
+            get_spotify_reach_series(code)
+            get_tiktok_series(code)
+    return run
+
+@case('find_spikes_in_normalized_series')
+def find_spikes(codes):
+    from utils.song_graphs import find_spikes_in_normalized_series
+    return lambda: [find_spikes_in_normalized_series(code, code) for code in codes]
+
+@case('determine_causation')
+def causation(codes):
+    from utils.song_graphs import determine_causation, find_spikes_in_normalized_series
+    spikes = []
+    for code in codes:
+        (spotify_dates, _), (tiktok_dates, _) = find_spikes_in_normalized_series(code, code)
+        spikes.append((spotify_dates, tiktok_dates))
+    return lambda: [determine_causation(spotify, tiktok) for spotify, tiktok in spikes]
+
+@case('get_correlation_coefficients')
+def correlation(codes):
+    from utils.song_graphs import get_song_analysis
+    from utils.correlation import get_correlation_coefficients
+    return lambda: [get_correlation_coefficients(code, code, analysis=get_song_analysis(code, code)) for code in codes]
+
+@case('categorize_data.aggregate')
+def aggregate(codes):
+    from utils.categorize_data import aggregate
+    # One process, so the numbers don't depend on the machine's core count
+    return lambda: aggregate(codes, workers=1)
+
+@case('update_graphs')
+def update_graphs(codes):
+    # The app has to register its pages before the callback module can be imported
+    import app  # noqa: F401
+    from pages.index import update_graphs
+    return lambda: [update_graphs(code) for code in codes]
+
+@case('sweep')
+def sweep(codes):
+    from utils.sweep import sweep
+    # A 1000-point (period, sigma, window) grid in one process
+    sigmas = [0.5 + 0.25 * i for i in range(10)]
+    return lambda: sweep(codes, range(1, 11), sigmas, range(5, 51, 5), workers=1)
@@ -0,0 +1,155 @@
+"""
+Runs every benchmark case at several synthetic corpus sizes and reports, per case and size:
+
+    wall_min / wall_median  seconds per run over --repeat cold runs
+    alloc_peak              peak bytes allocated during one run (tracemalloc)
+    alloc_retained          bytes still allocated after that run
+    rss_peak / rss_growth   peak resident set size of the case's process, and how much the runs
+                            added on top of the imports and setup
+
+Each case runs in its own process so imports, caches and RSS don't leak between cases.
+
+    python -m benchmarks --sizes 50 500 --save benchmarks/baseline.json
+    python -m benchmarks --sizes 50 500 --compare benchmarks/baseline.json --threshold 0.2
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import resource
+import statistics
+import subprocess
+import tracemalloc
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+SRC = os.path.join(ROOT, 'src')
+
+def _rss_bytes():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def measure(name: str, repeat: int):
+    """Runs one case in this process against the corpus in TOKAPI_DATA_DIR."""
+    from benchmarks.cases import CASES, clear_caches
+    with open(os.path.join(os.environ['TOKAPI_DATA_DIR'], 'songs')) as f:
+        codes = f.read().splitlines()
+
+    clear_caches()
+    run = CASES[name](codes)
+    rss_setup = _rss_bytes()
+
+    times = []
+    for _ in range(repeat):
+        clear_caches()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    clear_caches()
+    tracemalloc.start()
+    result = run()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+
+    rss_peak = _rss_bytes()
+    return {
+        'wall_min': min(times),
+        'wall_median': statistics.median(times),
+        'alloc_peak': peak,
+        'alloc_retained': retained,
+        'rss_peak': rss_peak,
+        'rss_growth': rss_peak - rss_setup,
+    }
+
+def prepare_corpus(directory: str, size: int, days: int, seed: int):
+    # CSV datasets plus the packed stores, generated offline
+    from utils.synthetic_corpus import CorpusParams, write_synthetic_corpus
+    write_synthetic_corpus(directory, size, CorpusParams(days=days), seed)
+
+def corpus_env(directory: str):
+    env = dict(os.environ)
+    env.update({
+        'TOKAPI_DATA_DIR': directory,
+        'TOKAPI_STORE_DIR': os.path.join(directory, 'series_store'),
+        'TOKAPI_HTTP_CACHE_DIR': os.path.join(directory, 'http_cache'),
+        'PYTHONPATH': os.pathsep.join(filter(None, [ROOT, SRC, env.get('PYTHONPATH')])),
+    })
+    return env
+
+def run_case(directory: str, name: str, repeat: int):
+    proc = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.run', '--child', name, '--repeat', str(repeat)],
+        env=corpus_env(directory), cwd=ROOT, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"{name} failed:\n{proc.stderr}")
+    # The case may print; the measurements are on the last line
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def compare(results: dict, baseline: dict, threshold: float):
+    """Returns the (size, case, metric, before, after) rows that got worse by more than threshold."""
+    regressions = []
+    for size, cases in results.items():
+        for name, metrics in cases.items():
+            before = baseline.get(size, {}).get(name)
+            if before is None:
+                continue
+            for metric in ('wall_min', 'alloc_peak'):
+                if before[metric] and metrics[metric] > before[metric] * (1 + threshold):
+                    regressions.append((size, name, metric, before[metric], metrics[metric]))
+    return regressions
+
+def main():
+    sys.path.insert(0, SRC)
+    from benchmarks.cases import CASES
+    parser = argparse.ArgumentParser(description="Benchmark the data pipeline on synthetic corpora.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[50, 500], help="songs per corpus")
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), default=list(CASES), help="cases to run (default: all)")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per case")
+    parser.add_argument('--days', type=int, default=90, help="history length per song")
+    parser.add_argument('--seed', type=int, default=0, help="corpus seed")
+    parser.add_argument('--save', help="write the results to this JSON file")
+    parser.add_argument('--compare', help="baseline JSON file to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="relative slowdown that counts as a regression")
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.repeat)))
+        return
+
+    results = {}
+    for size in args.sizes:
+        directory = tempfile.mkdtemp(prefix=f'tokapi-bench-{size}-')
+        try:
+            prepare_corpus(directory, size, args.days, args.seed)
+            results[str(size)] = {}
+            for name in args.cases:
+                metrics = run_case(directory, name, args.repeat)
+                results[str(size)][name] = metrics
+                print(f"{size:>6} {name:<36} {metrics['wall_min'] * 1000:>10.2f} ms "
+                      f"{metrics['alloc_peak'] / 2**20:>8.2f} MB alloc {metrics['rss_peak'] / 2**20:>8.1f} MB rss")
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for size, name, metric, before, after in regressions:
+            print(f"REGRESSION {name} ({size} songs) {metric}: {before:.6g} -> {after:.6g} ({after / before - 1:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions over {args.threshold:.0%} against {args.compare}")
+
+if __name__ == "__main__":
+    main()
@@ -1,54 +1,30 @@
-import requests
 import csv
 import pandas as pd
 import matplotlib.pyplot as plt
 import os
+import sys
 import glob
+import time
+import asyncio
+import argparse
+import numpy as np
 
-def get_spotify_playlist_series(song_id: str):
-    res = requests.get(f"https://data.songstats.com/api/v1/analytics_track/{song_id}/top?source=spotify")
-
-    if res.status_code != 200:
-        return None
-    
-    parsed_data = res.json()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+from utils.series_store import DATA_DIR, append_series_csv, append_series_store, dataset_path, store_path, write_series_csv
+from utils.songstats import PLATFORM_SOURCES, fetch_track_series, parse_track_series
+from utils.songstats_crawler import CrawlJournal, CrawlProgress, SongstatsCrawler
 
-    if parsed_data['result'] == 'success':
-        track_name = parsed_data['trackInfo']['trackName']
-        artist_name = parsed_data['trackInfo']['artistName']
-        avatar = parsed_data['trackInfo']['avatar']
-        last_90_data = parsed_data['chart']['seriesData'][0]['data'][-90:]
-        return track_name, last_90_data, artist_name, avatar
+def get_spotify_playlist_series(song_id: str):
+    track = fetch_track_series(song_id, 'spotify')
+    return track.platform_record('spotify_playlist') if track else None
 
 def get_spotify_reach_series(song_id: str):
-    res = requests.get(f"https://data.songstats.com/api/v1/analytics_track/{song_id}/top?source=spotify")
+    track = fetch_track_series(song_id, 'spotify')
+    return track.platform_record('spotify_reach') if track else None
 
-    if res.status_code != 200:
-        return None
-    
-    parsed_data = res.json()
-
-    if parsed_data['result'] == 'success':
-        track_name = parsed_data['trackInfo']['trackName']
-        artist_name = parsed_data['trackInfo']['artistName']
-        avatar = parsed_data['trackInfo']['avatar']
-        last_90_data = parsed_data['chart']['seriesData'][1]['data'][-90:]
-        return track_name, last_90_data, artist_name, avatar
-    
 def get_tiktok_series(song_id: str):
-    res = requests.get(f"https://data.songstats.com/api/v1/analytics_track/{song_id}/top?source=tiktok")
-
-    if res.status_code != 200:
-        return None
-    
-    parsed_data = res.json()
-
-    if parsed_data['result'] == 'success':
-        track_name = parsed_data['trackInfo']['trackName']
-        artist_name = parsed_data['trackInfo']['artistName']
-        avatar = parsed_data['trackInfo']['avatar']
-        last_90_data = parsed_data['chart']['seriesData'][0]['data'][-90:]
-        return track_name, last_90_data, artist_name, avatar
+    track = fetch_track_series(song_id, 'tiktok')
+    return track.platform_record('tiktok') if track else None
 
 def write_csv(filename: str, data, header=["Timestamp", "Value"]):
     with open(filename, "w", newline="") as csvfile:
@@ -87,108 +63,6 @@ def plot_normalized_series(spotify_id: str, tiktok_id: str):
 #     spotify_data = get_spotify_playlist_series('njtwgzci')[1]
 #     write_csv('test.csv', spotify_data)
 
-'''
-def main():
-    with open("src/utils/songs", "r") as file:
-        codes = file.read().splitlines()
-
-    for code in codes:
-        if code == '49gk6oeq':
-            continue
-        print(f"Processing song ID: {code}")
-        series = get_spotify_reach_series(code)[1]
-        name = get_spotify_reach_series(code)[0]
-        artist = get_spotify_reach_series(code)[2]
-        avatar = get_spotify_reach_series(code)[3]
-        if series is None:
-            print(f"No data found for {code}.")
-            continue
-        if len(series) > 0:
-            filename = f"spotify_reach_series_{code}.csv"
-          # write_csv(filename, series)
-            with open(filename, "w", newline="") as file:
-                file.write(name + "\n")
-                writer = csv.writer(file)
-                writer.writerows(series)
-                file.write(artist + "\n")
-                file.write(avatar)
-            print(f"Saved Spotify Reach data for {code} to {filename}")
-        else:
-            print(f"Not enough series available for song ID {code}.")
-
-if __name__ == "__main__":
-    main()
-'''
-
-# print(get_spotify_reach_series('n5i60mse'))
-
-'''
-def main():
-    with open("src/utils/songs", "r") as file:
-        codes = file.read().splitlines()
-
-    for code in codes:
-        if code == '49gk6oeq':
-            continue
-        print(f"Processing song ID: {code}")
-        series = get_spotify_playlist_series(code)[1]
-        name = get_spotify_playlist_series(code)[0]
-        artist = get_spotify_playlist_series(code)[2]
-        avatar = get_spotify_playlist_series(code)[3]
-        if series is None:
-            print(f"No data found for {code}.")
-            continue
-        if len(series) > 0:
-            filename = f"spotify_playlist_series_{code}.csv"
-          # write_csv(filename, series)
-            with open(filename, "w", newline="") as file:
-                file.write(name + "\n")
-                writer = csv.writer(file)
-                writer.writerows(series)
-                file.write(artist + "\n")
-                file.write(avatar)
-            print(f"Saved Spotify Playlist data for {code} to {filename}")
-        else:
-            print(f"Not enough series available for song ID {code}.")
-
-if __name__ == "__main__":
-    main()
-'''
-
-'''
-def main():
-    with open("src/utils/songs", "r") as file:
-        codes = file.read().splitlines()
-
-    for code in codes:
-        if code == '49gk6oeq':
-            continue
-        print(f"Processing song ID: {code}")
-        series = get_tiktok_series(code)[1]
-        name = get_tiktok_series(code)[0]
-        artist = get_tiktok_series(code)[2]
-        avatar = get_tiktok_series(code)[3]
-        if series is None:
-            print(f"No data found for {code}.")
-            continue
-        if len(series) > 0:
-            filename = f"tiktok_series_{code}.csv"
-          # write_csv(filename, series)
-            with open(filename, "w", newline="") as file:
-                file.write(name + "\n")
-                writer = csv.writer(file)
-                writer.writerows(series)
-                file.write(artist)
-                file.write("\n" + avatar)
-            print(f"Saved Tiktok series data for {code} to {filename}")
-        else:
-            print(f"Not enough series available for song ID {code}.")
-
-if __name__ == "__main__":
-    main()
-'''
-
-
 def read_spotify_csv_files(folder):
     # Construct a file path pattern for CSV files in the folder
     csv_pattern = os.path.join(folder, '*.csv')
@@ -283,14 +157,6 @@ def parse_spotify_playlist_csv(file_id):
         print(f"Error processing {file_path}: {e}")
         return None
 
-# Example usage:
-if __name__ == "__main__":
-    result = parse_spotify_playlist_csv('nv4xpgkm')
-    if result:
-        print("Playlist Title:", result[0])
-        print("Artist:", result[2])
-        print("Image URL:", result[3])
-        print(result[1].head())
 
 
 def parse_spotify_reach_csv(file_id):
@@ -340,13 +206,6 @@ def parse_spotify_reach_csv(file_id):
         return None
 
 
-if __name__ == "__main__":
-    result = parse_spotify_reach_csv('nv4xpgkm')
-    if result:
-        print("Playlist Title:", result[0])
-        print("Artist:", result[2])
-        print("Image URL:", result[3])
-        print(result[1].head())
 
 
 
@@ -396,11 +255,112 @@ def parse_tiktok_series_csv(file_id):
         print(f"Error processing {file_path}: {e}")
         return None
 
+async def crawl(codes, journal: CrawlJournal, incremental: bool = False, **crawler_options):
+    """
+    Fetches every song's sources, one request per (song, source), and writes all datasets from
+    that single response. In incremental mode only the points newer than each CSV's last
+    timestamp are appended.
+
+    Finished units are recorded in the journal along with the datasets they changed and the
+    points they wrote to them. Units already in it are skipped, so an interrupted crawl resumes
+    where it stopped and its new points still reach the stores.
+    """
+    crawler = SongstatsCrawler(**crawler_options)
+    sources = sorted({source for source, _ in PLATFORM_SOURCES.values()})
+    units = [(code, source) for code in codes for source in sources]
+    pending = [unit for unit in units if unit not in journal]
+    progress = CrawlProgress(len(units), done=len(units) - len(pending))
+    if len(pending) < len(units):
+        print(f"Resuming: {len(units) - len(pending)} of {len(units)} units already done.")
+
+    async for code, source, parsed_data in crawler.crawl(pending):
+        progress.update()
+        if (code, source) in crawler.failed_units:
+            print(f"Failed to fetch {code} ({source}).")
+            continue
+        # {platform: [track_name, timestamps, values, artist_name, avatar]} of the points written
+        changed, written = [], {}
+        track = parse_track_series(code, source, parsed_data)
+        if track is None:
+            print(f"No data found for {code} ({source}).")
+        else:
+            records = track.platform_records(points=None if incremental else 90)
+            for platform, (track_name, data, artist_name, avatar) in records.items():
+                if not data:
+                    print(f"Not enough {platform} series available for song ID {code}.")
+                    continue
+                csv_path = dataset_path(platform, code)
+                if not incremental:
+                    write_series_csv(csv_path, track_name, data, artist_name, avatar)
+                    changed.append(platform)
+                    written[platform] = [track_name, [int(t) for t, _ in data], [float(v) for _, v in data], artist_name, avatar]
+                    continue
+                if not os.path.exists(csv_path):
+                    # First ingest of a song keeps the usual 90 day window
+                    data = data[-90:]
+                timestamps, values = append_series_csv(csv_path, track_name, data, artist_name, avatar)
+                if len(timestamps):
+                    changed.append(platform)
+                    written[platform] = [track_name, timestamps.tolist(), values.tolist(), artist_name, avatar]
+                    print(f"Appended {len(timestamps)} {platform} points for {code}")
+        journal.record(code, source, changed=changed, written=written, incremental=incremental)
+    return crawler
+
+def update_stores(journal: CrawlJournal):
+    """
+    Carries the points a crawl wrote to the CSVs (including the runs it resumed) into the
+    packed stores that exist, so the dashboard, which prefers the stores, serves them. Only
+    the songs that changed get new data versions and lose their cached analyses. A full
+    refresh replaces each song's stored points with its new window.
+    """
+    for platform in PLATFORM_SOURCES:
+        if not os.path.exists(store_path(platform)):
+            continue
+        for incremental in (False, True):
+            updates = {}
+            for (code, _), entry in journal.entries.items():
+                record = entry.get('written', {}).get(platform)
+                if record is not None and entry.get('incremental', False) == incremental:
+                    track_name, timestamps, values, artist_name, avatar = record
+                    updates[code] = (track_name, np.array(timestamps, dtype=np.int64),
+                                     np.array(values, dtype=np.float64), artist_name, avatar)
+            if updates:
+                count = append_series_store(platform, updates, replace=not incremental)
+                print(f"Updated {count} {platform} series in {store_path(platform)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Download the Songstats series of every song into the datasets.")
+    parser.add_argument('songs', nargs='?', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src/utils/songs'),
+                        help="file with one Songstats track code per line")
+    parser.add_argument('--max-in-flight', type=int, default=16, help="concurrent requests")
+    parser.add_argument('--rate', type=float, default=10.0, help="requests per second to one host")
+    parser.add_argument('--incremental', action='store_true',
+                        help="append only the points newer than the stored ones instead of rewriting every CSV")
+    parser.add_argument('--journal', default=os.path.join(DATA_DIR, 'crawl_journal.jsonl'),
+                        help="checkpoint of finished units, removed once a crawl completes")
+    parser.add_argument('--restart', action='store_true', help="ignore an existing journal and crawl everything")
+    args = parser.parse_args()
+
+    with open(args.songs, "r") as file:
+        codes = list(dict.fromkeys(code.strip() for code in file.read().splitlines() if code.strip()))
+
+    journal = CrawlJournal(args.journal)
+    if args.restart:
+        journal.remove()
+    start = time.monotonic()
+    try:
+        crawler = asyncio.run(crawl(codes, journal, args.incremental, max_in_flight=args.max_in_flight, rate_per_host=args.rate))
+    finally:
+        journal.close()
+    print(f"Crawled {len(codes)} songs in {time.monotonic() - start:.1f}s: "
+          f"{crawler.requests_sent} requests, {crawler.retried} retries, {crawler.failed} failed")
+
+    update_stores(journal)
+
+    if crawler.failed:
+        print(f"{crawler.failed} units failed; run again to retry them.")
+    else:
+        journal.remove()
 
 if __name__ == "__main__":
-    result = parse_tiktok_series_csv('nv4xpgkm')
-    if result:
-        print("Playlist Title:", result[0])
-        print("Artist:", result[2])
-        print("Image URL:", result[3])
-        print(result[1].head())
\ No newline at end of file
+    main()
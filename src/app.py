@@ -1,6 +1,14 @@
+import os
 from dash import Dash, html, dcc, Output, Input
 import dash
 import plotly.express as px
+from flask import Response, jsonify
+from utils.figure_cache import figure_cache
+from utils.warmup import Warmup
+from utils.metrics import metrics
+from utils.series_cache import series_cache
+from utils.song_graphs import analysis_cache
+from utils.http_cache import http_cache
 
 external_css = []
 external_scripts = []
@@ -24,5 +32,45 @@ app.layout = html.Div([
     'padding': '0'
 })
 
+# Optional warm-up that computes the analyses and figures of every dashboard song in the
+# background once the server starts, so the first viewers don't pay for them.
+# TOKAPI_WARMUP=1 enables it, TOKAPI_WARMUP_WORKERS sizes its thread pool and
+# TOKAPI_WARMUP_MEMORY_MB caps how much of the figure cache it may fill.
+WARMUP = os.environ.get('TOKAPI_WARMUP', '0') == '1'
+warmup = None
+
+def start_warmup():
+    global warmup
+    from pages.index import song_dict, get_song_figures
+    budget = int(os.environ.get('TOKAPI_WARMUP_MEMORY_MB', figure_cache.max_bytes // 2**20)) * 2**20
+    warmup = Warmup(
+        dict.fromkeys(song_dict.values()),
+        get_song_figures,
+        workers=int(os.environ.get('TOKAPI_WARMUP_WORKERS', 4)),
+        memory_budget=min(budget, figure_cache.max_bytes),
+        memory_used=lambda: figure_cache.bytes
+    )
+    return warmup.start()
+
+# Readiness check: 503 until the warm-up has gone through every song
+@app.server.route('/ready')
+def ready():
+    status = warmup.status() if warmup is not None else {'ready': True}
+    status['figure_cache'] = figure_cache.stats()
+    return jsonify(status), 200 if status['ready'] else 503
+
+# Prometheus scrape target: stage latency histograms and cache counters of this process.
+# TOKAPI_METRICS=0 disables the timers and the route
+for name, cache in (('series', series_cache), ('analysis', analysis_cache), ('figure', figure_cache), ('http', http_cache)):
+    metrics.register_cache(name, cache)
+
+@app.server.route('/metrics')
+def prometheus_metrics():
+    if not metrics.enabled:
+        return Response('Metrics are disabled (TOKAPI_METRICS=0).\n', status=404, mimetype='text/plain')
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 if __name__ == '__main__':
+    if WARMUP:
+        start_warmup()
     app.run_server(debug=False, host='0.0.0.0', port=8080)
\ No newline at end of file
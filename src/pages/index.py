@@ -1,12 +1,14 @@
 import dash
 from dash import html, dcc, callback, Output, Input, State
-import plotly.graph_objects as go
-import pandas as pd
 from utils.song_graphs import (
-    get_spotify_reach_series,
-    get_tiktok_series,
-    plot_normalized_series_with_spikes
+    get_series_arrays,
+    get_song_analyses,
+    plot_normalized_series_with_spikes,
+    song_data_version
 )
+from utils.detectors import DETECTORS
+from utils.figure_cache import figure_cache
+from utils.metrics import stage, timed
 from utils.time_delay import generate_time_delay_graph
 
 dash.register_page(__name__, path='/', name="Tokapi")
@@ -16,6 +18,7 @@ song_dict = {'Not Like Us': 'c7vi4fny','Runaway': 'o6czgimx', 'She Will': 'n5i60
 
 # Dropdown menu options
 dropdown_options = [{"label": song_name, "value": song_code} for song_name, song_code in song_dict.items()]
+detector_options = [{"label": detector_id, "value": detector_id} for detector_id in DETECTORS]
 # Define the hypothesis description with bold text.
 hypothesisDescription = html.Div(
     html.P([
@@ -123,106 +126,132 @@ layout = html.Div([
         value=list(song_dict.values())[0],  # Default value
         style={'width': '50%', 'margin': '0 auto'}
     ),
+    dcc.Dropdown(
+        id='detector-dropdown',
+        options=detector_options,
+        value='default',
+        clearable=False,
+        style={'width': '50%', 'margin': '10px auto 0'}
+    ),
     html.Div(id='graphs-container'),
     results,
     dcc.Store(id="playing-store", data=False),  # dcc.Store for play state
     html.Div(id='animate-dummy', style={'display': 'none'})  # dummy Div for animation callback
 ], style={'margin': '20px', 'paddingBottom': '100px', 'maxWidth': '800px', 'margin': '0 auto'})
 
-@callback(
-    Output('graphs-container', 'children'),
-    Input('song-dropdown', 'value')
-)
-def update_graphs(song_code):
-    # Get data from song_stats.py functions using the selected song_code
-    spotify_reach_result = get_spotify_reach_series(song_id=song_code)
-    tiktok_result = get_tiktok_series(song_id=song_code)
+def build_song_figures(song_code, detector_id: str = 'default'):
+    """
+    Analyzes a song with one of the registered spike detectors and builds both of its figures.
 
-    # Create dataframes from the returned series (assumes structure: [timestamp, value])
-    df_spotify_reach = pd.DataFrame(spotify_reach_result[1], columns=['timestamp', 'value'])
-    df_spotify_reach['date'] = pd.to_datetime(df_spotify_reach['timestamp'], unit='ms')
+    Returns:
+        (figure, time_delay_figure, track_name, artist_name, avatar) with the figures as
+        plain dicts, ready to send to the browser. The figures carry no animation frames: the
+        play button replays the series already in them (see animate_graphs below).
+    """
+    # Analyze the song once and share the result with both graphs
+    analysis = get_song_analyses(song_code, song_code, [detector_id])[detector_id]
+    tiktok_result = get_series_arrays('tiktok', song_code)
 
-    df_tiktok = pd.DataFrame(tiktok_result[1], columns=['timestamp', 'value'])
-    df_tiktok['date'] = pd.to_datetime(df_tiktok['timestamp'], unit='ms')
+    track_name = tiktok_result[0]
+    artist_name = tiktok_result[3]
+    avatar = tiktok_result[4]
 
-    # Normalize the y-values for each series
-    df_spotify_reach['normalized'] = df_spotify_reach['value'] / df_spotify_reach['value'].max()
-    df_tiktok['normalized'] = df_tiktok['value'] / df_tiktok['value'].max()
+    with stage('build_figure'):
+        # Create a combined Plotly figure with all series in one graph (using a line graph)
+        fig, spotify_dates, spotify_normalized, tiktok_dates, tiktok_normalized = plot_normalized_series_with_spikes(song_code, song_code, analysis)
+        fig_time_delay, spotify_dates_time_delay, spotify_normalized_time_delay, tiktok_dates_time_delay, tiktok_normalized_time_delay = generate_time_delay_graph(spotify_id=song_code, tiktok_id=song_code, analysis=analysis)
 
-    track_name = tiktok_result[0]
-    artist_name = tiktok_result[2]
-    avatar = tiktok_result[3]
+        # Define axis style with larger fonts for labels and ticks
+        axis_style = dict(
+            title_font=dict(size=22, color='black', family='Merriweather Sans'),
+            tickfont=dict(size=18, color='black', family='Merriweather Sans'),
+            showgrid=False,
+            ticks='outside',
+            ticklen=5,
+            tickwidth=2,
+            tickcolor='black'
+        )
 
-    # Create a combined Plotly figure with all series in one graph (using a line graph)
-    fig, spotify_dates, spotify_normalized, tiktok_dates, tiktok_normalized = plot_normalized_series_with_spikes(song_code, song_code)
-    fig_time_delay, spotify_dates_time_delay, spotify_normalized_time_delay, tiktok_dates_time_delay, tiktok_normalized_time_delay = generate_time_delay_graph(spotify_id=song_code, tiktok_id=song_code)
+        fig.update_layout(
+            showlegend=False,
+            xaxis=dict(
+                title='Date',
+                showline=True,
+                linecolor='black',
+                linewidth=2,
+                **axis_style
+            ),
+            yaxis=dict(
+                title='Normalized Value',
+                showline=True,
+                linecolor='black',
+                linewidth=2,
+                **axis_style,
+                range=[0,1]
+            ),
+            title=dict(
+                text=f"Song Statistics for {track_name} - {artist_name}",
+                font=dict(size=20, color='black', family='Merriweather Sans'),
+                x=0.5  # center the title
+            ),
+            plot_bgcolor='white',
+            paper_bgcolor='white',
+            width=800,
+            height=600
+        )
 
-    # Define axis style with larger fonts for labels and ticks
-    axis_style = dict(
-        title_font=dict(size=22, color='black', family='Merriweather Sans'),
-        tickfont=dict(size=18, color='black', family='Merriweather Sans'),
-        showgrid=False,
-        ticks='outside',
-        ticklen=5,
-        tickwidth=2,
-        tickcolor='black'
-    )
+        fig_time_delay.update_layout(
+            showlegend=False,
+            xaxis=dict(
+                title='Date',
+                showline=True,
+                linecolor='black',
+                linewidth=2,
+                **axis_style
+            ),
+            yaxis=dict(
+                title='Normalized Value',
+                showline=True,
+                linecolor='black',
+                linewidth=2,
+                **axis_style,
+                range=[0,1]
+            ),
+            title=dict(
+                text=f"Time Delay Analysis for {track_name} - {artist_name}",
+                font=dict(size=20, color='black', family='Merriweather Sans'),
+                x=0.5  # center the title
+            ),
+            plot_bgcolor='white',
+            paper_bgcolor='white',
+            width=800,
+            height=600
+        )
 
-    fig.update_layout(
-        showlegend=False,
-        xaxis=dict(
-            title='Date',
-            showline=True,
-            linecolor='black',
-            linewidth=2,
-            **axis_style
-        ),
-        yaxis=dict(
-            title='Normalized Value',
-            showline=True,
-            linecolor='black',
-            linewidth=2,
-            **axis_style,
-            range=[0,1]
-        ),
-        title=dict(
-            text=f"Song Statistics for {track_name} - {artist_name}",
-            font=dict(size=20, color='black', family='Merriweather Sans'),
-            x=0.5  # center the title
-        ),
-        plot_bgcolor='white',
-        paper_bgcolor='white',
-        width=800,
-        height=600
-    )
+    with stage('serialize'):
+        figure, time_delay_figure = fig.to_dict(), fig_time_delay.to_dict()
+    return figure, time_delay_figure, track_name, artist_name, avatar
 
-    fig_time_delay.update_layout(
-        showlegend=False,
-        xaxis=dict(
-            title='Date',
-            showline=True,
-            linecolor='black',
-            linewidth=2,
-            **axis_style
-        ),
-        yaxis=dict(
-            title='Normalized Value',
-            showline=True,
-            linecolor='black',
-            linewidth=2,
-            **axis_style,
-            range=[0,1]
-        ),
-        title=dict(
-            text=f"Time Delay Analysis for {track_name} - {artist_name}",
-            font=dict(size=20, color='black', family='Merriweather Sans'),
-            x=0.5  # center the title
-        ),
-        plot_bgcolor='white',
-        paper_bgcolor='white',
-        width=800,
-        height=600
-    )
+def get_song_figures(song_code, detector_id: str = 'default'):
+    # build_song_figures through the figure cache. The key holds the song's data version, so
+    # a re-ingested song gets new figures while every other song keeps its cached ones. It
+    # holds the detector itself rather than its id, so re-registering an id can't serve stale figures.
+    # Ids that aren't registered (a stale or hand-made request) get the default detector
+    if detector_id not in DETECTORS:
+        detector_id = 'default'
+    key = (song_code, song_data_version(song_code, song_code), DETECTORS[detector_id])
+    return figure_cache.get(key, lambda: build_song_figures(song_code, detector_id))
+
+@callback(
+    Output('graphs-container', 'children'),
+    Input('song-dropdown', 'value'),
+    Input('detector-dropdown', 'value')
+)
+@timed('update_graphs')
+def update_graphs(song_code, detector_id='default'):
+    # Cached figures skip the analysis and figure construction entirely. Switching detectors
+    # reuses the song's loaded and normalized series
+    fig, fig_time_delay, track_name, artist_name, avatar = get_song_figures(song_code, detector_id)
 
     # Create a custom external legend (optional)
     external_legend = html.Div([
@@ -282,73 +311,6 @@ def update_graphs(song_code):
         )
     ])
     
-    # Build animation frames (with fixed y-axis range [0,1])
-    N = len(spotify_dates)
-    frames = []
-
-    # Frame 0: start with empty data.
-    frames.append(go.Frame(
-        data=[
-            go.Scatter(x=[], y=[], mode='lines', line=dict(color='blue')),
-            go.Scatter(x=[], y=[], mode='lines', line=dict(color='red'))
-        ],
-        layout=dict(
-            xaxis=dict(visible=True),
-            yaxis=dict(visible=True, range=[0,1])
-        ),
-        name='frame0'
-    ))
-
-    # Frames 1..N: gradually add data points for both traces.
-    for i in range(1, N+1):
-        frames.append(go.Frame(
-            data=[
-                go.Scatter(
-                    x=spotify_dates[:i],
-                    y=spotify_normalized[:i],
-                    mode='lines',
-                    line=dict(color='blue')
-                ),
-                go.Scatter(
-                    x=tiktok_dates[:i],
-                    y=tiktok_normalized[:i],
-                    mode='lines',
-                    line=dict(color='red')
-                )
-            ],
-            name=f'frame{i}'
-        ))
-
-    fig.frames = frames
-    fig_time_delay.frames = frames
-
-    # Remove update menu from figure; animation will now be triggered via the play button.
-
-    # Clientside callback to trigger animation when the play state (via playing-store) becomes True.
-    dash.clientside_callback(
-        """
-        function(playing) {
-            if (playing) {
-                // Locate the actual Plotly plot within the dcc.Graph container.
-                var graphDiv = document.getElementById('graph').getElementsByClassName('js-plotly-plot')[0];
-                var graphTimeDelayDiv = document.getElementById('graph-time-delay').getElementsByClassName('js-plotly-plot')[0];
-                if(graphDiv && graphTimeDelayDiv){
-                    Plotly.animate(graphDiv, null, {
-                        frame: {duration: 50, redraw: true},
-                        transition: {duration: 500, easing: 'cubic-in-out'}
-                    });
-                    Plotly.animate(graphTimeDelayDiv, null, {
-                        frame: {duration: 50, redraw: true},
-                        transition: {duration: 500, easing: 'cubic-in-out'}
-                    });
-                }
-            }
-            return "";
-        }
-        """,
-        Output('animate-dummy', 'children'),
-        Input('playing-store', 'data')
-    )
     # Add a dcc.Store for tracking play state
     store = dcc.Store(id="playing-store", data=False)
     animate_dummy = html.Div(id='animate-dummy', style={'display': 'none'})
@@ -450,28 +412,61 @@ def update_avatar(playing):
         base_style["animation"] = "none"
     return base_style
 
-# Clientside callback to trigger animation when the play state (via playing-store) becomes True.
+# Clientside callback that animates both graphs when the play state (via playing-store) becomes True.
+# The figures are sent once with their full series; the animation clears the Spotify and TikTok
+# traces (0 and 1) and extends them one point per tick, so the response stays O(N).
 dash.clientside_callback(
     """
-    function(playing) {
-        if (playing) {
+    function animate_graphs(playing) {
+        if (!playing) {
+            return "";
+        }
+        ['graph', 'graph-time-delay'].forEach(function(id) {
             // Locate the actual Plotly plot within the dcc.Graph container.
-            var graphDiv = document.getElementById('graph').getElementsByClassName('js-plotly-plot')[0];
-            var graphTimeDelayDiv = document.getElementById('graph-time-delay').getElementsByClassName('js-plotly-plot')[0];
-            if(graphDiv && graphTimeDelayDiv){
-                Plotly.animate(graphDiv, null, {
-                    frame: {duration: 50, redraw: true},
-                    transition: {duration: 500, easing: 'cubic-in-out'}
-                });
-                Plotly.animate(graphTimeDelayDiv, null, {
-                    frame: {duration: 50, redraw: true},
-                    transition: {duration: 500, easing: 'cubic-in-out'}
+            var container = document.getElementById(id);
+            var gd = container && container.getElementsByClassName('js-plotly-plot')[0];
+            if (!gd) {
+                return;
+            }
+            // Keep the full series of the running animation, or read them from the figure
+            if (gd._tokapiTimer) {
+                clearInterval(gd._tokapiTimer);
+            } else {
+                gd._tokapiSeries = [0, 1].map(function(i) {
+                    return {
+                        x: Array.prototype.slice.call(gd._fullData[i].x),
+                        y: Array.prototype.slice.call(gd._fullData[i].y)
+                    };
                 });
             }
-        }
+            var series = gd._tokapiSeries;
+            var length = Math.max(series[0].x.length, series[1].x.length);
+            Plotly.restyle(gd, {x: [[], []], y: [[], []]}, [0, 1]);
+
+            var point = 0;
+            gd._tokapiTimer = setInterval(function() {
+                // Stop at the end, or when the graph was replaced by another song's figure
+                if (point >= length || gd.data[0].x.length !== Math.min(point, series[0].x.length)) {
+                    clearInterval(gd._tokapiTimer);
+                    gd._tokapiTimer = null;
+                    return;
+                }
+                var update = {x: [], y: []};
+                var traces = [];
+                series.forEach(function(trace, i) {
+                    if (point < trace.x.length) {
+                        update.x.push([trace.x[point]]);
+                        update.y.push([trace.y[point]]);
+                        traces.push(i);
+                    }
+                });
+                Plotly.extendTraces(gd, update, traces);
+                point += 1;
+            }, 50);
+        });
         return "";
     }
     """,
     Output('animate-dummy', 'children'),
     Input('playing-store', 'data')
-)
\ No newline at end of file
+)
@@ -0,0 +1,110 @@
+"""
+Production entry point: preloads the series stores and the dashboard caches once, then forks
+worker processes that serve the Dash app from a shared listening socket.
+
+    python src/serve.py --workers 4 --port 8080
+
+The packed series stores are memory-mapped, so every worker reads the same page-cache pages.
+The warmed analyses and figures are ordinary heap objects inherited copy-on-write.
+gc.freeze() keeps the garbage collector from writing to the pages holding them, but reference
+counting still does: every cache hit a worker serves copies the pages of the objects it
+touches. Only the stores stay shared for the life of a worker; the warm caches save each
+worker the compute, and their memory is shared only until they are read.
+"""
+import os
+import gc
+import sys
+import signal
+import socket
+import argparse
+from werkzeug.serving import make_server
+
+def preload(warm: bool = True):
+    # Import the app (which registers the pages), map every store and fill the caches
+    import app
+    from utils.series_store import PLATFORMS, open_series_store
+    for platform in PLATFORMS:
+        open_series_store(platform)
+    if warm:
+        warmup = app.start_warmup()
+        warmup.wait()
+        print(f"Warmed {warmup.warmed} songs ({warmup.skipped} skipped, {warmup.failed} failed)")
+    return app.app.server
+
+def listen(host: str, port: int, backlog: int = 128):
+    sock = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+def serve_worker(server_app, sock: socket.socket):
+    # Connections pooled while preloading belong to the parent
+    from utils.http_cache import http_session
+    for adapter in http_session.adapters.values():
+        adapter.close()
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    host, port = sock.getsockname()[:2]
+    server = make_server(host, port, server_app, threaded=True, fd=sock.fileno())
+    server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the dashboard from preloaded, forked workers.")
+    parser.add_argument('--host', default=os.environ.get('TOKAPI_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('TOKAPI_PORT', 8080)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('TOKAPI_WORKERS', os.cpu_count() or 1)))
+    parser.add_argument('--no-warmup', action='store_true', help="skip computing the song caches before forking")
+    args = parser.parse_args()
+
+    server_app = preload(warm=not args.no_warmup)
+    sock = listen(args.host, args.port)
+
+    # Move everything loaded so far out of the collector's reach, so collections in the workers
+    # don't copy it (refcount updates on objects they read still do)
+    gc.collect()
+    gc.freeze()
+
+    workers = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            try:
+                serve_worker(server_app, sock)
+            finally:
+                os._exit(0)
+        workers.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(args.workers):
+        spawn()
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} workers")
+
+    # Replace workers that die until asked to stop
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        workers.discard(pid)
+        if not stopping:
+            print(f"Worker {pid} exited with status {status}; starting a new one")
+            spawn()
+    sock.close()
+    sys.exit(0)
+
+if __name__ == '__main__':
+    main()
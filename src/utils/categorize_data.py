@@ -1,14 +1,12 @@
 import os
+import argparse
 from datetime import datetime
 import pandas as pd
 import statistics
 
-from song_graphs import (
-    get_spotify_reach_series,
-    get_tiktok_series,
-    find_spikes_in_normalized_series,
-    determine_causation
-)
+from utils.song_graphs import get_song_analysis
+from utils.corpus import run_corpus
+from utils.detectors import DETECTORS, SpikeDetector, resolve_detectors
 
 def parse_tiktok_series_csv(file_id):
     # Construct file name and full file path
@@ -103,100 +101,109 @@ def parse_spotify_reach_csv(file_id):
         return None
 
 def categorize_data(spotify_id: str, tiktok_id: str):
-    spotify_data = get_spotify_reach_series(spotify_id)[1]
-    tiktok_data = get_tiktok_series(tiktok_id)[1]
-
-    if spotify_data is None or tiktok_data is None:
+    # Returns ([(coef, delay)] where Spotify spiked first, [(coef, delay)] where TikTok spiked first)
+    analysis = get_song_analysis(spotify_id, tiktok_id)
+    if analysis is None:
         print("Error fetching one or both data series.")
-
-    # Extract timestamps and values (assumes [timestamp, value] structure)
-    spotify_timestamps = [entry[0] for entry in spotify_data]
-    tiktok_timestamps = [entry[0] for entry in tiktok_data]
-    spotify_values = [entry[1] for entry in spotify_data]
-    tiktok_values = [entry[1] for entry in tiktok_data]
-
-    # Convert timestamps to datetime objects (assuming epoch in ms)
-    spotify_dates = pd.to_datetime(spotify_timestamps, unit='ms')
-    tiktok_dates = pd.to_datetime(tiktok_timestamps, unit='ms')
-
-    # Normalize the values
-    def min_max_normalize(lst):
-        if not lst:
-            return []
-        min_val = min(lst)
-        max_val = max(lst)
-        # Adding a small constant to avoid division by zero
-        return [(x - min_val) / (max_val - min_val + 1e-8) for x in lst]
-
-    spotify_normalized = min_max_normalize(spotify_values)
-    tiktok_normalized = min_max_normalize(tiktok_values)
-
-    # Find spikes
-    (spotify_spike_dates, spotify_spike_values), (tiktok_spike_dates, tiktok_spike_values) = find_spikes_in_normalized_series(spotify_id, tiktok_id)
-
-    causation = determine_causation(spotify_spike_dates, tiktok_spike_dates)
-    
-    spotify_first = []
-    tiktok_first = []
-    
-    for (start_spike, start_type, end_spike, end_type) in causation:
-        if start_type == 'spotify':
-            start_val = next(v for d, v in zip(spotify_dates, spotify_normalized) if d == start_spike[0])
-            end_val = next(v for d, v in zip(tiktok_dates, tiktok_normalized) if d == end_spike[1])
-            tiktok_change = end_val - next(v for d, v in zip(tiktok_dates, tiktok_normalized) if d == end_spike[0])
-            spotify_change = next(v for d, v in zip(spotify_dates, spotify_normalized) if d == start_spike[1]) - start_val
-            spotify_first.append((tiktok_change / spotify_change, abs((end_spike[0] - start_spike[0]).days)))
-        else:
-            start_val = next(v for d, v in zip(tiktok_dates, tiktok_normalized) if d == start_spike[0])
-            end_val = next(v for d, v in zip(spotify_dates, spotify_normalized) if d == end_spike[1])
-            spotify_change = end_val - next(v for d, v in zip(spotify_dates, spotify_normalized) if d == end_spike[0])
-            tiktok_change = next(v for d, v in zip(tiktok_dates, tiktok_normalized) if d == start_spike[1]) - start_val
-            tiktok_first.append((spotify_change / tiktok_change, abs((start_spike[0] - end_spike[0]).days)))
-            
-    return spotify_first, tiktok_first
-
-# Calculate averages and standard deviations over all songs
-current_dir = os.path.dirname(os.path.abspath(__file__))
-songs_file_path = os.path.join(current_dir, "songs")
-
-with open(songs_file_path) as file:
-    codes = file.read().splitlines()
-
-spot_delay_values = []
-tik_delay_values = []
-spot_coef_values = []
-tik_coef_values = []
-
-for code in codes:
-    all_data = categorize_data(code, code)
-    # all_data[0] corresponds to cases where Spotify spiked first,
-    # and all_data[1] corresponds to cases where TikTok spiked first.
-    for (coef, delay) in all_data[0]:
+        return [], []
+    return analysis.spotify_first, analysis.tiktok_first
+
+def summarize(spotify_first, tiktok_first):
+    """
+    Averages and standard deviations of the coefficients and time delays of (coef, delay)
+    lists, split by which platform spiked first.
+
+    Returns:
+        {'spotify_delay': (avg, std), 'tiktok_delay': ..., 'spotify_coef': ..., 'tiktok_coef': ...}
+    """
+    spot_delay_values = []
+    tik_delay_values = []
+    spot_coef_values = []
+    tik_coef_values = []
+
+    # spotify_first corresponds to cases where Spotify spiked first,
+    # and tiktok_first corresponds to cases where TikTok spiked first.
+    for (coef, delay) in spotify_first:
         spot_coef_values.append(coef)
         spot_delay_values.append(delay)
-    for (coef, delay) in all_data[1]:
+    for (coef, delay) in tiktok_first:
         tik_coef_values.append(coef)
         tik_delay_values.append(delay)
 
-# Compute averages and standard deviations
-avg_spot_delay = sum(spot_delay_values) / len(spot_delay_values) if spot_delay_values else 0
-std_spot_delay = statistics.stdev(spot_delay_values) if len(spot_delay_values) > 1 else 0
-
-avg_tik_delay = sum(tik_delay_values) / len(tik_delay_values) if tik_delay_values else 0
-std_tik_delay = statistics.stdev(tik_delay_values) if len(tik_delay_values) > 1 else 0
-
-avg_spot_coef = sum(spot_coef_values) / len(spot_coef_values) if spot_coef_values else 0
-std_spot_coef = statistics.stdev(spot_coef_values) if len(spot_coef_values) > 1 else 0
-
-avg_tik_coef = sum(tik_coef_values) / len(tik_coef_values) if tik_coef_values else 0
-std_tik_coef = statistics.stdev(tik_coef_values) if len(tik_coef_values) > 1 else 0
-
-print('Spotify Average Time Delay:', avg_spot_delay)
-print('Spotify Time Delay Standard Deviation:', std_spot_delay)
-print('TikTok Average Time Delay:', avg_tik_delay)
-print('TikTok Time Delay Standard Deviation:', std_tik_delay)
-
-print('Spotify Average Coef:', avg_spot_coef)
-print('Spotify Coef Standard Deviation:', std_spot_coef)
-print('TikTok Average Coef:', avg_tik_coef)
-print('TikTok Coef Standard Deviation:', std_tik_coef)
\ No newline at end of file
+    # Compute averages and standard deviations
+    avg_spot_delay = sum(spot_delay_values) / len(spot_delay_values) if spot_delay_values else 0
+    std_spot_delay = statistics.stdev(spot_delay_values) if len(spot_delay_values) > 1 else 0
+
+    avg_tik_delay = sum(tik_delay_values) / len(tik_delay_values) if tik_delay_values else 0
+    std_tik_delay = statistics.stdev(tik_delay_values) if len(tik_delay_values) > 1 else 0
+
+    avg_spot_coef = sum(spot_coef_values) / len(spot_coef_values) if spot_coef_values else 0
+    std_spot_coef = statistics.stdev(spot_coef_values) if len(spot_coef_values) > 1 else 0
+
+    avg_tik_coef = sum(tik_coef_values) / len(tik_coef_values) if tik_coef_values else 0
+    std_tik_coef = statistics.stdev(tik_coef_values) if len(tik_coef_values) > 1 else 0
+
+    return {
+        'spotify_delay': (avg_spot_delay, std_spot_delay),
+        'tiktok_delay': (avg_tik_delay, std_tik_delay),
+        'spotify_coef': (avg_spot_coef, std_spot_coef),
+        'tiktok_coef': (avg_tik_coef, std_tik_coef),
+    }
+
+def aggregate(codes, workers: int = None, chunk_size: int = 500, detectors=None):
+    """
+    summarize() over a corpus for each detector (ids from utils.detectors.DETECTORS, or an
+    {id: SpikeDetector} dict; the default detector when None). All detectors run over the same
+    loaded and normalized series.
+
+    Returns:
+        {detector_id: {'spotify_delay': (avg, std), 'tiktok_delay': ..., 'spotify_coef': ..., 'tiktok_coef': ...}}
+    """
+    results = run_corpus(codes, workers=workers, chunk_size=chunk_size, detectors=detectors)
+    return {detector_id: summarize(spotify_first, tiktok_first)
+            for detector_id, (spotify_first, tiktok_first) in results.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate C and t_d over every song in utils/songs.")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument('--chunk-size', type=int, default=500, help="songs per worker task")
+    parser.add_argument('--detector', action='append', choices=sorted(DETECTORS), dest='detectors',
+                        help="registered spike detector to aggregate with; repeat to compare several (default: default)")
+    parser.add_argument('--baseline-window', type=int, default=None,
+                        help="add a 'custom' detector with thresholds over this many trailing days")
+    parser.add_argument('--robust', action='store_true', help="make the 'custom' detector use median/MAD thresholds")
+    args = parser.parse_args()
+
+    detectors = resolve_detectors(args.detectors) if args.detectors else {}
+    if args.baseline_window or args.robust:
+        detectors['custom'] = SpikeDetector(baseline_window=args.baseline_window, robust=args.robust)
+    detectors = detectors or resolve_detectors(None)
+
+    # Calculate averages and standard deviations over all songs
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    songs_file_path = os.path.join(current_dir, "songs")
+
+    with open(songs_file_path) as file:
+        codes = file.read().splitlines()
+
+    for detector_id, stats in aggregate(codes, workers=args.workers, chunk_size=args.chunk_size, detectors=detectors).items():
+        avg_spot_delay, std_spot_delay = stats['spotify_delay']
+        avg_tik_delay, std_tik_delay = stats['tiktok_delay']
+        avg_spot_coef, std_spot_coef = stats['spotify_coef']
+        avg_tik_coef, std_tik_coef = stats['tiktok_coef']
+
+        if len(detectors) > 1:
+            print(f'[{detector_id}] {detectors[detector_id]}')
+        print('Spotify Average Time Delay:', avg_spot_delay)
+        print('Spotify Time Delay Standard Deviation:', std_spot_delay)
+        print('TikTok Average Time Delay:', avg_tik_delay)
+        print('TikTok Time Delay Standard Deviation:', std_tik_delay)
+
+        print('Spotify Average Coef:', avg_spot_coef)
+        print('Spotify Coef Standard Deviation:', std_spot_coef)
+        print('TikTok Average Coef:', avg_tik_coef)
+        print('TikTok Coef Standard Deviation:', std_tik_coef)
+
+# Run from src/: python -m utils.categorize_data --workers 8 --detector default --detector robust30
+if __name__ == "__main__":
+    main()
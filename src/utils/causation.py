@@ -0,0 +1,140 @@
+#%%
+import numpy as np
+
+# Platform codes used in the pairing arrays
+SPOTIFY = 0
+TIKTOK = 1
+PLATFORM_NAMES = ('spotify', 'tiktok')
+
+def pair_spikes_batch(spotify_groups, spotify_starts, spotify_ends,
+                      tiktok_groups, tiktok_starts, tiktok_ends, window: int = 20):
+    """
+    Pairs Spotify and TikTok spikes for many groups (songs) at once. Starts, ends and the window
+    are int64 stamps in one unit, e.g. day numbers.
+
+    Within each group the spikes of both platforms are merged into one list sorted by
+    (start, end, platform) and walked in order. Two adjacent spikes form a pair when they are
+    from different platforms and the second starts within `window` of the first one's end,
+    unless either start time was already used by an earlier pair.
+
+    Returns:
+        (groups, leads, spotify_index, tiktok_index) arrays with one entry per pair: the group,
+        the platform that spiked first (SPOTIFY or TIKTOK) and the index of each spike in its
+        platform's input arrays.
+    """
+    _, groups, leads, spotify_index, tiktok_index = pair_spikes_windows(
+        spotify_groups, spotify_starts, spotify_ends, tiktok_groups, tiktok_starts, tiktok_ends, [window]
+    )
+    return groups, leads, spotify_index, tiktok_index
+
+def pair_spikes_windows(spotify_groups, spotify_starts, spotify_ends,
+                        tiktok_groups, tiktok_starts, tiktok_ends, windows):
+    """
+    pair_spikes_batch for several windows at once. The spikes are merged and sorted, and their
+    adjacent cross-platform pairs found, once; each window only filters those by their gap.
+
+    Returns:
+        (window_index, groups, leads, spotify_index, tiktok_index) arrays with one entry per pair,
+        ordered by window and holding, for windows[window_index], what pair_spikes_batch returns.
+    """
+    groups = np.concatenate((np.asarray(spotify_groups, dtype=np.int64), np.asarray(tiktok_groups, dtype=np.int64)))
+    starts = np.concatenate((np.asarray(spotify_starts, dtype=np.int64), np.asarray(tiktok_starts, dtype=np.int64)))
+    ends = np.concatenate((np.asarray(spotify_ends, dtype=np.int64), np.asarray(tiktok_ends, dtype=np.int64)))
+    n_spotify = len(spotify_starts)
+    platforms = np.concatenate((np.full(n_spotify, SPOTIFY), np.full(len(tiktok_starts), TIKTOK)))
+    source_index = np.concatenate((np.arange(n_spotify), np.arange(len(tiktok_starts))))
+
+    # Merge both platforms' spikes in (group, start, end, platform) order
+    order = np.lexsort((platforms, ends, starts, groups))
+    groups, starts, ends = groups[order], starts[order], ends[order]
+    platforms, source_index = platforms[order], source_index[order]
+
+    # Adjacent spikes of different platforms, and how long after the first one's end the second starts
+    adjacent = np.flatnonzero((groups[1:] == groups[:-1]) & (platforms[1:] != platforms[:-1]))
+    gaps = starts[adjacent + 1] - ends[adjacent]
+
+    # Starts are sorted within a group, so a candidate only clashes with the previous pair when
+    # its start equals the latest used start time, i.e. the start of that pair's second spike.
+    # Number the runs of equal (group, start): candidate k then spans runs first_run[k]..second_run[k],
+    # and is taken when first_run[k] is past the second run of the last pair taken
+    runs = np.concatenate(([0], np.cumsum((groups[1:] != groups[:-1]) | (starts[1:] != starts[:-1]))))
+
+    # Seeded with an empty array, so an empty windows list gives no pairs
+    window_index = [np.empty(0, dtype=np.int64)]
+    chosen = [np.empty(0, dtype=np.int64)]
+    for i, window in enumerate(windows):
+        candidates = adjacent[gaps <= window]
+        taken = candidates[_unclashed(runs[candidates], runs[candidates + 1])]
+        window_index.append(np.full(len(taken), i, dtype=np.int64))
+        chosen.append(taken)
+    window_index = np.concatenate(window_index)
+    chosen = np.concatenate(chosen)
+
+    leads = platforms[chosen]
+    first, second = source_index[chosen], source_index[chosen + 1]
+    spotify_index = np.where(leads == SPOTIFY, first, second)
+    tiktok_index = np.where(leads == SPOTIFY, second, first)
+    return window_index, groups[chosen], leads, spotify_index, tiktok_index
+
+def _unclashed(first_run, second_run):
+    # Which candidates the walk takes, given the runs each one spans. A candidate that starts past
+    # the previous candidate's second run is always taken, and starts a segment. Within a
+    # segment each candidate begins where the previous one ended, so the taken ones alternate,
+    # unless both spikes of a candidate start together
+    free = np.ones(len(first_run), dtype=bool)
+    free[1:] = first_run[1:] > second_run[:-1]
+    bounds = np.append(np.flatnonzero(free), len(first_run))
+    segments = np.cumsum(free) - 1
+    taken = (np.arange(len(first_run)) - bounds[segments]) % 2 == 0
+
+    # Segments with such ties are walked in order
+    tied = np.unique(segments[first_run == second_run]).tolist()
+    if tied:
+        first_list, second_list = first_run.tolist(), second_run.tolist()
+        for segment in tied:
+            last = -1
+            for k in range(bounds[segment], bounds[segment + 1]):
+                taken[k] = first_list[k] > last
+                if taken[k]:
+                    last = second_list[k]
+    return taken
+
+def pair_spikes(spotify_starts, spotify_ends, tiktok_starts, tiktok_ends, window: int = 20):
+    """
+    pair_spikes_batch for a single song.
+
+    Returns:
+        (leads, spotify_index, tiktok_index) arrays with one entry per pair.
+    """
+    _, leads, spotify_index, tiktok_index = pair_spikes_batch(
+        np.zeros(len(spotify_starts), dtype=np.int64), spotify_starts, spotify_ends,
+        np.zeros(len(tiktok_starts), dtype=np.int64), tiktok_starts, tiktok_ends, window
+    )
+    return leads, spotify_index, tiktok_index
+
+def pair_metrics(leads, spotify_change, tiktok_change, spotify_start, tiktok_start):
+    """
+    Coefficient and delay of each pair, all arguments gathered per pair: the normalized change
+    across each platform's spike and the start stamp of each spike.
+
+    The coefficient is the change of the following spike divided by the change of the leading
+    spike (NaN when the leading spike is flat) and the delay is the distance between the starts.
+    """
+    spotify_leads = np.asarray(leads) == SPOTIFY
+    lead_change = np.where(spotify_leads, spotify_change, tiktok_change)
+    follow_change = np.where(spotify_leads, tiktok_change, spotify_change)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        coefficients = np.where(lead_change != 0, follow_change / lead_change, np.nan)
+    delays = np.abs(np.asarray(tiktok_start) - np.asarray(spotify_start))
+    return coefficients, delays
+
+def causation_pairs(spotify_spikes, tiktok_spikes, leads, spotify_index, tiktok_index):
+    # Converts pairing arrays to [(start_spike, start_type, end_spike, end_type)]
+    causation = []
+    for lead, s, t in zip(leads.tolist(), spotify_index.tolist(), tiktok_index.tolist()):
+        if lead == SPOTIFY:
+            causation.append((spotify_spikes[s], 'spotify', tiktok_spikes[t], 'tiktok'))
+        else:
+            causation.append((tiktok_spikes[t], 'tiktok', spotify_spikes[s], 'spotify'))
+    return causation
+# %%
@@ -0,0 +1,109 @@
+#%%
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from utils.song_graphs import get_series_arrays
+from utils.series_store import align_series, open_series_store
+from utils.detectors import PreparedMatrix, SpikeDetector, resolve_detectors
+from utils.causation import SPOTIFY, pair_metrics, pair_spikes_batch
+
+def corpus_matrix(platform: str, codes):
+    # (days, matrix, mask) for `codes`, read from the packed store where it has the song
+    store = open_series_store(platform)
+    series_list = []
+    for code in codes:
+        series = store.series(code) if store is not None else None
+        if series is None:
+            record = get_series_arrays(platform, code)
+            series = None if record is None else (record[1], record[2])
+        series_list.append(series)
+    return align_series(series_list)
+
+def corpus_spikes(days, prepared: PreparedMatrix, detector: SpikeDetector = SpikeDetector()):
+    """
+    Spike intervals of every song in an aligned, prepared matrix.
+
+    Returns:
+        (songs, start_days, end_days, changes) with one entry per interval, where changes is the
+        normalized value at the end of the interval minus the value at its start.
+    """
+    songs, starts, ends = detector.batch_intervals(prepared)
+    changes = prepared.normalized[songs, ends] - prepared.normalized[songs, starts]
+    return songs, days[prepared.columns[songs, starts]], days[prepared.columns[songs, ends]], changes
+
+def corpus_pairs(spotify_matrix, tiktok_matrix, detector: SpikeDetector = SpikeDetector()):
+    """
+    Runs the spike, causation and coefficient pipeline for every song at once. Both arguments
+    are (days, PreparedMatrix) tuples with the same song rows.
+
+    Returns:
+        (songs, leads, coefficients, delays) arrays with one entry per causation pair.
+    """
+    s_songs, s_start, s_end, s_change = corpus_spikes(*spotify_matrix, detector)
+    t_songs, t_start, t_end, t_change = corpus_spikes(*tiktok_matrix, detector)
+    songs, leads, spotify_index, tiktok_index = pair_spikes_batch(
+        s_songs, s_start, s_end, t_songs, t_start, t_end, detector.window_days
+    )
+    coefficients, delays = pair_metrics(
+        leads, s_change[spotify_index], t_change[tiktok_index], s_start[spotify_index], t_start[tiktok_index]
+    )
+    return songs, leads, coefficients, delays
+
+def prepare_corpus(platform: str, codes):
+    # (days, PreparedMatrix) of corpus_matrix, normalized once for every detector
+    days, matrix, mask = corpus_matrix(platform, codes)
+    return days, PreparedMatrix(matrix, mask)
+
+def categorize_corpus(codes, detectors=None):
+    """
+    categorize_data for a list of song codes (used as both the Spotify and TikTok id), for each
+    detector (anything resolve_detectors accepts). The series are loaded, aligned and
+    normalized once and every detector runs over the same matrices.
+
+    Returns:
+        {detector_id: (spotify_first, tiktok_first)} lists of (coef, delay) over all songs.
+    """
+    spotify_matrix = prepare_corpus('spotify_reach', codes)
+    tiktok_matrix = prepare_corpus('tiktok', codes)
+    results = {}
+    for detector_id, detector in resolve_detectors(detectors).items():
+        songs, leads, coefficients, delays = corpus_pairs(spotify_matrix, tiktok_matrix, detector)
+        keep = ~np.isnan(coefficients)
+        spotify_first = keep & (leads == SPOTIFY)
+        tiktok_first = keep & (leads != SPOTIFY)
+        results[detector_id] = (list(zip(coefficients[spotify_first].tolist(), delays[spotify_first].tolist())),
+                                list(zip(coefficients[tiktok_first].tolist(), delays[tiktok_first].tolist())))
+    return results
+
+def _categorize_chunk(args):
+    # Worker entry point. Only song codes and detectors are pickled; each worker opens the
+    # memory-mapped store itself, so the series pages are shared through the OS page cache
+    codes, detectors = args
+    return categorize_corpus(codes, detectors)
+
+def run_corpus(codes, workers: int = None, chunk_size: int = 500, detectors=None):
+    """
+    categorize_corpus sharded across a process pool. The song list is split into chunks of
+    `chunk_size` codes that are analyzed in `workers` processes (one per core by default), and
+    the per-chunk (coef, delay) lists are merged in song order.
+
+    Returns:
+        {detector_id: (spotify_first, tiktok_first)} lists of (coef, delay) over all songs.
+    """
+    workers = workers or os.cpu_count() or 1
+    detectors = resolve_detectors(detectors)
+    chunks = [(codes[i:i + chunk_size], detectors) for i in range(0, len(codes), chunk_size)]
+    if workers == 1 or len(chunks) <= 1:
+        results = list(map(_categorize_chunk, chunks))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            results = list(pool.map(_categorize_chunk, chunks))
+
+    merged = {detector_id: ([], []) for detector_id in detectors}
+    for result in results:
+        for detector_id, (chunk_spotify_first, chunk_tiktok_first) in result.items():
+            spotify_first, tiktok_first = merged[detector_id]
+            spotify_first.extend(chunk_spotify_first)
+            tiktok_first.extend(chunk_tiktok_first)
+    return merged
+# %%
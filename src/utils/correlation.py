@@ -1,15 +1,10 @@
 #%%
-from .song_graphs import (
-    get_spotify_reach_series,
-    get_tiktok_series,
-    find_spikes_in_normalized_series
-)
+from .song_graphs import SongAnalysis, get_song_analysis
 from datetime import datetime
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
-import pandas as pd
 
-def get_correlation_coefficients(spotify_id: str, tiktok_id: str):
+def get_correlation_coefficients(spotify_id: str, tiktok_id: str, analysis: SongAnalysis = None):
     """
     Pairs each TikTok spike (using its start time) with the nearest unpaired Spotify spike (by start time).
     For each paired spike, computes the jump magnitude (normalized_end - normalized_start) for both platforms,
@@ -20,11 +15,14 @@ def get_correlation_coefficients(spotify_id: str, tiktok_id: str):
     Returns:
         A list of tuples: (tiktok_spike_start, tiktok_spike_end, spotify_spike_start, spotify_spike_end, correlation_coefficient)
     """
-    # Retrieve spike data from the parsed series.
+    # Retrieve spike data from the song analysis.
     # Each spike date is a tuple: (start, end)
     # Each spike value is a tuple: (norm_start, norm_end)
-    (spotify_spike_dates, spotify_spike_values), (tiktok_spike_dates, tiktok_spike_values) = \
-        find_spikes_in_normalized_series(spotify_id, tiktok_id)
+    analysis = analysis or get_song_analysis(spotify_id, tiktok_id)
+    if analysis is None:
+        return []
+    spotify_spike_dates, spotify_spike_values = analysis.spotify_spike_dates, analysis.spotify_spike_values
+    tiktok_spike_dates, tiktok_spike_values = analysis.tiktok_spike_dates, analysis.tiktok_spike_values
     
     available_spotify = spotify_spike_dates.copy()
     correlations = []
@@ -62,38 +60,24 @@ def plot_correlation_coefficients(spotify_id: str, tiktok_id: str):
     with the correlation coefficient computed as (tiktok_jump / spotify_jump). The spike start markers
     are plotted as dashed vertical lines, while the spike end markers are shown as ".-" vertical lines.
     """
-    # Retrieve raw series data for background plotting.
-    spotify_info = get_spotify_reach_series(spotify_id)
-    tiktok_info = get_tiktok_series(tiktok_id)
-    if spotify_info is None or tiktok_info is None:
+    # The analysis holds the normalized series and the full spike intervals (start, end).
+    analysis = get_song_analysis(spotify_id, tiktok_id)
+    if analysis is None:
         print("Error fetching one or both data series.")
         return
     
-    song_name = spotify_info[0]
-    spotify_data = spotify_info[1]  # list of [timestamp, value]
-    tiktok_data = tiktok_info[1]
-    
-    # Create DataFrames and compute normalized values (min-max normalization).
-    df_spotify = pd.DataFrame(spotify_data, columns=['timestamp', 'value'])
-    df_spotify['date'] = pd.to_datetime(df_spotify['timestamp'], unit='ms')
-    df_spotify['normalized'] = (df_spotify['value'] - df_spotify['value'].min()) / (df_spotify['value'].max() - df_spotify['value'].min())
-    
-    df_tiktok = pd.DataFrame(tiktok_data, columns=['timestamp', 'value'])
-    df_tiktok['date'] = pd.to_datetime(df_tiktok['timestamp'], unit='ms')
-    df_tiktok['normalized'] = (df_tiktok['value'] - df_tiktok['value'].min()) / (df_tiktok['value'].max() - df_tiktok['value'].min())
+    song_name = analysis.track_name
+    spotify_spike_intervals = analysis.spotify_spike_dates
+    tiktok_spike_intervals = analysis.tiktok_spike_dates
     
     # Get correlation coefficient pairing data.
     # Each element: (tiktok_spike_start, spotify_spike_start, coefficient)
-    paired_correlations = get_correlation_coefficients(spotify_id, tiktok_id)
-    
-    # Also retrieve the full spike intervals (start, end) for both platforms.
-    (spotify_spike_intervals, _), (tiktok_spike_intervals, _) = \
-        find_spikes_in_normalized_series(spotify_id, tiktok_id)
+    paired_correlations = get_correlation_coefficients(spotify_id, tiktok_id, analysis)
     
     # Plot background normalized time series.
     fig, ax = plt.subplots(figsize=(12, 6))
-    ax.plot(df_spotify['date'], df_spotify['normalized'], label='Spotify (Reach)', color='blue', alpha=0.7)
-    ax.plot(df_tiktok['date'], df_tiktok['normalized'], label='TikTok', color='red', alpha=0.7)
+    ax.plot(analysis.spotify_dates, analysis.spotify_normalized, label='Spotify (Reach)', color='blue', alpha=0.7)
+    ax.plot(analysis.tiktok_dates, analysis.tiktok_normalized, label='TikTok', color='red', alpha=0.7)
     
     # Format x-axis for dates.
     ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
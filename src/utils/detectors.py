@@ -0,0 +1,113 @@
+#%%
+from dataclasses import dataclass
+import numpy as np
+from utils.spikes import (
+    batch_normalize, batch_period_changes, batch_spike_thresholds, merge_batch_windows, merge_spike_windows,
+    min_max_normalize, pack_rows, period_changes, spike_thresholds
+)
+
+@dataclass(frozen=True)
+class SpikeDetector:
+    """
+    One spike detection and pairing rule. A spike is a window where the change over `period`
+    points is above the threshold: the mean change plus `sigma` standard deviations, taken over
+    the trailing `baseline_window` changes instead of the whole series when that is set, and
+    with the median and median absolute deviation when robust. Adjacent spikes of the two
+    platforms pair when the second starts within `window_days` of the first one's end.
+
+    Detectors are hashable, so they key the analysis caches directly.
+    """
+    period: int = 2
+    sigma: float = 1.0
+    baseline_window: int = None
+    robust: bool = False
+    window_days: int = 20
+
+    def intervals(self, series: 'PreparedSeries'):
+        """Returns (starts, ends) int64 position arrays of the merged spikes in one series."""
+        changes = series.changes(self.period)
+        # A NaN threshold compares False everywhere, so short series have no spikes
+        starts = np.flatnonzero(changes > spike_thresholds(changes, self.sigma, self.baseline_window, self.robust))
+        return merge_spike_windows(starts, self.period, len(series.normalized))
+
+    def batch_intervals(self, matrix: 'PreparedMatrix'):
+        """
+        Returns (songs, starts, ends) int64 arrays with one entry per merged spike of the rows
+        of a PreparedMatrix, ordered by song and then start. Positions are packed ones; map
+        them through matrix.columns for matrix columns.
+        """
+        if matrix.normalized.shape[1] <= self.period:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty.copy(), empty.copy()
+        changes, valid = matrix.changes(self.period)
+        thresholds = batch_spike_thresholds(changes, valid, self.sigma, self.baseline_window, self.robust)
+        songs, starts = np.nonzero(valid & (changes > thresholds))
+        return merge_batch_windows(songs, starts, self.period)
+
+class PreparedSeries:
+    """
+    A series normalized once, with its changes over each period computed on first use. Every
+    detector run over the same PreparedSeries shares them.
+    """
+
+    def __init__(self, values):
+        self.normalized = min_max_normalize(values)
+        self._changes = {}
+
+    def changes(self, period: int):
+        if period not in self._changes:
+            self._changes[period] = period_changes(self.normalized, period)
+        return self._changes[period]
+
+class PreparedMatrix:
+    """
+    PreparedSeries for a (songs, days) matrix of aligned series, where mask marks the cells with
+    data. The rows are packed (see spikes.pack_rows), so positions in normalized and in the
+    changes count each song's data points like its own series does; columns maps them back to
+    the matrix.
+    """
+
+    def __init__(self, matrix, mask):
+        packed, self.mask, self.columns = pack_rows(np.asarray(matrix, dtype=np.float64), np.asarray(mask, dtype=bool))
+        self.normalized = batch_normalize(packed, self.mask)
+        self._changes = {}
+
+    def changes(self, period: int):
+        # (changes, valid) as returned by batch_period_changes
+        if period not in self._changes:
+            self._changes[period] = batch_period_changes(self.normalized, self.mask, period)
+        return self._changes[period]
+
+# Detectors by id. 'default' is the dashboard's original rule
+DETECTORS = {}
+
+def register_detector(detector_id: str, detector: SpikeDetector):
+    DETECTORS[detector_id] = detector
+    return detector
+
+def get_detector(detector_id: str):
+    try:
+        return DETECTORS[detector_id]
+    except KeyError:
+        raise ValueError(f"Unknown detector {detector_id!r}; expected one of {', '.join(sorted(DETECTORS))}") from None
+
+def resolve_detectors(detectors=None):
+    """
+    Normalizes the ways callers name detectors into an {id: SpikeDetector} dict: None for the
+    default detector, an iterable of registered ids, or a dict that is passed through.
+    """
+    if detectors is None:
+        return {'default': DETECTORS['default']}
+    if isinstance(detectors, dict):
+        return dict(detectors)
+    if isinstance(detectors, str):
+        detectors = [detectors]
+    return {detector_id: get_detector(detector_id) for detector_id in detectors}
+
+register_detector('default', SpikeDetector())
+register_detector('rolling30', SpikeDetector(baseline_window=30))
+register_detector('robust', SpikeDetector(robust=True))
+register_detector('robust30', SpikeDetector(baseline_window=30, robust=True))
+register_detector('sensitive', SpikeDetector(sigma=0.5))
+register_detector('weekly', SpikeDetector(period=7))
+# %%
@@ -0,0 +1,155 @@
+#%%
+import re
+import json
+import hashlib
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from utils.series_store import dataset_path, read_series_csv
+from utils.songstats import SOURCE_SERIES
+
+TRACK_PATH = re.compile(r'^/api/v1/analytics_track/([^/]+)/top$')
+
+def build_payload(song_id: str, source: str, data_dir: str = None):
+    # Songstats-style payload for a song, built from the CSV datasets under data_dir
+    series_data = []
+    track_info = None
+    for name, platform in SOURCE_SERIES.get(source, []):
+        try:
+            track_name, timestamps, values, artist_name, avatar = read_series_csv(dataset_path(platform, song_id, data_dir))
+        except FileNotFoundError:
+            data = []
+        else:
+            data = [[t, int(v) if float(v).is_integer() else v] for t, v in zip(timestamps.tolist(), values.tolist())]
+            track_info = track_info or {'trackName': track_name, 'artistName': artist_name, 'avatar': avatar}
+        series_data.append({'name': name, 'data': data})
+    if track_info is None:
+        return None
+    return {'result': 'success', 'trackInfo': track_info, 'chart': {'seriesData': series_data}}
+
+class FakeSongstats:
+    """
+    Local stand-in for the Songstats analytics API, serving payloads built from the CSV datasets
+    under data_dir (the bundled datasets by default).
+    It can add latency, fail a fraction of requests with 503, cut a fraction of 200 bodies
+    short (`malformed_rate`) and answer 429 with Retry-After when more than `rate_limit`
+    requests arrive within one second. Successful responses carry an ETag and a matching
+    If-None-Match gets a 304. status_counts counts the responses sent by status.
+
+        with FakeSongstats(failure_rate=0.1) as server:
+            SongstatsCrawler(base_url=server.base_url)...
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0,
+                 failure_rate: float = 0.0, rate_limit: int = None, seed: int = 0, data_dir: str = None,
+                 malformed_rate: float = 0.0):
+        self.data_dir = data_dir
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.malformed_rate = malformed_rate
+        self.rate_limit = rate_limit
+        self.random = random.Random(seed)
+        self.request_counts = Counter()
+        self.status_counts = Counter()
+        self._window = []
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/api/v1"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, status, body, headers=(), truncate: bool = False):
+                data = json.dumps(body).encode()
+                if status == 200:
+                    etag = '"%s"' % hashlib.sha256(data).hexdigest()[:16]
+                    if self.headers.get('If-None-Match') == etag:
+                        with fake._lock:
+                            fake.status_counts[304] += 1
+                        self.send_response(304)
+                        self.send_header('ETag', etag)
+                        self.end_headers()
+                        return
+                    headers = list(headers) + [('ETag', etag)]
+                if truncate:
+                    data = data[:len(data) // 2]
+                with fake._lock:
+                    fake.status_counts[status] += 1
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                match = TRACK_PATH.match(url.path)
+                source = parse_qs(url.query).get('source', [''])[0]
+                with fake._lock:
+                    fake.request_counts[(match.group(1) if match else url.path, source)] += 1
+                    now = time.monotonic()
+                    fake._window = [t for t in fake._window if now - t < 1] + [now]
+                    limited = fake.rate_limit is not None and len(fake._window) > fake.rate_limit
+                    failed = fake.random.random() < fake.failure_rate
+                    malformed = fake.random.random() < fake.malformed_rate
+
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if limited:
+                    return self.send_json(429, {'result': 'error', 'message': 'rate limited'}, [('Retry-After', '1')])
+                if failed:
+                    return self.send_json(503, {'result': 'error', 'message': 'unavailable'})
+                payload = build_payload(match.group(1), source, fake.data_dir) if match else None
+                if payload is None:
+                    return self.send_json(404, {'result': 'error', 'message': 'not found'})
+                self.send_json(200, payload, truncate=malformed)
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+# Run from src/: python -m utils.fake_songstats --port 8765
+# then point the crawler at it: SONGSTATS_URL=http://127.0.0.1:8765/api/v1 python save_graphs.py
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the local datasets through a fake Songstats API.")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=int, default=None)
+    parser.add_argument('--malformed-rate', type=float, default=0.0)
+    parser.add_argument('--data-dir', default=None, help="folder holding the *_dataset folders to serve")
+    args = parser.parse_args()
+    server = FakeSongstats(port=args.port, latency=args.latency, failure_rate=args.failure_rate,
+                           rate_limit=args.rate_limit, data_dir=args.data_dir, malformed_rate=args.malformed_rate)
+    print(f"Fake Songstats API at {server.base_url}")
+    server.server.serve_forever()
+# %%
@@ -0,0 +1,100 @@
+#%%
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+def payload_size(payload):
+    # Rough bytes held by a payload of dicts, lists, strings, numbers and NumPy arrays. A
+    # walk rather than a JSON dump, so measuring doesn't serialize every figure a second time
+    if isinstance(payload, np.ndarray):
+        if payload.dtype == object:
+            return sum(payload_size(item) for item in payload.ravel())
+        return payload.nbytes
+    if isinstance(payload, dict):
+        return sum(payload_size(key) + payload_size(value) for key, value in payload.items())
+    if isinstance(payload, (list, tuple)):
+        return 8 * len(payload) + sum(payload_size(item) for item in payload)
+    if isinstance(payload, (str, bytes)):
+        return len(payload)
+    return 8
+
+class PayloadCache:
+    """
+    Process-wide LRU cache of ready-to-send callback payloads (figure dicts and the like),
+    bounded by their approximate size (see payload_size) rather than their count. Concurrent misses on the same
+    key build the payload once; the other callers wait for that build and share its result.
+    """
+
+    def __init__(self, max_bytes: int, sizeof=payload_size):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries = OrderedDict()  # key -> (size, payload)
+        self._building = {}  # key -> threading.Event set when the build finishes
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.evictions = 0
+
+    def get(self, key, build):
+        """Returns the cached payload for key, calling build() on a miss. None results are not cached."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            building = self._building.get(key)
+            if building is None:
+                building = self._building[key] = threading.Event()
+                self.misses += 1
+                owner = True
+            else:
+                self.waits += 1
+                owner = False
+
+        if not owner:
+            building.wait()
+            # Either the owner's payload is cached now, or its build failed and this call
+            # builds it instead
+            return self.get(key, build)
+
+        try:
+            payload = build()
+            size = self.sizeof(payload) if payload is not None else None
+            with self._lock:
+                if size is not None and size <= self.max_bytes:
+                    self._entries[key] = (size, payload)
+                    self.bytes += size
+                    while self.bytes > self.max_bytes:
+                        _, (evicted_size, _) = self._entries.popitem(last=False)
+                        self.bytes -= evicted_size
+                        self.evictions += 1
+        finally:
+            # Whatever failed above, waiters are released; they retry the build themselves
+            with self._lock:
+                del self._building[key]
+            building.set()
+        return payload
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'waits': self.waits,
+                'evictions': self.evictions,
+            }
+
+figure_cache = PayloadCache(max_bytes=int(os.environ.get('TOKAPI_FIGURE_CACHE_BYTES', 64 * 1024 * 1024)))
+# %%
@@ -0,0 +1,216 @@
+#%%
+import os
+import json
+import time
+import hashlib
+import threading
+import requests
+from email.utils import formatdate
+from utils.series_store import DATA_DIR, _atomic_write
+
+HTTP_CACHE_DIR = os.environ.get('TOKAPI_HTTP_CACHE_DIR', os.path.join(DATA_DIR, 'http_cache'))
+HTTP_CACHE_TTL = float(os.environ.get('TOKAPI_HTTP_CACHE_TTL', 6 * 3600))
+HTTP_CACHE_BYTES = int(os.environ.get('TOKAPI_HTTP_CACHE_BYTES', 256 * 1024 * 1024))
+HTTP_POOL_SIZE = int(os.environ.get('TOKAPI_HTTP_POOL_SIZE', 16))
+
+def make_session(pool_size: int = HTTP_POOL_SIZE):
+    # requests.Session with a connection pool big enough for the Dash request threads
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+# Shared by every loader, so repeated requests reuse open connections
+http_session = make_session()
+
+class CachedResponse:
+    """The parts of a requests.Response the loaders use, backed by a cached body file."""
+
+    def __init__(self, url: str, digest: str, body_path: str, headers: dict):
+        self.url = url
+        self.status_code = 200
+        self.digest = digest
+        self.headers = headers
+        self._body_path = body_path
+        self._content = None
+
+    @property
+    def content(self):
+        if self._content is None:
+            with open(self._body_path, 'rb') as f:
+                self._content = f.read()
+        return self._content
+
+    def json(self):
+        return json.loads(self.content)
+
+class HttpCache:
+    """
+    On-disk cache of successful GET responses, shared between processes.
+
+    Bodies are stored once under objects/ named by their SHA-256, and each URL has a small
+    entry under entries/ pointing at its body along with the validators the server sent.
+    Entries younger than `ttl` seconds are served without a request. Older ones are
+    revalidated with If-None-Match / If-Modified-Since, so an unchanged body costs a 304.
+    When the bodies outgrow `max_bytes` the least recently used entries are evicted.
+    """
+
+    def __init__(self, directory: str = HTTP_CACHE_DIR, ttl: float = HTTP_CACHE_TTL,
+                 max_bytes: int = HTTP_CACHE_BYTES, session: requests.Session = None):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.session = session or http_session
+        self._lock = threading.Lock()
+        self._size = None
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+
+    def entry_path(self, url: str):
+        return os.path.join(self.directory, 'entries', hashlib.sha256(url.encode()).hexdigest() + '.json')
+
+    def object_path(self, digest: str):
+        return os.path.join(self.directory, 'objects', digest[:2], digest)
+
+    def _read_entry(self, url: str):
+        try:
+            with open(self.entry_path(url), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        return entry if entry.get('url') == url and os.path.exists(self.object_path(entry['digest'])) else None
+
+    def _write_entry(self, entry: dict):
+        path = self.entry_path(entry['url'])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _atomic_write(path, lambda f: f.write(json.dumps(entry).encode('utf-8')))
+
+    def _response(self, entry: dict):
+        headers = {name: entry[key] for name, key in (('ETag', 'etag'), ('Last-Modified', 'last_modified')) if entry.get(key)}
+        return CachedResponse(entry['url'], entry['digest'], self.object_path(entry['digest']), headers)
+
+    def get(self, url: str, timeout: float = 30):
+        """
+        GETs url through the cache. Returns a CachedResponse for every 200 (cached, revalidated
+        or just downloaded) and the live requests.Response for anything else, which isn't stored.
+        """
+        entry = self._read_entry(url)
+        now = time.time()
+        if entry is not None and now - entry['fetched_at'] < self.ttl:
+            # Touch the entry so eviction sees it as recently used
+            try:
+                os.utime(self.entry_path(url))
+            except FileNotFoundError:
+                pass
+            with self._lock:
+                self.hits += 1
+            return self._response(entry)
+
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            headers['If-Modified-Since'] = entry.get('last_modified') or formatdate(entry['fetched_at'], usegmt=True)
+        res = self.session.get(url, headers=headers, timeout=timeout)
+
+        if res.status_code == 304 and entry is not None:
+            entry['fetched_at'] = now
+            self._write_entry(entry)
+            with self._lock:
+                self.revalidated += 1
+            return self._response(entry)
+
+        with self._lock:
+            self.misses += 1
+        if res.status_code != 200:
+            return res
+        response = self._response(self.store(url, res.content, res.headers.get('ETag'), res.headers.get('Last-Modified'), now))
+        response._content = res.content
+        return response
+
+    def store(self, url: str, body: bytes, etag: str = None, last_modified: str = None, fetched_at: float = None):
+        digest = hashlib.sha256(body).hexdigest()
+        body_path = self.object_path(digest)
+        added = 0
+        if not os.path.exists(body_path):
+            os.makedirs(os.path.dirname(body_path), exist_ok=True)
+            _atomic_write(body_path, lambda f: f.write(body))
+            added = len(body)
+        entry = {
+            'url': url, 'digest': digest, 'size': len(body), 'etag': etag,
+            'last_modified': last_modified, 'fetched_at': time.time() if fetched_at is None else fetched_at,
+        }
+        self._write_entry(entry)
+        with self._lock:
+            if self._size is not None:
+                self._size += added
+            over_budget = self._size is None or self._size > self.max_bytes
+        if over_budget:
+            self.evict()
+        return entry
+
+    def evict(self):
+        """Drops least recently used entries until the stored bodies fit in max_bytes."""
+        entries_dir = os.path.join(self.directory, 'entries')
+        objects_dir = os.path.join(self.directory, 'objects')
+        entries = []
+        references = {}
+        for name in os.listdir(entries_dir) if os.path.isdir(entries_dir) else []:
+            path = os.path.join(entries_dir, name)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    digest = json.load(f)['digest']
+                used = os.stat(path).st_mtime
+            except (OSError, ValueError, KeyError):
+                continue
+            entries.append((used, path, digest))
+            references[digest] = references.get(digest, 0) + 1
+
+        sizes = {}
+        for root, _, names in os.walk(objects_dir):
+            for name in names:
+                if '.tmp' not in name:
+                    sizes[name] = os.path.getsize(os.path.join(root, name))
+        # Bodies no entry points at any more
+        for digest in set(sizes) - set(references):
+            self._remove(self.object_path(digest))
+            del sizes[digest]
+
+        total = sum(sizes.values())
+        evicted = 0
+        for _, path, digest in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            evicted += 1
+            references[digest] -= 1
+            if not references[digest] and digest in sizes:
+                self._remove(self.object_path(digest))
+                total -= sizes.pop(digest)
+        with self._lock:
+            self._size = total
+            self.evictions += evicted
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'revalidated': self.revalidated,
+                'evictions': self.evictions,
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+            }
+
+http_cache = HttpCache()
+# %%
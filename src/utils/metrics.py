@@ -0,0 +1,140 @@
+#%%
+import os
+import time
+import bisect
+import functools
+import threading
+from contextlib import nullcontext
+
+# TOKAPI_METRICS=0 turns every timer into a no-op; cache counters are only read when scraped
+METRICS_ENABLED = os.environ.get('TOKAPI_METRICS', '1') == '1'
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Cache stats() keys that only ever grow; the others are exported as gauges
+COUNTER_KEYS = {'hits', 'misses', 'waits', 'evictions', 'invalidations', 'revalidated'}
+
+_DISABLED = nullcontext()
+
+class Histogram:
+    """Thread-safe latency histogram with fixed buckets, in the Prometheus model."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)  # the last slot is +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+
+    def snapshot(self):
+        """Returns ([(upper_bound, cumulative_count)], sum, count) with '+Inf' as the last bound."""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative = []
+        running = 0
+        for bound, count in zip(self.buckets + ('+Inf',), counts):
+            running += count
+            cumulative.append((bound, running))
+        return cumulative, total, running
+
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+class Metrics:
+    """
+    Stage timers and cache counters for one process, rendered in the Prometheus text format.
+
+        with metrics.stage('normalize'):
+            ...
+
+        @metrics.timed('update_graphs')
+        def update_graphs(...):
+            ...
+
+    When disabled, stage() returns a shared no-op context manager and timed() returns the
+    function unchanged, so instrumented code runs as if it wasn't.
+    """
+
+    def __init__(self, enabled: bool = METRICS_ENABLED, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = buckets
+        self._stages = {}  # stage name -> Histogram
+        self._caches = {}  # cache name -> object with stats()
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str):
+        histogram = self._stages.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self._stages.setdefault(name, Histogram(self.buckets))
+        return histogram
+
+    def stage(self, name: str):
+        if not self.enabled:
+            return _DISABLED
+        return _Timer(self.histogram(name))
+
+    def timed(self, name: str):
+        def decorate(function):
+            if not self.enabled:
+                return function
+            histogram = self.histogram(name)
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with _Timer(histogram):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def register_cache(self, name: str, cache):
+        """Exports cache.stats() under the given name each time the metrics are rendered."""
+        self._caches[name] = cache
+
+    def render(self):
+        lines = [
+            '# HELP tokapi_stage_seconds Time spent in each stage of the song pipeline.',
+            '# TYPE tokapi_stage_seconds histogram',
+        ]
+        for name, histogram in sorted(self._stages.items()):
+            buckets, total, count = histogram.snapshot()
+            for bound, cumulative in buckets:
+                lines.append(f'tokapi_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'tokapi_stage_seconds_sum{{stage="{name}"}} {total}')
+            lines.append(f'tokapi_stage_seconds_count{{stage="{name}"}} {count}')
+
+        # Group each stats() key across caches into one metric family
+        families = {}
+        for cache_name, cache in sorted(self._caches.items()):
+            for key, value in cache.stats().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    families.setdefault(key, []).append((cache_name, value))
+        for key, samples in sorted(families.items()):
+            counter = key in COUNTER_KEYS
+            metric = f'tokapi_cache_{key}_total' if counter else f'tokapi_cache_{key}'
+            lines.append(f'# TYPE {metric} {"counter" if counter else "gauge"}')
+            lines.extend(f'{metric}{{cache="{cache_name}"}} {value}' for cache_name, value in samples)
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+stage = metrics.stage
+timed = metrics.timed
+# %%
@@ -0,0 +1,188 @@
+#%%
+import math
+import random
+from collections import deque
+
+class _Node:
+    __slots__ = ('value', 'next', 'width', 'sum')
+
+    def __init__(self, value, next, width, sum):
+        self.value = value
+        self.next = next
+        self.width = width
+        self.sum = sum
+
+# Sentinel closing every level; compares above any finite value
+_END = _Node(math.inf, [], [], [])
+
+class IndexableSkiplist:
+    """
+    Sorted multiset of finite floats with O(log n) insert, remove, access by rank and sum of
+    the smallest i elements. Each link records how many elements it skips and their sum, so
+    walking to rank i takes the same path as a search.
+    """
+
+    def __init__(self, expected_size: int = 100, seed: int = 0):
+        self.size = 0
+        self.levels = int(1 + math.log2(max(expected_size, 2)))
+        self.head = _Node(None, [_END] * self.levels, [1] * self.levels, [0.0] * self.levels)
+        self._random = random.Random(seed)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i: int):
+        if not 0 <= i < self.size:
+            raise IndexError(i)
+        node = self.head
+        i += 1
+        for level in reversed(range(self.levels)):
+            while node.width[level] <= i:
+                i -= node.width[level]
+                node = node.next[level]
+        return node.value
+
+    def prefix_sum(self, i: int):
+        """Sum of the i smallest elements."""
+        if not 0 <= i <= self.size:
+            raise IndexError(i)
+        node = self.head
+        total = 0.0
+        for level in reversed(range(self.levels)):
+            while node.width[level] <= i:
+                i -= node.width[level]
+                total += node.sum[level]
+                node = node.next[level]
+        return total
+
+    def _update_sums(self, chain, new=None):
+        # Recomputes the sums of the links that changed from the links one level down rather
+        # than adding and subtracting values, so rounding errors don't build up
+        for level in range(self.levels):
+            for node in (chain[level], new):
+                if node is None or level >= len(node.next):
+                    continue
+                if not level:
+                    node.sum[0] = node.next[0].value if node.next[0] is not _END else 0.0
+                    continue
+                end, total, step = node.next[level], 0.0, node
+                while step is not end:
+                    total += step.sum[level - 1]
+                    step = step.next[level - 1]
+                node.sum[level] = total
+
+    def insert(self, value: float):
+        # Last node before the insertion point on each level, and how far along it is
+        chain = [None] * self.levels
+        steps = [0] * self.levels
+        node = self.head
+        for level in reversed(range(self.levels)):
+            while node.next[level].value <= value:
+                steps[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+
+        height = min(self.levels, 1 - int(math.log2(1.0 - self._random.random())))
+        new = _Node(value, [None] * height, [None] * height, [0.0] * height)
+        skipped = 0
+        for level in range(height):
+            previous = chain[level]
+            new.next[level] = previous.next[level]
+            previous.next[level] = new
+            new.width[level] = previous.width[level] - skipped
+            previous.width[level] = skipped + 1
+            skipped += steps[level]
+        for level in range(height, self.levels):
+            chain[level].width[level] += 1
+        self._update_sums(chain, new)
+        self.size += 1
+
+    def remove(self, value: float):
+        chain = [None] * self.levels
+        node = self.head
+        for level in reversed(range(self.levels)):
+            while node.next[level].value < value:
+                node = node.next[level]
+            chain[level] = node
+        if chain[0].next[0].value != value:
+            raise KeyError(value)
+
+        # The first node equal to value is the one every level's chain points at
+        height = len(chain[0].next[0].next)
+        for level in range(height):
+            previous = chain[level]
+            previous.width[level] += previous.next[level].width[level] - 1
+            previous.next[level] = previous.next[level].next[level]
+        for level in range(height, self.levels):
+            chain[level].width[level] -= 1
+        self._update_sums(chain)
+        self.size -= 1
+
+class RollingMedian:
+    """
+    Median and median absolute deviation of the last `window` values pushed. push() costs
+    O(log window) for the median and O(log^2 window) for the MAD, which is found as the k-th
+    smallest distance across the two sorted runs on either side of the median without
+    materializing them. Both follow numpy's convention of averaging the two middle elements.
+    The mean absolute deviation about the median comes from two prefix sums, in O(log window).
+    """
+
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque()
+        self.sorted = IndexableSkiplist(window)
+
+    def __len__(self):
+        return len(self.values)
+
+    def push(self, value: float):
+        self.values.append(value)
+        self.sorted.insert(value)
+        if len(self.values) > self.window:
+            self.sorted.remove(self.values.popleft())
+
+    def median(self):
+        n = len(self.sorted)
+        if not n:
+            return math.nan
+        if n % 2:
+            return self.sorted[n // 2]
+        return (self.sorted[n // 2 - 1] + self.sorted[n // 2]) / 2
+
+    def mad(self, median: float = None):
+        n = len(self.sorted)
+        if not n:
+            return math.nan
+        median = self.median() if median is None else median
+        # Distances below the median ascend leftwards from the middle, those above rightwards
+        below = n // 2 + 1 if n % 2 else n // 2
+        if n % 2:
+            return self._kth_distance(n // 2, median, below)
+        return (self._kth_distance(n // 2 - 1, median, below) + self._kth_distance(n // 2, median, below)) / 2
+
+    def mean_absolute_deviation(self, median: float = None):
+        # median must be the window's median (the default). The lower half of the sorted
+        # values lies below it and the upper half above, so the distances sum to
+        # (upper sum - lower sum) plus median times the difference in their sizes
+        n = len(self.sorted)
+        if not n:
+            return math.nan
+        median = self.median() if median is None else median
+        lower, total = self.sorted.prefix_sum(n // 2), self.sorted.prefix_sum(n)
+        return max((total - 2 * lower - median * (n - 2 * (n // 2))) / n, 0.0)
+
+    def _kth_distance(self, k: int, median: float, below: int):
+        # k-th smallest (0-based) of A[i] = median - sorted[below - 1 - i] and
+        # B[j] = sorted[below + j] - median, two ascending runs
+        s = self.sorted
+        above = len(s) - below
+        lo, hi = max(0, k + 1 - above), min(k + 1, below)
+        while lo < hi:
+            i = (lo + hi) // 2
+            if median - s[below - 1 - i] < s[below + k - i] - median:
+                lo = i + 1
+            else:
+                hi = i
+        j = k + 1 - lo
+        return max(median - s[below - lo] if lo else -math.inf, s[below + j - 1] - median if j else -math.inf)
+# %%
@@ -0,0 +1,69 @@
+#%%
+import os
+import threading
+from collections import OrderedDict
+from utils.series_store import file_signature
+
+class SeriesCache:
+    """
+    Process-wide LRU cache for loaded series. Each entry remembers the (mtime, size) of the
+    files it was read from and is reloaded as soon as any of them changes, appears or is removed.
+    Safe to share between the Dash server's request threads.
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (signature, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def get(self, key, source_paths, load, version=None):
+        """
+        Returns the cached value for key, calling load() on a miss or when one of
+        source_paths or the given data version changed since the value was cached.
+        None results are not cached.
+        """
+        signature = (version, tuple(file_signature(path) for path in source_paths))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] == signature:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+                self.invalidations += 1
+            self.misses += 1
+
+        # Load outside the lock so one slow read doesn't block every other request
+        value = load()
+        if value is None:
+            return None
+        with self._lock:
+            self._entries[key] = (signature, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'evictions': self.evictions,
+            }
+
+series_cache = SeriesCache(max_entries=int(os.environ.get('TOKAPI_SERIES_CACHE_SIZE', 512)))
+# %%
@@ -0,0 +1,566 @@
+#%%
+import os
+import json
+import zlib
+import numpy as np
+
+# Root of the bundled datasets (the repo root by default)
+DATA_DIR = os.environ.get(
+    'TOKAPI_DATA_DIR',
+    os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../..'))
+)
+STORE_DIR = os.environ.get('TOKAPI_STORE_DIR', os.path.join(DATA_DIR, 'series_store'))
+
+# {platform: (dataset folder, csv file name pattern)}
+PLATFORMS = {
+    'spotify_reach': ('spotify_reach_dataset', 'spotify_reach_series_{}.csv'),
+    'tiktok': ('tiktok_series_dataset', 'tiktok_series_{}.csv'),
+    'spotify_playlist': ('spotify_playlists_dataset', 'spotify_playlist_series_{}.csv'),
+}
+
+MAGIC = b'TOKSER01'
+TAIL_MAGIC = b'TOKTAIL1'
+MS_PER_DAY = 86_400_000
+ALIGNMENT = 8
+
+# One tail index record per appended block: the song's slot (its position in the packed file's
+# codes, then in the tail's new codes), where the block's points start in the tail data file,
+# how many there are, how many of the song's earlier points they follow, and the song's version
+TAIL_RECORD = np.dtype([('slot', '<i8'), ('offset', '<i8'), ('count', '<i8'), ('keep', '<i8'), ('version', '<i8')])
+TAIL_HEADER = len(TAIL_MAGIC) + 8
+
+# Appends are folded into a freshly packed file once the tail holds this fraction of its points
+COMPACT_RATIO = 0.25
+
+def file_signature(path: str):
+    # (mtime, size) of a file, or None if it doesn't exist
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+def dataset_dir(platform: str):
+    return os.path.join(DATA_DIR, PLATFORMS[platform][0])
+
+def dataset_path(platform: str, song_id: str, data_dir: str = None):
+    folder, pattern = PLATFORMS[platform]
+    return os.path.join(data_dir or DATA_DIR, folder, pattern.format(song_id))
+
+def store_path(platform: str, store_dir: str = None):
+    return os.path.join(store_dir or STORE_DIR, f"{platform}.series")
+
+def metadata_path(platform: str, store_dir: str = None):
+    return os.path.join(store_dir or STORE_DIR, f"{platform}.meta.json")
+
+def tail_paths(platform: str, store_dir: str = None):
+    # (points, index, metadata) files of the points appended since the store was packed
+    base = os.path.join(store_dir or STORE_DIR, f"{platform}.tail")
+    return base, f"{base}.index", f"{base}.json"
+
+def read_series_csv(csv_path: str):
+    """
+    Parses one of the Songstats CSVs (track name on the first line, timestamp,value rows,
+    then the artist and avatar on the last two lines).
+
+    Returns:
+        (track_name, timestamps, values, artist_name, avatar) with int64 timestamps in ms
+        and float64 values.
+    """
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    if len(lines) < 3:
+        raise ValueError(f"{csv_path} does not have the expected structure.")
+    rows = [line for line in lines[1:-2] if line.strip()]
+    if rows:
+        table = np.array([line.split(',') for line in rows], dtype=np.float64).reshape(len(rows), 2)
+        timestamps = table[:, 0].astype(np.int64)
+        values = table[:, 1].copy()
+    else:
+        timestamps = np.empty(0, dtype=np.int64)
+        values = np.empty(0, dtype=np.float64)
+    return lines[0].strip(), timestamps, values, lines[-2].strip(), lines[-1].strip()
+
+def write_series_csv(csv_path: str, track_name: str, data, artist_name: str, avatar: str):
+    """Writes a series in the Songstats CSV layout read by read_series_csv, atomically."""
+    lines = [track_name] + [f"{timestamp},{value}" for timestamp, value in data] + [artist_name, avatar]
+    os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+    _atomic_write(csv_path, lambda f: f.write('\n'.join(lines).encode('utf-8')))
+
+def append_series_csv(csv_path: str, track_name: str, data, artist_name: str, avatar: str):
+    """
+    Appends the points of data that are newer than the last stored timestamp to a series CSV
+    (all of them when the file doesn't exist yet). The file is replaced atomically and left
+    untouched when there is nothing new.
+
+    Returns:
+        (timestamps, values) arrays of the appended points.
+    """
+    try:
+        with open(csv_path, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        lines = None
+    rows = [line for line in lines[1:-2] if line.strip()] if lines else []
+    last_timestamp = int(float(rows[-1].split(',')[0])) if rows else None
+
+    new_data = [(int(timestamp), value) for timestamp, value in data
+                if last_timestamp is None or int(timestamp) > last_timestamp]
+    timestamps = np.array([timestamp for timestamp, _ in new_data], dtype=np.int64)
+    values = np.array([value for _, value in new_data], dtype=np.float64)
+    if new_data or lines is None:
+        write_series_csv(csv_path, track_name, [row.split(',') for row in rows] + new_data, artist_name, avatar)
+    return timestamps, values
+
+def list_dataset_codes(platform: str):
+    folder, pattern = PLATFORMS[platform]
+    prefix, suffix = pattern.split('{}')
+    folder_path = os.path.join(DATA_DIR, folder)
+    if not os.path.isdir(folder_path):
+        return []
+    return sorted(
+        name[len(prefix):-len(suffix)] for name in os.listdir(folder_path)
+        if name.startswith(prefix) and name.endswith(suffix)
+    )
+
+def _aligned(n: int):
+    return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def _atomic_write(path: str, write):
+    # Write to a temp file next to the target and rename it into place so readers
+    # never see a partially written file
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    try:
+        with open(tmp_path, 'wb') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def write_series_store(platform: str, records: dict, store_dir: str = None, versions: dict = None):
+    """
+    Packs {song_code: (track_name, timestamps, values, artist_name, avatar)} into one file:
+
+        MAGIC | uint64 header length | JSON header | int64 offsets | int64 timestamps | float64 values
+
+    The offsets index has one entry per song plus a terminator, so song i spans
+    [offsets[i], offsets[i + 1]) in both columns. Track metadata goes to a separate JSON table.
+    Songs in `versions` keep the version given there instead of a checksum of their points.
+    Any tail appended to the previous file is dropped.
+    """
+    os.makedirs(store_dir or STORE_DIR, exist_ok=True)
+    codes = sorted(records)
+    lengths = np.array([len(records[code][1]) for code in codes], dtype=np.int64)
+    offsets = np.zeros(len(codes) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    count = int(offsets[-1])
+
+    timestamps = np.empty(count, dtype='<i8')
+    values = np.empty(count, dtype='<f8')
+    for i, code in enumerate(codes):
+        timestamps[offsets[i]:offsets[i + 1]] = records[code][1]
+        values[offsets[i]:offsets[i + 1]] = records[code][2]
+
+    # The generation ties a tail to the file it was appended to. It is a checksum of the
+    # contents, so rebuilding the same data gives the same file
+    generation = zlib.crc32(values.tobytes(), zlib.crc32(timestamps.tobytes(), zlib.crc32(json.dumps(codes).encode())))
+
+    # Column offsets are computed against a header padded to a fixed width so they
+    # don't depend on their own length
+    header = {'version': 1, 'platform': platform, 'codes': codes, 'count': count, 'generation': generation}
+    header_len = _aligned(len(json.dumps(header).encode()) + 128)
+    body_start = _aligned(len(MAGIC) + 8 + header_len)
+    header['offsets_offset'] = body_start
+    header['timestamps_offset'] = body_start + offsets.nbytes
+    header['values_offset'] = header['timestamps_offset'] + timestamps.nbytes
+    header_bytes = json.dumps(header).encode().ljust(header_len)
+
+    def write(f):
+        f.write(MAGIC)
+        f.write(np.uint64(header_len).astype('<u8').tobytes())
+        f.write(header_bytes)
+        f.write(b'\0' * (body_start - len(MAGIC) - 8 - header_len))
+        f.write(offsets.astype('<i8').tobytes())
+        f.write(timestamps.tobytes())
+        f.write(values.tobytes())
+
+    # Each song's version is a checksum of its points, so readers can tell which songs a
+    # rebuild actually changed
+    versions = versions or {}
+    metadata = {
+        code: {
+            'track_name': records[code][0], 'artist_name': records[code][3], 'avatar': records[code][4],
+            'version': versions[code] if code in versions else
+                       zlib.crc32(values[offsets[i]:offsets[i + 1]].tobytes(),
+                                  zlib.crc32(timestamps[offsets[i]:offsets[i + 1]].tobytes())),
+        }
+        for i, code in enumerate(codes)
+    }
+    _atomic_write(store_path(platform, store_dir), write)
+    _atomic_write(metadata_path(platform, store_dir), lambda f: f.write(json.dumps(metadata, ensure_ascii=False).encode('utf-8')))
+    # Readers already ignore a tail of another generation; this only frees the space
+    for path in tail_paths(platform, store_dir):
+        if os.path.exists(path):
+            os.remove(path)
+
+def append_series_store(platform: str, appends: dict, replace: bool = False):
+    """
+    Appends new points to songs in a platform's packed store.
+
+    appends maps song codes to (track_name, timestamps, values, artist_name, avatar) holding
+    only the new points; each song keeps its stored points older than its first new one (none
+    of them with replace, for a full refresh) and songs missing from the store are added.
+
+    The points go to the end of the store's tail file and one index record per song points at
+    them, so a run writes the new points and the changed songs' records and nothing else.
+    Readers see the new records the next time they open the store. Once the tail holds
+    COMPACT_RATIO of the packed points, compact_series_store folds it into a new packed file.
+
+    Returns:
+        The number of songs whose series changed.
+    """
+    appends = {code: record for code, record in appends.items() if len(record[1])}
+    if not os.path.exists(store_path(platform)):
+        if appends:
+            write_series_store(platform, appends)
+        return len(appends)
+    if not appends:
+        return 0
+
+    store = SeriesStore(platform)
+    data_path, index_path, tail_metadata_path = tail_paths(platform)
+    added = []
+    tail_metadata = dict(store.tail_metadata)
+    records = np.empty(len(appends), dtype=TAIL_RECORD)
+    with open(data_path, 'ab' if store.has_tail else 'wb') as f:
+        for k, (code, (track_name, timestamps, values, artist_name, avatar)) in enumerate(appends.items()):
+            timestamps = np.asarray(timestamps, dtype='<i8')
+            values = np.asarray(values, dtype='<f8')
+            slot = store.index.get(code)
+            if slot is None:
+                slot = store.packed + len(store.tail_codes) + len(added)
+                added.append(code)
+
+            length, last_timestamp = store.extent(code)
+            if replace or not length:
+                keep = 0
+            elif timestamps[0] > last_timestamp:
+                keep = length
+            else:
+                keep = int(np.searchsorted(store.series(code)[0], timestamps[0]))
+
+            version = zlib.crc32(values.tobytes(), zlib.crc32(
+                timestamps.tobytes(), zlib.crc32(f"{store.version(code)}:{keep}".encode())))
+            records[k] = (slot, f.tell(), len(timestamps), keep, version)
+            f.write(timestamps.tobytes())
+            f.write(values.tobytes())
+            meta = {'track_name': track_name, 'artist_name': artist_name, 'avatar': avatar}
+            if store.track_metadata(code) != meta:
+                tail_metadata[code] = meta
+        f.flush()
+        os.fsync(f.fileno())
+
+    # The index records go last, after the points and codes they refer to are on disk
+    if added or tail_metadata != store.tail_metadata or not store.has_tail:
+        tail = {'generation': store.generation, 'codes': store.tail_codes + added, 'metadata': tail_metadata}
+        _atomic_write(tail_metadata_path, lambda f: f.write(json.dumps(tail, ensure_ascii=False).encode('utf-8')))
+    if store.has_tail:
+        with open(index_path, 'r+b') as f:
+            # Past the last whole record, so one torn by a crash is overwritten
+            f.seek(TAIL_HEADER + store.tail_records.nbytes)
+            f.write(records.tobytes())
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+    else:
+        def write(f):
+            f.write(TAIL_MAGIC)
+            f.write(np.int64(store.generation).astype('<i8').tobytes())
+            f.write(records.tobytes())
+        _atomic_write(index_path, write)
+
+    if store.tail_points + int(records['count'].sum()) > COMPACT_RATIO * max(store.count, 1):
+        compact_series_store(platform)
+    return len(appends)
+
+def compact_series_store(platform: str):
+    """
+    Folds a store's tail into a freshly packed file. Songs keep their versions, so compacting
+    doesn't invalidate anything cached for them.
+
+    Returns:
+        The number of songs in the store.
+    """
+    store = SeriesStore(platform)
+    # Versions carried over from an earlier compaction aren't checksums of the points either.
+    # Stores packed before versions were recorded get them computed now
+    versions = {code: store.version(code) for code in store.codes}
+    write_series_store(platform, {code: store.record(code) for code in store.codes},
+                       versions={code: version for code, version in versions.items() if isinstance(version, int)})
+    return len(store.codes)
+
+def build_series_store(platform: str, codes=None):
+    """Converts a platform's CSV dataset folder into its packed store file."""
+    codes = list_dataset_codes(platform) if codes is None else codes
+    records = {}
+    for code in codes:
+        csv_path = dataset_path(platform, code)
+        if os.path.exists(csv_path):
+            records[code] = read_series_csv(csv_path)
+    write_series_store(platform, records)
+    return len(records)
+
+class SeriesStore:
+    """
+    Read-only view over a packed platform file. The whole file is memory-mapped once and
+    every series is returned as a zero-copy slice of the timestamp and value columns.
+
+    Songs with points appended since the file was packed (see append_series_store) are put
+    together from their packed points and their tail blocks on first use.
+    """
+
+    def __init__(self, platform: str):
+        self.platform = platform
+        self.path = store_path(platform)
+        self.signature = store_signature(platform)
+        self._buffer = np.memmap(self.path, dtype=np.uint8, mode='r')
+        if bytes(self._buffer[:len(MAGIC)]) != MAGIC:
+            raise ValueError(f"{self.path} is not a series store file.")
+        header_len = int(self._buffer[len(MAGIC):len(MAGIC) + 8].view('<u8')[0])
+        header_start = len(MAGIC) + 8
+        header = json.loads(bytes(self._buffer[header_start:header_start + header_len]))
+        self.codes = header['codes']
+        self.count = header['count']
+        # Stores packed before generations were recorded all count as one
+        self.generation = header.get('generation', -1)
+        self.packed = len(self.codes)
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        self.offsets = self._column(header['offsets_offset'], '<i8', len(self.codes) + 1)
+        self.timestamps = self._column(header['timestamps_offset'], '<i8', header['count'])
+        self.values = self._column(header['values_offset'], '<f8', header['count'])
+        with open(metadata_path(platform), 'r', encoding='utf-8') as f:
+            self.metadata = json.load(f)
+        self._read_tail()
+
+    def _column(self, offset, dtype, length):
+        return self._buffer[offset:offset + length * np.dtype(dtype).itemsize].view(dtype)
+
+    def _read_tail(self):
+        # The index is read before the tail metadata and points it refers to, which are
+        # written before it
+        self.has_tail = False
+        self.tail_codes, self.tail_metadata = [], {}
+        self.tail_records = np.empty(0, dtype=TAIL_RECORD)
+        self.tail_points = 0
+        data_path, index_path, tail_metadata_path = tail_paths(self.platform)
+        try:
+            with open(index_path, 'rb') as f:
+                head, body = f.read(TAIL_HEADER), f.read()
+            with open(tail_metadata_path, 'r', encoding='utf-8') as f:
+                tail = json.load(f)
+        except FileNotFoundError:
+            return
+        # A tail appended to an earlier packed file doesn't apply to this one
+        if len(head) < TAIL_HEADER or head[:len(TAIL_MAGIC)] != TAIL_MAGIC:
+            return
+        if int(np.frombuffer(head[len(TAIL_MAGIC):], dtype='<i8')[0]) != self.generation or tail['generation'] != self.generation:
+            return
+
+        self.has_tail = True
+        self.tail_codes, self.tail_metadata = tail['codes'], tail['metadata']
+        whole = len(body) // TAIL_RECORD.itemsize * TAIL_RECORD.itemsize
+        self.tail_records = np.frombuffer(body[:whole], dtype=TAIL_RECORD)
+        if not len(self.tail_records):
+            return
+        self.tail_points = int(self.tail_records['count'].sum())
+        self._tail_data = np.memmap(data_path, dtype=np.uint8, mode='r')
+        self._tail_order = np.argsort(self.tail_records['slot'], kind='stable')
+        self._tail_bounds = np.searchsorted(self.tail_records['slot'][self._tail_order],
+                                            np.arange(self.packed + len(self.tail_codes) + 1))
+        self._assembled = {}
+        for j, code in enumerate(self.tail_codes):
+            if self._tail_bounds[self.packed + j + 1] > self._tail_bounds[self.packed + j]:
+                self.index[code] = self.packed + j
+                self.codes.append(code)
+
+    def _blocks(self, i: int):
+        # Tail records of slot i, oldest first
+        if not len(self.tail_records):
+            return self.tail_records
+        return self.tail_records[self._tail_order[self._tail_bounds[i]:self._tail_bounds[i + 1]]]
+
+    def _block(self, record):
+        offset, count = int(record['offset']), int(record['count'])
+        block = self._tail_data[offset:offset + 16 * count]
+        return block[:8 * count].view('<i8'), block[8 * count:].view('<f8')
+
+    def _assemble(self, i: int):
+        # Each block replaces the song's points from position `keep` on
+        timestamps, values, length = [], [], 0
+        if i < self.packed:
+            start, stop = self.offsets[i], self.offsets[i + 1]
+            timestamps.append(self.timestamps[start:stop])
+            values.append(self.values[start:stop])
+            length = int(stop - start)
+        for record in self._blocks(i):
+            keep = int(record['keep'])
+            while length > keep:
+                cut = min(len(timestamps[-1]), length - keep)
+                if cut == len(timestamps[-1]):
+                    timestamps.pop()
+                    values.pop()
+                else:
+                    timestamps[-1], values[-1] = timestamps[-1][:-cut], values[-1][:-cut]
+                length -= cut
+            block_timestamps, block_values = self._block(record)
+            timestamps.append(block_timestamps)
+            values.append(block_values)
+            length += len(block_timestamps)
+        if len(timestamps) == 1:
+            return timestamps[0], values[0]
+        return np.concatenate(timestamps), np.concatenate(values)
+
+    def __contains__(self, song_id):
+        return song_id in self.index
+
+    def __len__(self):
+        return len(self.codes)
+
+    def appended(self, song_id: str):
+        """Whether a song has points in the tail."""
+        i = self.index.get(song_id)
+        return i is not None and len(self._blocks(i)) > 0
+
+    def series(self, song_id: str):
+        """Returns (timestamps, values) views for a song, or None if it isn't in the store."""
+        i = self.index.get(song_id)
+        if i is None:
+            return None
+        if self.appended(song_id):
+            if i not in self._assembled:
+                self._assembled[i] = self._assemble(i)
+            return self._assembled[i]
+        start, stop = self.offsets[i], self.offsets[i + 1]
+        return self.timestamps[start:stop], self.values[start:stop]
+
+    def extent(self, song_id: str):
+        """Returns (point count, last timestamp) of a song without putting its series together."""
+        i = self.index.get(song_id)
+        if i is None:
+            return 0, None
+        blocks = self._blocks(i)
+        if len(blocks):
+            timestamps, _ = self._block(blocks[-1])
+            return int(blocks[-1]['keep'] + blocks[-1]['count']), int(timestamps[-1])
+        start, stop = int(self.offsets[i]), int(self.offsets[i + 1])
+        return stop - start, int(self.timestamps[stop - 1]) if stop > start else None
+
+    def version(self, song_id: str):
+        """Version of a song's points in this file, or None if it isn't in the store."""
+        i = self.index.get(song_id)
+        if i is None:
+            return None
+        blocks = self._blocks(i)
+        if len(blocks):
+            return int(blocks[-1]['version'])
+        version = self.metadata[song_id].get('version')
+        if version is None:
+            # Stores written before versions were recorded: ingest only ever appends, so the
+            # point count and last timestamp identify the data
+            start, stop = int(self.offsets[i]), int(self.offsets[i + 1])
+            version = (stop - start, int(self.timestamps[stop - 1]) if stop > start else None)
+        return version
+
+    def track_metadata(self, song_id: str):
+        """Returns the song's {'track_name', 'artist_name', 'avatar'}, or None."""
+        meta = self.tail_metadata.get(song_id) or self.metadata.get(song_id)
+        if meta is None:
+            return None
+        return {key: meta[key] for key in ('track_name', 'artist_name', 'avatar')}
+
+    def record(self, song_id: str):
+        """Returns (track_name, timestamps, values, artist_name, avatar), or None."""
+        series = self.series(song_id)
+        if series is None:
+            return None
+        meta = self.track_metadata(song_id)
+        return meta['track_name'], series[0], series[1], meta['artist_name'], meta['avatar']
+
+    def matrix(self, codes):
+        """Returns align_series(...) of `codes`; songs missing from the store get an empty row."""
+        return align_series([self.series(code) for code in codes])
+
+def align_series(series_list):
+    """
+    Aligns a list of (timestamps, values) series (None for a missing song) on a shared daily grid.
+
+    Returns:
+        (days, matrix, mask) where days holds the day numbers (days since the epoch) of the grid
+        columns, matrix is a (len(series_list), len(days)) float64 array of values and mask marks
+        the cells that hold data.
+    """
+    present = [i for i, series in enumerate(series_list) if series is not None and len(series[0])]
+    if not present:
+        return np.empty(0, dtype=np.int64), np.zeros((len(series_list), 0)), np.zeros((len(series_list), 0), dtype=bool)
+    lengths = [len(series_list[i][0]) for i in present]
+    rows = np.repeat(present, lengths)
+    days_of_point = np.concatenate([series_list[i][0] for i in present]) // MS_PER_DAY
+    values = np.concatenate([series_list[i][1] for i in present])
+
+    first_day = days_of_point.min()
+    days = np.arange(first_day, days_of_point.max() + 1)
+    matrix = np.zeros((len(series_list), len(days)), dtype=np.float64)
+    mask = np.zeros((len(series_list), len(days)), dtype=bool)
+    matrix[rows, days_of_point - first_day] = values
+    mask[rows, days_of_point - first_day] = True
+    return days, matrix, mask
+
+_open_stores = {}
+
+def store_signature(platform: str):
+    # Changes when the packed file is rewritten or points are appended to its tail
+    return file_signature(store_path(platform)), file_signature(tail_paths(platform)[1])
+
+def open_series_store(platform: str):
+    """Returns the memory-mapped store for a platform, reopening it if it was rebuilt or appended to."""
+    signature = store_signature(platform)
+    if signature[0] is None:
+        _open_stores.pop(platform, None)
+        return None
+    store = _open_stores.get(platform)
+    if store is None or store.signature != signature:
+        store = SeriesStore(platform)
+        _open_stores[platform] = store
+    return store
+
+def load_series(platform: str, song_id: str):
+    """Returns a song's record from the packed store, or None if there is no store entry."""
+    store = open_series_store(platform)
+    if store is None:
+        return None
+    return store.record(song_id)
+
+def series_version(platform: str, song_id: str):
+    """
+    Data version of one song on one platform: changes when that song's store entry or CSV
+    changes, but not when other songs are ingested or the store is rebuilt around it.
+    """
+    store = open_series_store(platform)
+    return store.version(song_id) if store is not None else None, file_signature(dataset_path(platform, song_id))
+
+def load_series_matrix(platform: str, codes):
+    """Returns (days, matrix, mask) for `codes` aligned by day, or None if there is no store."""
+    store = open_series_store(platform)
+    if store is None:
+        return None
+    return store.matrix(codes)
+
+# Build the packed stores from the CSV datasets: python src/utils/series_store.py
+if __name__ == "__main__":
+    for platform in PLATFORMS:
+        count = build_series_store(platform)
+        print(f"Packed {count} {platform} series into {store_path(platform)}")
+# %%
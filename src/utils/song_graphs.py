@@ -1,209 +1,315 @@
 #%%
 import os
-import requests
+from dataclasses import dataclass
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
+from utils.series_store import MS_PER_DAY, dataset_path, load_series, read_series_csv, series_version
+from utils.series_cache import SeriesCache, series_cache
+from utils.songstats import PLATFORM_SOURCES, get_track_series
+from utils.spikes import spike_intervals
+from utils.detectors import PreparedSeries, SpikeDetector, resolve_detectors
+from utils.causation import causation_pairs, pair_metrics, pair_spikes
+from utils.metrics import stage, timed
+
+def get_series_arrays(platform: str, song_id: str):
+    """
+    Loads a song's series as (track_name, timestamps, values, artist_name, avatar), with
+    timestamps (ms) and values as read-only NumPy arrays. Reads from the packed series store
+    when it has the song, then the CSV dataset, then the Songstats API. Results are kept in
+    the process-wide series cache until the song's data version changes, so ingesting other
+    songs doesn't evict it.
+    """
+    return series_cache.get(
+        (platform, song_id), (),
+        lambda: _load_series_arrays(platform, song_id),
+        version=series_version(platform, song_id)
+    )
 
-def get_spotify_playlist_series(song_id: str):
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    csv_path = os.path.join(current_dir, f"../../spotify_playlists_dataset/spotify_playlist_series_{song_id}.csv")
+def _load_series_arrays(platform: str, song_id: str):
+    record = load_series(platform, song_id)
+    if record is not None:
+        return record
+
+    csv_path = dataset_path(platform, song_id)
     if os.path.exists(csv_path):
-        with open(csv_path, 'r') as f:
-            lines = f.readlines()
-            track_name = lines[0].strip()
-            data = [(int(line.split(',')[0]), int(line.split(',')[1])) for line in lines[1:-2] if line.strip()]
-            artist_name = lines[-2].strip()
-            avatar = lines[-1].strip()
-        return track_name, data, artist_name, avatar
-
-    res = requests.get(f"https://data.songstats.com/api/v1/analytics_track/{song_id}/top?source=spotify")
-    if res.status_code != 200:
+        record = read_series_csv(csv_path)
+        record[1].flags.writeable = False
+        record[2].flags.writeable = False
+        return record
+
+    source, _ = PLATFORM_SOURCES[platform]
+    track = get_track_series(song_id, source)
+    record = track.platform_record(platform, points=90) if track is not None else None
+    if record is None:
         return None
-    parsed_data = res.json()
-    if parsed_data['result'] == 'success':
-        track_name = parsed_data['trackInfo']['trackName']
-        last_90_data = parsed_data['chart']['seriesData'][0]['data'][-90:] if len(parsed_data['chart']['seriesData'][0]['data']) >= 90 else parsed_data['chart']['seriesData'][0]['data'][len(parsed_data['chart']['seriesData'][0]['data']):]
-        artist_name = parsed_data['trackInfo']['artistName']
-        avatar = parsed_data['trackInfo']['avatar']
-        return track_name, last_90_data, artist_name, avatar
+    track_name, last_90_data, artist_name, avatar = record
+    if len(last_90_data) < 90:
+        last_90_data = []
+    timestamps = np.array([entry[0] for entry in last_90_data], dtype=np.int64)
+    values = np.array([entry[1] for entry in last_90_data], dtype=np.float64)
+    timestamps.flags.writeable = False
+    values.flags.writeable = False
+    return track_name, timestamps, values, artist_name, avatar
+
+def get_series(platform: str, song_id: str):
+    record = get_series_arrays(platform, song_id)
+    if record is None:
+        return None
+    track_name, timestamps, values, artist_name, avatar = record
+    return track_name, list(zip(timestamps.tolist(), values.tolist())), artist_name, avatar
+
+def get_spotify_playlist_series(song_id: str):
+    return get_series('spotify_playlist', song_id)
 
 def get_spotify_reach_series(song_id: str):
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    csv_path = os.path.join(current_dir, f"../../spotify_reach_dataset/spotify_reach_series_{song_id}.csv")
-    if os.path.exists(csv_path):
-        with open(csv_path, 'r') as f:
-            lines = f.readlines()
-            track_name = lines[0].strip()
-            data = [(int(line.split(',')[0]), int(line.split(',')[1])) for line in lines[1:-2] if line.strip()]
-            artist_name = lines[-2].strip()
-            avatar = lines[-1].strip()
-        return track_name, data, artist_name, avatar
-
-    res = requests.get(f"https://data.songstats.com/api/v1/analytics_track/{song_id}/top?source=spotify")
-    if res.status_code != 200:
-        return None
-    parsed_data = res.json()
-    if parsed_data['result'] == 'success':
-        track_name = parsed_data['trackInfo']['trackName']
-        last_90_data = parsed_data['chart']['seriesData'][0]['data'][-90:] if len(parsed_data['chart']['seriesData'][0]['data']) >= 90 else parsed_data['chart']['seriesData'][0]['data'][len(parsed_data['chart']['seriesData'][0]['data']):]
-        artist_name = parsed_data['trackInfo']['artistName']
-        avatar = parsed_data['trackInfo']['avatar']
-        return track_name, last_90_data, artist_name, avatar
+    return get_series('spotify_reach', song_id)
 
 def get_tiktok_series(song_id: str):
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    csv_path = os.path.join(current_dir, f"../../tiktok_series_dataset/tiktok_series_{song_id}.csv")
-    if os.path.exists(csv_path):
-        with open(csv_path, 'r') as f:
-            lines = f.readlines()
-            track_name = lines[0].strip()
-            data = [(int(line.split(',')[0]), int(line.split(',')[1])) for line in lines[1:-2] if line.strip()]
-            artist_name = lines[-2].strip()
-            avatar = lines[-1].strip()
-        return track_name, data, artist_name, avatar
-
-    res = requests.get(f"https://data.songstats.com/api/v1/analytics_track/{song_id}/top?source=tiktok")
-    if res.status_code != 200:
-        return None
-    parsed_data = res.json()
-    if parsed_data['result'] == 'success':
-        track_name = parsed_data['trackInfo']['trackName']
-        last_90_data = parsed_data['chart']['seriesData'][0]['data'][-90:] if len(parsed_data['chart']['seriesData'][0]['data']) >= 90 else parsed_data['chart']['seriesData'][0]['data'][len(parsed_data['chart']['seriesData'][0]['data']):]
-        artist_name = parsed_data['trackInfo']['artistName']
-        avatar = parsed_data['trackInfo']['avatar']
-        return track_name, last_90_data, artist_name, avatar
-
-def find_spikes_in_normalized_series(spotify_id: str, tiktok_id: str):
-    # Retrieve series data
-    spotify_data = get_spotify_reach_series(spotify_id)[1]
-    tiktok_data = get_tiktok_series(tiktok_id)[1]
-
-    if spotify_data is None or tiktok_data is None:
+    return get_series('tiktok', song_id)
+
+def detect_spikes(dates, normalized, period: int = 2, sigma: float = 1.0, baseline_window: int = None,
+                  robust: bool = False):
+    """
+    Finds the spikes in one normalized series: windows where the change over `period` points
+    is above the mean change plus `sigma` standard deviations. Overlapping windows are merged.
+    baseline_window takes the mean and deviation over that many trailing changes instead of
+    the whole series, and robust uses the median and median absolute deviation.
+
+    Returns:
+        (spike_dates, spike_values) with spike_dates a list of (start, end) dates and
+        spike_values the matching (normalized_start, normalized_end) values.
+    """
+    normalized = np.asarray(normalized, dtype=np.float64)
+    starts, ends = spike_intervals(normalized, period, sigma, baseline_window, robust)
+
+    # Read the interval dates and values by position
+    spike_dates = list(zip(dates[starts], dates[ends]))
+    spike_values = list(zip(normalized[starts], normalized[ends]))
+    return spike_dates, spike_values
+
+@timed('find_spikes_in_normalized_series')
+def find_spikes_in_normalized_series(spotify_id: str, tiktok_id: str, period: int = 2, sigma: float = 1.0,
+                                     baseline_window: int = None, robust: bool = False):
+    analysis = get_song_analysis(spotify_id, tiktok_id, period=period, sigma=sigma, baseline_window=baseline_window,
+                                 robust=robust)
+    if analysis is None:
         print("Error fetching one or both data series.")
         return [], []
+    return (list(analysis.spotify_spike_dates), list(analysis.spotify_spike_values)), \
+        (list(analysis.tiktok_spike_dates), list(analysis.tiktok_spike_values))
+
+def determine_causation(spotify_spikes, tiktok_spikes, window_days: int = 20):
+    """
+    Pairs adjacent Spotify and TikTok spikes where the second starts within `window_days` of
+    the first one's end. Takes and returns spikes as (start, end) timestamp tuples; see
+    causation.pair_spikes.
+    """
+    def stamps(spikes, i):
+        return np.array([spike[i] for spike in spikes], dtype='datetime64[ns]').astype(np.int64)
+
+    leads, spotify_index, tiktok_index = pair_spikes(
+        stamps(spotify_spikes, 0), stamps(spotify_spikes, 1),
+        stamps(tiktok_spikes, 0), stamps(tiktok_spikes, 1),
+        pd.Timedelta(days=window_days).value
+    )
+    return causation_pairs(spotify_spikes, tiktok_spikes, leads, spotify_index, tiktok_index)
+
+@dataclass(frozen=True)
+class SongAnalysis:
+    """
+    Everything the graphs and aggregate statistics need for one (spotify_id, tiktok_id) pair,
+    computed in a single pass: aligned dates, normalized series, spike intervals and values,
+    causation pairs, and the coefficient and delay of each pair.
+
+    coefficients[i] and delays[i] belong to causation[i]. The coefficient is the change of the
+    following spike divided by the change of the leading spike (NaN if the leading spike is flat)
+    and the delay is the number of days between the two spike starts. detector is the rule that
+    found and paired the spikes.
+    """
+    spotify_id: str
+    tiktok_id: str
+    track_name: str
+    artist_name: str
+    avatar: str
+    spotify_dates: pd.DatetimeIndex
+    spotify_normalized: pd.Series
+    tiktok_dates: pd.DatetimeIndex
+    tiktok_normalized: pd.Series
+    spotify_spike_dates: list
+    spotify_spike_values: list
+    tiktok_spike_dates: list
+    tiktok_spike_values: list
+    causation: list
+    coefficients: list
+    delays: list
+    detector: SpikeDetector = SpikeDetector()
+
+    def series(self, platform: str):
+        # (dates, normalized) of 'spotify' or 'tiktok'
+        if platform == 'spotify':
+            return self.spotify_dates, self.spotify_normalized
+        return self.tiktok_dates, self.tiktok_normalized
+
+    def value_at(self, platform: str, date):
+        dates, normalized = self.series(platform)
+        return normalized.iloc[dates.get_loc(date)]
+
+    @property
+    def spotify_first(self):
+        # [(coefficient, delay)] for pairs where Spotify spiked first
+        return [(coef, delay) for (_, start_type, _, _), coef, delay in zip(self.causation, self.coefficients, self.delays)
+                if start_type == 'spotify' and not np.isnan(coef)]
+
+    @property
+    def tiktok_first(self):
+        # [(coefficient, delay)] for pairs where TikTok spiked first
+        return [(coef, delay) for (_, start_type, _, _), coef, delay in zip(self.causation, self.coefficients, self.delays)
+                if start_type == 'tiktok' and not np.isnan(coef)]
+
+@dataclass(frozen=True)
+class PreparedSong:
+    # A song's two series loaded, dated and normalized once, shared by every detector run on it
+    spotify_record: tuple
+    tiktok_record: tuple
+    spotify_dates: pd.DatetimeIndex
+    tiktok_dates: pd.DatetimeIndex
+    spotify: PreparedSeries
+    tiktok: PreparedSeries
+
+def prepare_song(spotify_id: str, tiktok_id: str):
+    with stage('load'):
+        spotify_record = get_series_arrays('spotify_reach', spotify_id)
+        tiktok_record = get_series_arrays('tiktok', tiktok_id)
+    if spotify_record is None or tiktok_record is None:
+        return None
+
+    # Convert timestamps to datetime objects (epoch in ms) and normalize the values
+    with stage('normalize'):
+        return PreparedSong(
+            spotify_record=spotify_record,
+            tiktok_record=tiktok_record,
+            spotify_dates=pd.to_datetime(spotify_record[1], unit='ms'),
+            tiktok_dates=pd.to_datetime(tiktok_record[1], unit='ms'),
+            spotify=PreparedSeries(spotify_record[2]),
+            tiktok=PreparedSeries(tiktok_record[2])
+        )
+
+def detect_song(spotify_id: str, tiktok_id: str, prepared: PreparedSong, detector: SpikeDetector = SpikeDetector()):
+    """Runs one detector over a prepared song; None when either series is missing."""
+    if prepared is None:
+        return None
+    spotify_record, tiktok_record = prepared.spotify_record, prepared.tiktok_record
+    spotify_dates, tiktok_dates = prepared.spotify_dates, prepared.tiktok_dates
+    spotify_values, tiktok_values = prepared.spotify.normalized, prepared.tiktok.normalized
+
+    with stage('detect'):
+        spotify_starts, spotify_ends = detector.intervals(prepared.spotify)
+        tiktok_starts, tiktok_ends = detector.intervals(prepared.tiktok)
+        spotify_spike_dates = list(zip(spotify_dates[spotify_starts], spotify_dates[spotify_ends]))
+        tiktok_spike_dates = list(zip(tiktok_dates[tiktok_starts], tiktok_dates[tiktok_ends]))
+        spotify_spike_values = list(zip(spotify_values[spotify_starts], spotify_values[spotify_ends]))
+        tiktok_spike_values = list(zip(tiktok_values[tiktok_starts], tiktok_values[tiktok_ends]))
+
+    with stage('pair'):
+        # Pair the spikes on integer day numbers
+        spotify_days = spotify_record[1] // MS_PER_DAY
+        tiktok_days = tiktok_record[1] // MS_PER_DAY
+        leads, spotify_index, tiktok_index = pair_spikes(
+            spotify_days[spotify_starts], spotify_days[spotify_ends],
+            tiktok_days[tiktok_starts], tiktok_days[tiktok_ends],
+            detector.window_days
+        )
+        causation = causation_pairs(spotify_spike_dates, tiktok_spike_dates, leads, spotify_index, tiktok_index)
+
+        # Gather each pair's spike changes and start days by position
+        spotify_change = spotify_values[spotify_ends] - spotify_values[spotify_starts]
+        tiktok_change = tiktok_values[tiktok_ends] - tiktok_values[tiktok_starts]
+        coefficients, delays = pair_metrics(
+            leads, spotify_change[spotify_index], tiktok_change[tiktok_index],
+            spotify_days[spotify_starts][spotify_index], tiktok_days[tiktok_starts][tiktok_index]
+        )
+
+    return SongAnalysis(
+        spotify_id=spotify_id,
+        tiktok_id=tiktok_id,
+        track_name=spotify_record[0],
+        artist_name=spotify_record[3],
+        avatar=spotify_record[4],
+        spotify_dates=spotify_dates,
+        spotify_normalized=pd.Series(spotify_values),
+        tiktok_dates=tiktok_dates,
+        tiktok_normalized=pd.Series(tiktok_values),
+        spotify_spike_dates=spotify_spike_dates,
+        spotify_spike_values=spotify_spike_values,
+        tiktok_spike_dates=tiktok_spike_dates,
+        tiktok_spike_values=tiktok_spike_values,
+        causation=causation,
+        coefficients=coefficients.tolist(),
+        delays=delays.tolist(),
+        detector=detector
+    )
 
-    # Extract timestamps and values (assumes [timestamp, value] structure)
-    spotify_timestamps = [entry[0] for entry in spotify_data]
-    tiktok_timestamps = [entry[0] for entry in tiktok_data]
-    spotify_values = [entry[1] for entry in spotify_data]
-    tiktok_values = [entry[1] for entry in tiktok_data]
-
-    # Convert timestamps to datetime objects (assuming epoch in ms)
-    spotify_dates = pd.to_datetime(spotify_timestamps, unit='ms')
-    tiktok_dates = pd.to_datetime(tiktok_timestamps, unit='ms')
-
-    # Normalize the values
-    spotify_series = pd.Series(spotify_values)
-    tiktok_series = pd.Series(tiktok_values)
-    def min_max_normalize(lst):
-        min_val = min(lst) if len(lst) else 0 
-        max_val = max(lst) if len(lst) else 0
-        return [(x - min_val) / (max_val - min_val + pow(1, -8)) for x in lst] # check for division by 0
-    spotify_normalized = pd.Series(min_max_normalize(spotify_series))
-    tiktok_normalized = pd.Series(min_max_normalize(tiktok_series))
-
-    # Calculate the change in normalized values every 2 days
-    spotify_changes = spotify_normalized.diff(periods=2).dropna()
-    tiktok_changes = tiktok_normalized.diff(periods=2).dropna()
-
-    # Calculate the average of all 2-day derivatives
-    avg_spotify_change = spotify_changes.mean() + spotify_changes.std()
-    avg_tiktok_change = tiktok_changes.mean() + tiktok_changes.std()
-
-    # Identify spikes where the 2-day derivative is greater than the average
-    spotify_spikes = spotify_changes[spotify_changes > avg_spotify_change]
-    tiktok_spikes = tiktok_changes[tiktok_changes > avg_tiktok_change]
-
-    # Create a list of tuples representing the spikes
-    spotify_spike_dates = [(spotify_dates[i], spotify_dates[min(i + 2, len(spotify_dates) - 1)]) for i in spotify_spikes.index - 2]
-    tiktok_spike_dates = [(tiktok_dates[i], tiktok_dates[min(i + 2, len(tiktok_dates) - 1)]) for i in tiktok_spikes.index - 2]
-
-    # Function to combine overlapping intervals
-    def combine_intervals(intervals):
-        if not intervals:
-            return intervals
-        intervals.sort()
-        combined = [intervals[0]]
-        for current in intervals[1:]:
-            last = combined[-1]
-            if current[0] <= last[1]:
-                combined[-1] = (last[0], max(last[1], current[1]))
-            else:
-                combined.append(current)
-        return combined
-
-    # Combine overlapping intervals
-    spotify_spike_dates = combine_intervals(spotify_spike_dates)
-    tiktok_spike_dates = combine_intervals(tiktok_spike_dates)
-
-    # Get the normalized values for each spike
-    spotify_spike_values = [(spotify_normalized.loc[spotify_dates == start].values[0], spotify_normalized.loc[spotify_dates == end].values[0]) for start, end in spotify_spike_dates]
-    tiktok_spike_values = [(tiktok_normalized.loc[tiktok_dates == start].values[0], tiktok_normalized.loc[tiktok_dates == end].values[0]) for start, end in tiktok_spike_dates]
-
-    return (spotify_spike_dates, spotify_spike_values), (tiktok_spike_dates, tiktok_spike_values)
-
-def determine_causation(spotify_spikes, tiktok_spikes):
-    causation = []
-    all_spikes = [(date, 'spotify') for date in spotify_spikes] + [(date, 'tiktok') for date in tiktok_spikes]
-    all_spikes.sort()
-
-    used_times = set()
-
-    for i in range(len(all_spikes) - 1):
-        current_spike, current_type = all_spikes[i]
-        next_spike, next_type = all_spikes[i + 1]
-
-        if current_spike[0] in used_times or next_spike[0] in used_times:
-            continue
-
-        if next_spike[0] <= current_spike[1] + pd.Timedelta(days=20):
-            if current_type == 'spotify' and next_type == 'tiktok':
-                causation.append((current_spike, 'spotify', next_spike, 'tiktok'))
-                used_times.add(current_spike[0])
-                used_times.add(next_spike[0])
-            elif current_type == 'tiktok' and next_type == 'spotify':
-                causation.append((current_spike, 'tiktok', next_spike, 'spotify'))
-                used_times.add(current_spike[0])
-                used_times.add(next_spike[0])
-
-    return causation
-
-def plot_normalized_series_with_spikes(spotify_id: str, tiktok_id: str):
-    # Retrieve series data
-    spotify_data = get_spotify_reach_series(spotify_id)[1]
-    song_name = get_spotify_reach_series(spotify_id)[0]
-    tiktok_data = get_tiktok_series(tiktok_id)[1]
-
-    if spotify_data is None or tiktok_data is None:
+def analyze_song(spotify_id: str, tiktok_id: str, period: int = 2, sigma: float = 1.0, window_days: int = 20,
+                 baseline_window: int = None, robust: bool = False):
+    detector = SpikeDetector(period, sigma, baseline_window, robust, window_days)
+    return detect_song(spotify_id, tiktok_id, prepare_song(spotify_id, tiktok_id), detector)
+
+def analyze_song_detectors(spotify_id: str, tiktok_id: str, detectors=None):
+    """
+    Runs several detectors over one load and normalization of the song, sharing the changes
+    of each period between them. detectors is anything resolve_detectors accepts.
+
+    Returns:
+        {detector_id: SongAnalysis}, with None values when either series is missing.
+    """
+    prepared = prepare_song(spotify_id, tiktok_id)
+    return {detector_id: detect_song(spotify_id, tiktok_id, prepared, detector)
+            for detector_id, detector in resolve_detectors(detectors).items()}
+
+def song_data_version(spotify_id: str, tiktok_id: str):
+    # Changes only when one of the two series an analysis reads was re-ingested
+    return series_version('spotify_reach', spotify_id), series_version('tiktok', tiktok_id)
+
+# Prepared songs are memoized per ids and analyses per (ids, detector); both are dropped when the song's data version changes
+analysis_cache = SeriesCache(max_entries=int(os.environ.get('TOKAPI_ANALYSIS_CACHE_SIZE', 256)))
+
+def get_song_analyses(spotify_id: str, tiktok_id: str, detectors=None):
+    """
+    Cached analyze_song_detectors. The prepared song is cached next to the analyses, so a
+    detector that hasn't seen the song's current data yet reuses its loaded and normalized
+    series (and the changes of any period another detector already computed).
+    """
+    version = song_data_version(spotify_id, tiktok_id)
+
+    def analyze(detector):
+        prepared = analysis_cache.get((spotify_id, tiktok_id), (), lambda: prepare_song(spotify_id, tiktok_id), version=version)
+        return detect_song(spotify_id, tiktok_id, prepared, detector)
+
+    return {
+        detector_id: analysis_cache.get(
+            (spotify_id, tiktok_id, detector), (), lambda detector=detector: analyze(detector), version=version
+        )
+        for detector_id, detector in resolve_detectors(detectors).items()
+    }
+
+def get_song_analysis(spotify_id: str, tiktok_id: str, period: int = 2, sigma: float = 1.0, window_days: int = 20,
+                      baseline_window: int = None, robust: bool = False):
+    detector = SpikeDetector(period, sigma, baseline_window, robust, window_days)
+    return get_song_analyses(spotify_id, tiktok_id, {'': detector})['']
+
+@timed('plot_normalized_series_with_spikes')
+def plot_normalized_series_with_spikes(spotify_id: str, tiktok_id: str, analysis: SongAnalysis = None):
+    analysis = analysis or get_song_analysis(spotify_id, tiktok_id)
+    if analysis is None:
         print("Error fetching one or both data series.")
-        return None, None, None, None
-
-    # Extract timestamps and values (assumes [timestamp, value] structure)
-    spotify_timestamps = [entry[0] for entry in spotify_data]
-    tiktok_timestamps = [entry[0] for entry in tiktok_data]
-    spotify_values = [entry[1] for entry in spotify_data]
-    tiktok_values = [entry[1] for entry in tiktok_data]
-
-    # Convert timestamps to datetime objects (assuming epoch in ms)
-    spotify_dates = pd.to_datetime(spotify_timestamps, unit='ms')
-    tiktok_dates = pd.to_datetime(tiktok_timestamps, unit='ms')
-
-    # Normalize the values
-    spotify_series = pd.Series(spotify_values)
-    tiktok_series = pd.Series(tiktok_values)
-    def min_max_normalize(lst):
-        min_val = min(lst) if len(lst) else 0 
-        max_val = max(lst) if len(lst) else 0
-        return [(x - min_val) / (max_val - min_val + pow(1, -8)) for x in lst] # check for division by 0
-    spotify_normalized = pd.Series(min_max_normalize(spotify_series))
-    tiktok_normalized = pd.Series(min_max_normalize(tiktok_series))
-
-    # Find spikes
-    (spotify_spike_dates, spotify_spike_values), (tiktok_spike_dates, tiktok_spike_values) = find_spikes_in_normalized_series(spotify_id, tiktok_id)
-    
-    # Determine causation
-    causation = determine_causation(spotify_spike_dates, tiktok_spike_dates)
-    
+        return None, None, None, None, None
+
+    song_name = analysis.track_name
+    spotify_dates, spotify_normalized = analysis.spotify_dates, analysis.spotify_normalized
+    tiktok_dates, tiktok_normalized = analysis.tiktok_dates, analysis.tiktok_normalized
+    causation = analysis.causation
+
     # Create Plotly figure
     fig = go.Figure()
 
@@ -224,10 +330,10 @@ def plot_normalized_series_with_spikes(spotify_id: str, tiktok_id: str):
     ))
 
     # Add markers for causation spikes and shade the causation areas
-    for (start_spike, start_type, end_spike, end_type) in causation:
+    for (start_spike, start_type, end_spike, end_type), coefficient in zip(causation, analysis.coefficients):
         if start_type == 'spotify' and end_type == 'tiktok':
-            start_val = spotify_normalized.loc[spotify_dates == start_spike[0]].values[0]
-            end_val = tiktok_normalized.loc[tiktok_dates == end_spike[1]].values[0]
+            start_val = analysis.value_at('spotify', start_spike[0])
+            end_val = analysis.value_at('tiktok', end_spike[1])
             fig.add_shape(
                 type="line",
                 x0=start_spike[0],
@@ -262,11 +368,8 @@ def plot_normalized_series_with_spikes(spotify_id: str, tiktok_id: str):
                 marker=dict(color=['blue', 'red'], size=10),
                 name='Critical Points'
             ))
-            # Calculate the coefficient as the change in TikTok divided by the change in Spotify
-            tiktok_change = end_val - tiktok_normalized.loc[tiktok_dates == end_spike[0]].values[0]
-            spotify_change = spotify_normalized.loc[spotify_dates == start_spike[1]].values[0] - start_val
-            if spotify_change != 0:
-                coefficient = tiktok_change / spotify_change
+            # The coefficient is the change in TikTok divided by the change in Spotify
+            if not np.isnan(coefficient):
                 mid_point = start_spike[0] + (end_spike[1] - start_spike[0]) / 2
                 delay = abs((end_spike[1] - start_spike[0]).days)
                 fig.add_annotation(
@@ -280,8 +383,8 @@ def plot_normalized_series_with_spikes(spotify_id: str, tiktok_id: str):
                     font=dict(size=12, color="black", weight="bold")
                 )
         elif start_type == 'tiktok' and end_type == 'spotify':
-            start_val = tiktok_normalized.loc[tiktok_dates == start_spike[0]].values[0]
-            end_val = spotify_normalized.loc[spotify_dates == end_spike[1]].values[0]
+            start_val = analysis.value_at('tiktok', start_spike[0])
+            end_val = analysis.value_at('spotify', end_spike[1])
             fig.add_shape(
                 type="line",
                 x0=start_spike[0],
@@ -316,11 +419,8 @@ def plot_normalized_series_with_spikes(spotify_id: str, tiktok_id: str):
                 marker=dict(color=['red', 'blue'], size=10),
                 name='Critical Points'
             ))
-            # Calculate the coefficient as the change in Spotify divided by the change in TikTok
-            spotify_change = end_val - spotify_normalized.loc[spotify_dates == end_spike[0]].values[0]
-            tiktok_change = tiktok_normalized.loc[tiktok_dates == start_spike[1]].values[0] - start_val
-            if tiktok_change != 0:
-                coefficient = spotify_change / tiktok_change
+            # The coefficient is the change in Spotify divided by the change in TikTok
+            if not np.isnan(coefficient):
                 mid_point = start_spike[0] + (end_spike[1] - start_spike[0]) / 2
                 delay = abs((end_spike[1] - start_spike[0]).days)
                 fig.add_annotation(
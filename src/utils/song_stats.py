@@ -1,6 +1,6 @@
-import requests
 import pandas as pd
 import os
+from utils.songstats import get_track_series
 
 def get_spotify_playlist_series(song_id: str):
     csv_path = f"../../spotify_playlists_dataset/spotify_playlist_series_{song_id}.csv"
@@ -10,14 +10,9 @@ def get_spotify_playlist_series(song_id: str):
         last_90_data = df[['timestamp', 'value']].values.tolist()
         return track_name, last_90_data
 
-    res = requests.get(f"https://data.songstats.com/api/v1/analytics_track/{song_id}/top?source=spotify")
-    if res.status_code != 200:
-        return None
-    parsed_data = res.json()
-    if parsed_data['result'] == 'success':
-        track_name = parsed_data['trackInfo']['trackName']
-        last_90_data = parsed_data['chart']['seriesData'][0]['data'][-90:]
-        return track_name, last_90_data
+    track = get_track_series(song_id, 'spotify')
+    record = track.platform_record('spotify_playlist') if track else None
+    return record[:2] if record else None
 
 def get_spotify_reach_series(song_id: str):
     csv_path = f"../../spotify_reach_dataset/spotify_reach_series_{song_id}.csv"
@@ -27,14 +22,9 @@ def get_spotify_reach_series(song_id: str):
         last_90_data = df[['timestamp', 'value']].values.tolist()
         return track_name, last_90_data
 
-    res = requests.get(f"https://data.songstats.com/api/v1/analytics_track/{song_id}/top?source=spotify")
-    if res.status_code != 200:
-        return None
-    parsed_data = res.json()
-    if parsed_data['result'] == 'success':
-        track_name = parsed_data['trackInfo']['trackName']
-        last_90_data = parsed_data['chart']['seriesData'][1]['data'][-90:]
-        return track_name, last_90_data
+    track = get_track_series(song_id, 'spotify')
+    record = track.platform_record('spotify_reach') if track else None
+    return record[:2] if record else None
 
 def get_tiktok_series(song_id: str):
     csv_path = f"../../tiktok_series_dataset/tiktok_series_{song_id}.csv"
@@ -44,53 +34,21 @@ def get_tiktok_series(song_id: str):
         last_90_data = df[['timestamp', 'value']].values.tolist()
         return track_name, last_90_data
 
-    res = requests.get(f"https://data.songstats.com/api/v1/analytics_track/{song_id}/top?source=tiktok")
-    if res.status_code != 200:
-        return None
-    parsed_data = res.json()
-    if parsed_data['result'] == 'success':
-        track_name = parsed_data['trackInfo']['trackName']
-        last_90_data = parsed_data['chart']['seriesData'][0]['data'][-90:]
-        return track_name, last_90_data
+    track = get_track_series(song_id, 'tiktok')
+    record = track.platform_record('tiktok') if track else None
+    return record[:2] if record else None
 
 def get_youtube_series(song_id: str): # video views
-    res = requests.get(f"https://data.songstats.com/api/v1/analytics_track/{song_id}/top?source=youtube")
-    if res.status_code != 200:
-        return None
-    
-    parsed_data = res.json()
-    if parsed_data['result'] == 'success':
-        track_name = parsed_data['trackInfo']['trackName']
-        artist_name = parsed_data['trackInfo']['artistName']
-        avatar = parsed_data['trackInfo']['avatar']
-        last_90_data = parsed_data['chart']['seriesData'][0]['data'][-90:]
-        return track_name, last_90_data, artist_name, avatar
+    track = get_track_series(song_id, 'youtube')
+    return track.record(0) if track else None
 
 def get_shazam_series(song_id: str): # shazams
-    res = requests.get(f"https://data.songstats.com/api/v1/analytics_track/{song_id}/top?source=shazam")
-    if res.status_code != 200:
-        return None
-    
-    parsed_data = res.json()
-    if parsed_data['result'] == 'success':
-        track_name = parsed_data['trackInfo']['trackName']
-        artist_name = parsed_data['trackInfo']['artistName']
-        avatar = parsed_data['trackInfo']['avatar']
-        last_90_data = parsed_data['chart']['seriesData'][0]['data'][-90:]
-        return track_name, last_90_data, artist_name, avatar
+    track = get_track_series(song_id, 'shazam')
+    return track.record(0) if track else None
     
 def get_soundcloud_series(song_id: str): # streams
-    res = requests.get(f"https://data.songstats.com/api/v1/analytics_track/{song_id}/top?source=soundcloud")
-    if res.status_code != 200:
-        return None
-    
-    parsed_data = res.json()
-    if parsed_data['result'] == 'success':
-        track_name = parsed_data['trackInfo']['trackName']
-        artist_name = parsed_data['trackInfo']['artistName']
-        avatar = parsed_data['trackInfo']['avatar']
-        last_90_data = parsed_data['chart']['seriesData'][0]['data'][-90:]
-        return track_name, last_90_data, artist_name, avatar
+    track = get_track_series(song_id, 'soundcloud')
+    return track.record(0) if track else None
     
 # print(get_spotify_reach_series(song_id='njtwgzci'))
-print(get_soundcloud_series(song_id='njtwgzci'))
+# print(get_soundcloud_series(song_id='njtwgzci'))
@@ -0,0 +1,85 @@
+#%%
+import os
+from dataclasses import dataclass
+from utils.series_cache import SeriesCache
+from utils.http_cache import http_cache
+from utils.songstats_crawler import SONGSTATS_URL, track_url
+
+# seriesData of each source, in Songstats order: {source: [(series name, platform dataset)]}
+SOURCE_SERIES = {
+    'spotify': [('Playlists', 'spotify_playlist'), ('Playlist Reach', 'spotify_reach')],
+    'tiktok': [('Videos', 'tiktok')],
+}
+
+# {platform dataset: (source, index in seriesData)}
+PLATFORM_SOURCES = {
+    platform: (source, index)
+    for source, series in SOURCE_SERIES.items()
+    for index, (_, platform) in enumerate(series)
+}
+
+@dataclass(frozen=True)
+class TrackSeries:
+    """
+    Everything one Songstats source response holds for a track: the track metadata and every
+    entry of seriesData as (name, data) in payload order.
+    """
+    song_id: str
+    source: str
+    track_name: str
+    artist_name: str
+    avatar: str
+    series: tuple
+
+    def record(self, index: int = 0, points: int = 90):
+        # (track_name, last `points` entries of seriesData[index] (all for None), artist_name, avatar),
+        # or None
+        if index >= len(self.series):
+            return None
+        data = self.series[index][1]
+        return self.track_name, data[-points:] if points else data, self.artist_name, self.avatar
+
+    def platform_record(self, platform: str, points: int = 90):
+        # record() of a platform dataset's series, or None if this source doesn't hold it
+        source, index = PLATFORM_SOURCES[platform]
+        return self.record(index, points) if source == self.source else None
+
+    def platform_records(self, points: int = 90):
+        # {platform dataset: record} for every dataset this response holds
+        records = {}
+        for _, platform in SOURCE_SERIES.get(self.source, []):
+            record = self.platform_record(platform, points)
+            if record is not None:
+                records[platform] = record
+        return records
+
+def parse_track_series(song_id: str, source: str, parsed_data):
+    """Extracts a TrackSeries from a decoded Songstats response, or None if it isn't a success."""
+    if not parsed_data or parsed_data.get('result') != 'success':
+        return None
+    track_info = parsed_data['trackInfo']
+    series = tuple((entry.get('name'), entry['data']) for entry in parsed_data['chart']['seriesData'])
+    return TrackSeries(song_id, source, track_info['trackName'], track_info['artistName'], track_info['avatar'], series)
+
+def fetch_track_series(song_id: str, source: str, session=None, base_url: str = SONGSTATS_URL):
+    """
+    Downloads one source's payload for a song, or None if it isn't available. Goes through the
+    on-disk HTTP cache unless a session is given.
+    """
+    url = track_url(song_id, source, base_url)
+    res = session.get(url) if session is not None else http_cache.get(url)
+    if res.status_code != 200:
+        return None
+    return parse_track_series(song_id, source, res.json())
+
+# Decoded source payloads by response body, so the datasets sharing a source (Spotify
+# playlists and reach) cost one request and one JSON decode between them
+track_cache = SeriesCache(max_entries=int(os.environ.get('TOKAPI_TRACK_CACHE_SIZE', 128)))
+
+def get_track_series(song_id: str, source: str):
+    """fetch_track_series through the HTTP cache, decoding each distinct body once."""
+    res = http_cache.get(track_url(song_id, source))
+    if res.status_code != 200:
+        return None
+    return track_cache.get((song_id, source, res.digest), (), lambda: parse_track_series(song_id, source, res.json()))
+# %%
@@ -0,0 +1,207 @@
+#%%
+import os
+import json
+import time
+import random
+import asyncio
+import requests
+from urllib.parse import urlparse
+from utils.http_cache import make_session
+
+SONGSTATS_URL = os.environ.get('SONGSTATS_URL', 'https://data.songstats.com/api/v1')
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+def track_url(song_id: str, source: str, base_url: str = SONGSTATS_URL):
+    return f"{base_url}/analytics_track/{song_id}/top?source={source}"
+
+class HostRateLimiter:
+    """Spaces requests to the same host at least 1 / rate_per_second seconds apart."""
+
+    def __init__(self, rate_per_second: float):
+        self.interval = 1 / rate_per_second if rate_per_second else 0
+        self._next_slot = {}
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, host: str):
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def backoff(self, host: str, delay: float):
+        # Push the host's next slot back, e.g. after a 429 with Retry-After
+        async with self._lock:
+            self._next_slot[host] = max(self._next_slot.get(host, 0), time.monotonic() + delay)
+
+class SongstatsCrawler:
+    """
+    Fetches Songstats track payloads concurrently. At most `max_in_flight` requests run at once,
+    requests to one host are rate limited, and failed requests are retried with exponential
+    backoff. Blocking requests calls run on worker threads so a single pooled session is reused.
+    """
+
+    def __init__(self, base_url: str = SONGSTATS_URL, max_in_flight: int = 16, rate_per_host: float = 10.0,
+                 retries: int = 4, backoff: float = 0.5, timeout: float = 30, session: requests.Session = None):
+        self.base_url = base_url
+        self.max_in_flight = max_in_flight
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = session or make_session(max_in_flight)
+        self.rate_limiter = HostRateLimiter(rate_per_host)
+        self.requests_sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.failed_units = set()
+
+    async def fetch(self, song_id: str, source: str):
+        """Returns the parsed payload for (song_id, source), or None if it isn't available."""
+        url = track_url(song_id, source, self.base_url)
+        host = urlparse(url).netloc
+        for attempt in range(self.retries + 1):
+            await self.rate_limiter.acquire(host)
+            self.requests_sent += 1
+            try:
+                res = await asyncio.to_thread(self.session.get, url, timeout=self.timeout)
+            except requests.RequestException:
+                res = None
+
+            if res is not None and res.status_code not in RETRY_STATUSES:
+                if res.status_code != 200:
+                    return None
+                try:
+                    parsed_data = res.json()
+                    success = parsed_data.get('result') == 'success'
+                except (ValueError, AttributeError):
+                    # A truncated body, or JSON that isn't an object, is retried like a server
+                    # error and fails the unit if it keeps coming
+                    res = None
+                else:
+                    return parsed_data if success else None
+
+            if attempt == self.retries:
+                break
+            # Exponential backoff with jitter, or the server's Retry-After if it sent one
+            delay = self.backoff * 2 ** attempt * (1 + random.random())
+            retry_after = res.headers.get('Retry-After') if res is not None else None
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, int(retry_after))
+                await self.rate_limiter.backoff(host, delay)
+            self.retried += 1
+            await asyncio.sleep(delay)
+
+        self.failed += 1
+        self.failed_units.add((song_id, source))
+        return None
+
+    async def crawl(self, units):
+        """
+        Fetches every (song_id, source) unit once, yielding (song_id, source, payload) in
+        completion order. payload is None for units that failed (see failed_units) or have
+        no data.
+        """
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        async def run(song_id, source):
+            async with semaphore:
+                return song_id, source, await self.fetch(song_id, source)
+
+        tasks = [asyncio.ensure_future(run(song_id, source)) for song_id, source in dict.fromkeys(units)]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+class CrawlJournal:
+    """
+    Append-only JSONL record of the (song_id, source) units a crawl has finished, so an
+    interrupted crawl can resume where it stopped. A line torn by a crash is ignored.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+        self._file = None
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.entries[(entry['song_id'], entry['source'])] = entry
+
+    def __contains__(self, unit):
+        return tuple(unit) in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def record(self, song_id: str, source: str, **details):
+        entry = {'song_id': song_id, 'source': source, **details}
+        if self._file is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # Start on a fresh line if the previous run died mid-write
+            torn = False
+            if os.path.exists(self.path) and os.path.getsize(self.path):
+                with open(self.path, 'rb') as f:
+                    f.seek(-1, os.SEEK_END)
+                    torn = f.read(1) != b'\n'
+            self._file = open(self.path, 'a', encoding='utf-8')
+            if torn:
+                self._file.write('\n')
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+        self.entries[(song_id, source)] = entry
+
+    def close(self):
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        # Drop the journal once a crawl has finished, so the next run starts over
+        self.close()
+        self.entries.clear()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+class CrawlProgress:
+    """Prints done/total, throughput and ETA at most every `interval` seconds."""
+
+    def __init__(self, total: int, done: int = 0, interval: float = 5.0):
+        self.total = total
+        self.done = done
+        self.interval = interval
+        self.start = time.monotonic()
+        self._first = done
+        self._last_report = self.start
+
+    def update(self, count: int = 1):
+        self.done += count
+        now = time.monotonic()
+        if now - self._last_report >= self.interval or self.done == self.total:
+            self._last_report = now
+            print(self.report())
+
+    def report(self):
+        elapsed = time.monotonic() - self.start
+        rate = (self.done - self._first) / elapsed if elapsed > 0 else 0.0
+        remaining = self.total - self.done
+        eta = f"{remaining / rate:.0f}s" if rate > 0 else "?"
+        return f"{self.done}/{self.total} units, {rate:.1f} units/s, ETA {eta}"
+
+def fetch_all(units, **crawler_options):
+    """Synchronous helper: {(song_id, source): payload} for every unit."""
+    async def collect():
+        crawler = SongstatsCrawler(**crawler_options)
+        return {(song_id, source): payload async for song_id, source, payload in crawler.crawl(units)}
+    return asyncio.run(collect())
+# %%
@@ -0,0 +1,488 @@
+#%%
+import math
+import warnings
+from dataclasses import dataclass
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from utils.rolling import RollingMedian
+
+def min_max_normalize(values):
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        return values
+    min_val = values.min()
+    max_val = values.max()
+    return (values - min_val) / (max_val - min_val + 1e-8) # check for division by 0
+
+def period_changes(normalized, period: int = 2):
+    # changes[k] is the change from point k to point k + period
+    normalized = np.asarray(normalized, dtype=np.float64)
+    if len(normalized) <= period:
+        return np.empty(0, dtype=np.float64)
+    return normalized[period:] - normalized[:-period]
+
+def spike_threshold(changes, sigma: float = 1.0):
+    # Mean plus sigma sample standard deviations, NaN when there are fewer than two changes
+    if len(changes) < 2:
+        return np.nan
+    return changes.mean() + sigma * changes.std(ddof=1)
+
+def rolling_thresholds(changes, valid, window: int, sigma: float = 1.0):
+    # rolling_threshold_terms combined for one sigma, floored at zero (see threshold_floor)
+    center, spread = rolling_threshold_terms(changes, valid, window)
+    return np.maximum(center + sigma * spread, 0.0)
+
+def threshold_floor(baseline_window: int = None, robust: bool = False):
+    # A declining stretch can pull a trailing-window or median threshold to zero or below, where
+    # flat and falling changes would pass it. Those thresholds are floored at zero so a spike
+    # is always a rise
+    return 0.0 if baseline_window or robust else -np.inf
+
+def rolling_threshold_terms(changes, valid, window: int):
+    """
+    Trailing-window spike thresholds for each row of a (songs, n) array of changes: the mean
+    plus `sigma` sample standard deviations of the valid changes among the last `window`
+    columns up to and including each one (fewer at the start of a row). NaN where that window
+    holds fewer than two valid changes. Returned as (center, spread) arrays with the threshold
+    for `sigma` at center + sigma * spread, so many sigmas can share one pass.
+
+    Runs in O(songs * n) from running sums of the changes and their squares. Each row is
+    shifted by its mean first, so the sums stay on the scale of the deviations. The running
+    sums restart every `window` columns, so their rounding error doesn't grow with the history.
+    Windows whose variance is below the rounding noise of the squares count as flat and get an
+    infinite threshold, so cancellation noise never turns a flat stretch into spikes.
+    """
+    changes = np.asarray(changes, dtype=np.float64)
+    valid = np.asarray(valid, dtype=bool)
+    weights = valid.astype(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        totals = weights.sum(axis=1, keepdims=True)
+        shift = np.where(totals > 0, np.where(valid, changes, 0.0).sum(axis=1, keepdims=True) / totals, 0.0)
+    deviations = np.where(valid, changes - shift, 0.0)
+
+    n = changes.shape[1]
+    n_blocks = -(-n // window)
+    ends = np.arange(window - 1, n)
+    straddling = ends[(ends + 1) % window != 0]
+
+    def trailing(a):
+        # Window sums from prefix sums within blocks of `window` columns plus suffix sums of the
+        # previous block, so rounding error is bounded by the window, not the history length
+        blocks = np.zeros((a.shape[0], n_blocks * window))
+        blocks[:, :n] = a
+        blocks = blocks.reshape(a.shape[0], n_blocks, window)
+        sums = np.cumsum(blocks, axis=2).reshape(a.shape[0], -1)[:, :n]
+        suffixes = np.cumsum(blocks[:, :, ::-1], axis=2)[:, :, ::-1].reshape(a.shape[0], -1)
+        sums[:, straddling] += suffixes[:, straddling - window + 1]
+        return sums
+
+    counts = np.rint(trailing(weights))
+    sums = trailing(deviations)
+    squares = trailing(deviations * deviations)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+        variances = (squares - sums * means) / (counts - 1)
+        noise = 4 * window * np.finfo(np.float64).eps * squares / (counts - 1)
+    flat = ~(variances > noise)
+    # In a flat window every change equals the mean, so none is a spike; an infinite threshold
+    # keeps rounding in the mean from deciding that
+    center = np.where(counts >= 2, np.where(flat, np.inf, shift + means), np.nan)
+    return center, np.sqrt(np.where(flat, 0.0, variances))
+
+# Turn a MAD (or, where the MAD is zero, a mean absolute deviation) into the standard deviation
+# it implies for normal noise, so sigma means the same in the robust and mean/std modes
+MAD_SCALE = 1.4826
+MEAN_AD_SCALE = 1.2533
+
+def robust_spread(mad, mean_absolute_deviation):
+    # More than half of a window can share one change (stale days), which zeroes the MAD
+    return np.where(mad > 0, MAD_SCALE * mad, MEAN_AD_SCALE * mean_absolute_deviation)
+
+def robust_threshold(changes, sigma: float = 1.0):
+    # Median plus sigma robust deviations of all the changes, floored at zero (see
+    # threshold_floor); NaN when there are fewer than two
+    if len(changes) < 2:
+        return np.nan
+    median = np.median(changes)
+    deviations = np.abs(changes - median)
+    return max(median + sigma * float(robust_spread(np.median(deviations), deviations.mean())), 0.0)
+
+def rolling_robust_thresholds(changes, window: int, sigma: float = 1.0):
+    """
+    robust_threshold over the trailing `window` changes of each change, like rolling_thresholds.
+    Keeps the window in a RollingMedian, so each step costs O(log^2 window).
+    """
+    thresholds = np.full(len(changes), np.nan)
+    rolling = RollingMedian(window)
+    for k, change in enumerate(np.asarray(changes, dtype=np.float64).tolist()):
+        rolling.push(change)
+        if len(rolling) < 2:
+            continue
+        median = rolling.median()
+        mad = rolling.mad(median)
+        spread = MAD_SCALE * mad if mad > 0 else MEAN_AD_SCALE * rolling.mean_absolute_deviation(median)
+        thresholds[k] = max(median + sigma * spread, 0.0)
+    return thresholds
+
+def _window_medians(windows, counts):
+    # Medians along the last axis, ignoring NaN: sorting moves the NaN to the end, so each
+    # window's middle elements sit at positions given by its count of valid values
+    ordered = np.sort(windows, axis=-1)
+    lower = np.maximum((counts - 1) // 2, 0)[..., None]
+    upper = (counts // 2)[..., None]
+    medians = (np.take_along_axis(ordered, lower, -1) + np.take_along_axis(ordered, upper, -1))[..., 0] / 2
+    return np.where(counts > 0, medians, np.nan)
+
+def batch_robust_thresholds(changes, valid, window: int = None, sigma: float = 1.0, chunk_cells: int = 2**24):
+    # batch_robust_terms combined for one sigma, floored at zero
+    center, spread = batch_robust_terms(changes, valid, window, chunk_cells)
+    return np.maximum(center + sigma * spread, 0.0)
+
+def batch_robust_terms(changes, valid, window: int = None, chunk_cells: int = 2**24):
+    """
+    Median/MAD thresholds for each row of a (songs, n) array of changes, over the valid changes
+    of the whole row (a (songs, 1) column) or, with `window`, of the trailing `window` columns
+    (a (songs, n) array). NaN where fewer than two changes are valid. Returned as (median,
+    spread) with the threshold for `sigma` at median + sigma * spread.
+
+    The windowed path sorts a sliding_window_view of the changes, a few rows at a time so no
+    more than `chunk_cells` window cells are materialized at once.
+    """
+    changes = np.where(valid, changes, np.nan)
+    with warnings.catch_warnings():
+        # All-NaN windows (no valid changes) are expected and come out as NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        if window is None:
+            median = np.nanmedian(changes, axis=1, keepdims=True)
+            deviations = np.abs(changes - median)
+            spread = robust_spread(np.nanmedian(deviations, axis=1, keepdims=True), np.nanmean(deviations, axis=1, keepdims=True))
+            counts = valid.sum(axis=1, keepdims=True)
+            return np.where(counts >= 2, median, np.nan), spread
+
+        n_songs, n = changes.shape
+        padded = np.concatenate((np.full((n_songs, window - 1), np.nan), changes), axis=1)
+        centers = np.empty((n_songs, n))
+        spreads = np.empty((n_songs, n))
+        rows = max(1, chunk_cells // max(n * window, 1))
+        for first in range(0, n_songs, rows):
+            windows = sliding_window_view(padded[first:first + rows], window, axis=1)
+            counts = window - np.isnan(windows).sum(axis=2)
+            median = _window_medians(windows, counts)
+            deviations = np.abs(windows - median[..., None])
+            spreads[first:first + rows] = robust_spread(_window_medians(deviations, counts), np.nanmean(deviations, axis=2))
+            centers[first:first + rows] = np.where(counts >= 2, median, np.nan)
+        return centers, spreads
+
+def merge_spike_windows(starts, period: int, length: int):
+    """
+    Merges the (start, start + period) windows of sorted spike starts into non-overlapping
+    intervals. A window joins the previous interval when it starts on or before that
+    interval's end.
+
+    Returns:
+        (interval_starts, interval_ends) as int64 position arrays.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    if not len(starts):
+        return starts, starts.copy()
+    ends = np.minimum(starts + period, length - 1)
+    breaks = np.flatnonzero(starts[1:] > ends[:-1]) + 1
+    first = np.concatenate(([0], breaks))
+    last = np.concatenate((breaks - 1, [len(starts) - 1]))
+    return starts[first], ends[last]
+
+def spike_intervals(normalized, period: int = 2, sigma: float = 1.0, baseline_window: int = None, robust: bool = False):
+    """
+    Finds the spikes in a normalized series: windows where the change over `period` points is
+    above the mean change plus `sigma` standard deviations, merged where they overlap.
+    Runs in O(n) with no per-spike scans.
+
+    The mean and standard deviation are taken over the whole series by default. With
+    baseline_window they're taken over the trailing `baseline_window` changes of each window
+    instead (see rolling_thresholds), so quiet and viral eras of a long history each get
+    their own baseline.
+
+    robust replaces the mean and standard deviation with the median and the scaled median
+    absolute deviation, so a single viral day doesn't raise the threshold for every other one.
+
+    Returns:
+        (starts, ends) int64 arrays of interval positions in the series.
+    """
+    changes = period_changes(normalized, period)
+    threshold = spike_thresholds(changes, sigma, baseline_window, robust)
+    # A NaN threshold compares False everywhere, so short series have no spikes
+    starts = np.flatnonzero(changes > threshold)
+    return merge_spike_windows(starts, period, len(normalized))
+
+def spike_thresholds(changes, sigma: float = 1.0, baseline_window: int = None, robust: bool = False):
+    # The threshold spike_intervals compares each change against: one for the whole series, or
+    # one per change with baseline_window
+    if robust:
+        return rolling_robust_thresholds(changes, baseline_window, sigma) if baseline_window else robust_threshold(changes, sigma)
+    if baseline_window:
+        return rolling_thresholds(changes[None, :], np.ones((1, len(changes)), dtype=bool), baseline_window, sigma)[0]
+    return spike_threshold(changes, sigma)
+
+def batch_normalize(matrix, mask):
+    # Min-max normalizes each row of a (songs, days) matrix over its valid cells
+    matrix = np.asarray(matrix, dtype=np.float64)
+    min_vals = np.where(mask, matrix, np.inf).min(axis=1, keepdims=True)
+    max_vals = np.where(mask, matrix, -np.inf).max(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore'):
+        return (matrix - min_vals) / (max_vals - min_vals + 1e-8)
+
+def pack_rows(matrix, mask):
+    """
+    Moves the valid cells of each row of a (songs, days) matrix to the front, in order, so
+    position k of a row is its k-th data point as in the song's own series. Changes and
+    trailing windows over the packed matrix then step over missing days the way
+    spike_intervals does.
+
+    Returns:
+        (packed, packed_mask, columns) with columns[song, k] the matrix column of packed[song, k].
+    """
+    counts = mask.sum(axis=1)
+    width = int(counts.max(initial=0))
+    rows, cols = np.nonzero(mask)
+    positions = np.cumsum(mask, axis=1)[rows, cols] - 1
+    packed = np.zeros((mask.shape[0], width), dtype=np.float64)
+    packed[rows, positions] = matrix[rows, cols]
+    columns = np.zeros((mask.shape[0], width), dtype=np.int64)
+    columns[rows, positions] = cols
+    return packed, np.arange(width) < counts[:, None], columns
+
+def batch_spike_intervals(matrix, mask=None, period: int = 2, sigma: float = 1.0, baseline_window: int = None,
+                          robust: bool = False):
+    """
+    Finds the spikes of many songs at once. matrix is a (songs, days) array of aligned series
+    and mask marks which cells hold data. Each row is normalized over its valid cells, and
+    changes and windows are taken over each row's data points by position (see pack_rows), so
+    every song gets the same intervals as spike_intervals on its own series.
+    baseline_window (trailing-window thresholds) and robust (median/MAD thresholds) work as
+    in spike_intervals.
+
+    Returns:
+        (songs, starts, ends) int64 arrays with one entry per merged interval, ordered by song
+        and then start position (column in the matrix).
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    mask = np.isfinite(matrix) if mask is None else np.asarray(mask, dtype=bool)
+    packed, packed_mask, columns = pack_rows(matrix, mask)
+    songs, starts, ends = batch_normalized_spike_intervals(
+        batch_normalize(packed, packed_mask), packed_mask, period, sigma, baseline_window, robust
+    )
+    return songs, columns[songs, starts], columns[songs, ends]
+
+def batch_normalized_spike_intervals(normalized, mask, period: int = 2, sigma: float = 1.0, baseline_window: int = None,
+                                     robust: bool = False):
+    # batch_spike_intervals for a matrix that is already normalized
+    if normalized.shape[1] <= period:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty.copy(), empty.copy()
+    changes, valid = batch_period_changes(normalized, mask, period)
+    thresholds = batch_spike_thresholds(changes, valid, sigma, baseline_window, robust)
+    songs, starts = np.nonzero(valid & (changes > thresholds))
+    return merge_batch_windows(songs, starts, period)
+
+def batch_period_changes(normalized, mask, period: int = 2):
+    """
+    Changes over `period` days of each row of a (songs, days) matrix. A change is valid when
+    both of its endpoints are; invalid changes are zeroed.
+
+    Returns:
+        (changes, valid), both (songs, days - period).
+    """
+    changes = normalized[:, period:] - normalized[:, :-period]
+    valid = mask[:, period:] & mask[:, :-period]
+    return np.where(valid, changes, 0.0), valid
+
+def batch_spike_thresholds(changes, valid, sigma: float = 1.0, baseline_window: int = None, robust: bool = False):
+    # spike_thresholds for each row of batch_period_changes: a (songs, 1) column, or (songs, n)
+    # with baseline_window
+    center, spread = batch_threshold_terms(changes, valid, baseline_window, robust)
+    return np.maximum(center + sigma * spread, threshold_floor(baseline_window, robust))
+
+def batch_threshold_terms(changes, valid, baseline_window: int = None, robust: bool = False):
+    """
+    batch_spike_thresholds split into (center, spread), the threshold for any sigma being
+    center + sigma * spread: the mean and sample standard deviation of each row's valid changes
+    by default, their trailing-window versions with baseline_window, or the median and scaled
+    MAD when robust. Both are (songs, 1) columns or (songs, n) arrays, NaN where a threshold is
+    undefined. Thresholds are floored at threshold_floor(baseline_window, robust).
+    """
+    if robust:
+        return batch_robust_terms(changes, valid, baseline_window)
+    if baseline_window:
+        return rolling_threshold_terms(changes, valid, baseline_window)
+    counts = valid.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = changes.sum(axis=1) / counts
+        deviations = np.where(valid, changes - means[:, None], 0.0)
+        stds = np.sqrt((deviations * deviations).sum(axis=1) / (counts - 1))
+    return np.where(counts >= 2, means, np.nan)[:, None], stds[:, None]
+
+def merge_batch_windows(songs, starts, period: int):
+    # merge_spike_windows for windows of many songs, sorted by (song, start)
+    songs = np.asarray(songs, dtype=np.int64)
+    starts = np.asarray(starts, dtype=np.int64)
+    if not len(starts):
+        return songs, starts, starts.copy()
+    ends = starts + period
+    breaks = np.flatnonzero((songs[1:] != songs[:-1]) | (starts[1:] > ends[:-1])) + 1
+    first = np.concatenate(([0], breaks))
+    last = np.concatenate((breaks - 1, [len(starts) - 1]))
+    return songs[first], starts[first], ends[last]
+
+def split_by_song(songs, n_songs: int, *arrays):
+    # Splits flat per-interval arrays sorted by song into one list entry per song
+    bounds = np.searchsorted(songs, np.arange(n_songs + 1))
+    return [tuple(array[bounds[i]:bounds[i + 1]] for array in arrays) for i in range(n_songs)]
+
+@dataclass(frozen=True)
+class SpikeUpdate:
+    """
+    What one new point changed in a StreamingSpikeDetector.
+
+    position is the point's index in the series. interval is the index (into
+    detector.intervals()) of the interval the point created or extended, or None. extended
+    tells which of the two happened. range_changed means the min or max moved, so the
+    normalized values of every earlier interval changed but not their positions. stale means
+    the threshold moved past a window that was decided under an older one, so the intervals
+    are provisional until reevaluate().
+    """
+    position: int
+    interval: int = None
+    extended: bool = False
+    range_changed: bool = False
+    stale: bool = False
+
+class StreamingSpikeDetector:
+    """
+    Incremental spike_intervals for one (song, platform) series that receives new daily points.
+
+    Min-max normalization divides every change by the same positive range, so a window is a
+    spike on the normalized series exactly when its raw change is above the raw mean change
+    plus `sigma` standard deviations. The detector therefore keeps Welford running statistics of
+    the raw `period`-point changes and never rescales anything when the min or max moves; the
+    normalized values of an interval are computed from its raw endpoints on read.
+
+    Each point is classified against the threshold as it stands when the point arrives, in O(1).
+    The weakest accepted change and the strongest rejected one are tracked so every update can
+    tell, also in O(1), whether the threshold has since drifted past an earlier decision. Once
+    it has, stale_intervals() lists the intervals affected and reevaluate() reclassifies the
+    stored changes against the current threshold, after which the intervals equal
+    spike_intervals(min_max_normalize(values)).
+    """
+
+    def __init__(self, period: int = 2, sigma: float = 1.0):
+        self.period = period
+        self.sigma = sigma
+        self.timestamps = []
+        self.values = []
+        self.changes = []  # changes[k] = values[k + period] - values[k]
+        self.min = math.inf
+        self.max = -math.inf
+        # Welford running count, mean and sum of squared deviations of the changes
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self._starts = []
+        self._ends = []
+        self._weakest_spike = math.inf
+        self._strongest_quiet = -math.inf
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def threshold(self):
+        # Mean plus sigma sample standard deviations of the raw changes, NaN below two changes
+        if self.count < 2:
+            return math.nan
+        return self.mean + self.sigma * math.sqrt(self.m2 / (self.count - 1))
+
+    @property
+    def stale(self):
+        threshold = self.threshold
+        return threshold >= self._weakest_spike or threshold < self._strongest_quiet
+
+    def update(self, timestamp, value):
+        """Adds the next point of the series and returns a SpikeUpdate."""
+        value = float(value)
+        position = len(self.values)
+        self.timestamps.append(timestamp)
+        self.values.append(value)
+        range_changed = position > 0 and (value < self.min or value > self.max)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if position < self.period:
+            return SpikeUpdate(position, range_changed=range_changed, stale=self.stale)
+
+        change = value - self.values[position - self.period]
+        self.changes.append(change)
+        self.count += 1
+        delta = change - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (change - self.mean)
+
+        interval = None
+        extended = False
+        start = position - self.period
+        if change > self.threshold:
+            self._weakest_spike = min(self._weakest_spike, change)
+            if self._ends and start <= self._ends[-1]:
+                self._ends[-1] = position
+                extended = True
+            else:
+                self._starts.append(start)
+                self._ends.append(position)
+            interval = len(self._starts) - 1
+        else:
+            self._strongest_quiet = max(self._strongest_quiet, change)
+        return SpikeUpdate(position, interval, extended, range_changed, self.stale)
+
+    def extend(self, timestamps, values):
+        """Adds several points in order and returns their SpikeUpdates."""
+        return [self.update(timestamp, value) for timestamp, value in zip(timestamps, values)]
+
+    def intervals(self):
+        # (starts, ends) int64 position arrays, as spike_intervals returns them
+        return np.array(self._starts, dtype=np.int64), np.array(self._ends, dtype=np.int64)
+
+    def normalize(self, value):
+        return (value - self.min) / (self.max - self.min + 1e-8)
+
+    def interval_values(self):
+        # [(normalized_start, normalized_end)] of every interval under the current min and max
+        return [(self.normalize(self.values[start]), self.normalize(self.values[end]))
+                for start, end in zip(self._starts, self._ends)]
+
+    def stale_intervals(self):
+        """
+        Indexes of the intervals holding a window that is no longer above the threshold, and
+        (start, end) windows now above it that no interval covers yet.
+        """
+        threshold = self.threshold
+        changes = np.asarray(self.changes)
+        starts, ends = self.intervals()
+        flips = np.flatnonzero(changes <= threshold) if threshold >= self._weakest_spike else np.empty(0, dtype=np.int64)
+        # An interval covers window k when start <= k <= end - period
+        covering = np.searchsorted(starts, flips, side='right') - 1
+        dropped = sorted({int(i) for i, k in zip(covering, flips) if i >= 0 and k <= ends[i] - self.period})
+        rising = np.flatnonzero(changes > threshold) if threshold < self._strongest_quiet else np.empty(0, dtype=np.int64)
+        covering = np.searchsorted(starts, rising, side='right') - 1
+        added = [(int(k), int(k) + self.period) for i, k in zip(covering, rising)
+                 if i < 0 or k > ends[i] - self.period]
+        return dropped, added
+
+    def reevaluate(self):
+        """Reclassifies every stored change against the current threshold and returns intervals()."""
+        changes = np.asarray(self.changes, dtype=np.float64)
+        spikes = changes > self.threshold
+        starts, ends = merge_spike_windows(np.flatnonzero(spikes), self.period, len(self.values))
+        self._starts = starts.tolist()
+        self._ends = ends.tolist()
+        self._weakest_spike = changes[spikes].min() if spikes.any() else math.inf
+        self._strongest_quiet = changes[~spikes].max() if (~spikes).any() else -math.inf
+        return self.intervals()
+# %%
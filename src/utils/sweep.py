@@ -0,0 +1,208 @@
+#%%
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from utils.corpus import prepare_corpus
+from utils.causation import SPOTIFY, pair_metrics, pair_spikes_windows
+from utils.spikes import batch_threshold_terms, merge_batch_windows, threshold_floor
+
+# (leader, metric) columns of the sweep table, in the order of the moment arrays
+METRICS = (('spotify', 'coef'), ('spotify', 'delay'), ('tiktok', 'coef'), ('tiktok', 'delay'))
+
+def sweep_spikes(days, prepared, period: int, sigmas, baseline_window: int = None, robust: bool = False,
+                 chunk_cells: int = 2**24):
+    """
+    Spike intervals of every song in a PreparedMatrix for every sigma at once. The changes and
+    the threshold terms are computed once per period; each sigma only adds one comparison.
+
+    Returns:
+        (groups, start_days, end_days, changes) with one entry per interval, where
+        groups = sigma_index * n_songs + song.
+    """
+    n_songs, n_days = prepared.normalized.shape
+    if n_days <= period:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, days[empty], days[empty], np.empty(0)
+
+    changes, valid = prepared.changes(period)
+    center, spread = batch_threshold_terms(changes, valid, baseline_window, robust)
+    floor = threshold_floor(baseline_window, robust)
+    sigmas = np.asarray(sigmas, dtype=np.float64)
+
+    # A few sigmas at a time, so no more than chunk_cells comparisons are materialized at once
+    groups, starts = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+    step = max(1, chunk_cells // max(changes.size, 1))
+    for first in range(0, len(sigmas), step):
+        thresholds = np.maximum(center + sigmas[first:first + step, None, None] * spread, floor)
+        index, songs, chunk_starts = np.nonzero(valid & (changes > thresholds))
+        groups.append((index + first) * n_songs + songs)
+        starts.append(chunk_starts)
+
+    # np.nonzero yields (sigma, song, start) order, which is what merging needs
+    groups, starts, ends = merge_batch_windows(np.concatenate(groups), np.concatenate(starts), period)
+    songs = groups % n_songs
+    interval_changes = prepared.normalized[songs, ends] - prepared.normalized[songs, starts]
+    return groups, days[prepared.columns[songs, starts]], days[prepared.columns[songs, ends]], interval_changes
+
+def _moments(settings, values, n_settings: int):
+    # (count, mean, sum of squared deviations) of values per setting, in two passes
+    counts = np.bincount(settings, minlength=n_settings).astype(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.bincount(settings, values, n_settings) / counts
+    deviations = values - means[settings]
+    return np.stack((counts, np.nan_to_num(means), np.bincount(settings, deviations * deviations, n_settings)))
+
+def merge_moments(a, b):
+    # Chan et al.'s pairwise update of (count, mean, M2) arrays
+    count_a, mean_a, m2_a = a
+    count_b, mean_b, m2_b = b
+    counts = count_a + count_b
+    with np.errstate(invalid='ignore', divide='ignore'):
+        delta = mean_b - mean_a
+        means = np.where(counts > 0, mean_a + delta * count_b / counts, 0.0)
+        m2 = m2_a + m2_b + np.where(counts > 0, delta * delta * count_a * count_b / counts, 0.0)
+    return np.stack((counts, means, m2))
+
+def sweep_prepared(spotify_matrix, tiktok_matrix, periods, sigmas, windows, baseline_window: int = None,
+                   robust: bool = False):
+    """
+    Causation pair statistics for every (period, sigma, window) of the grid over songs that are
+    already aligned and prepared: both arguments are (days, PreparedMatrix) tuples with the
+    same song rows.
+
+    For each period the spikes of all sigmas come from one sweep_spikes call per platform, and
+    the pairs of every (sigma, window) from one pair_spikes_windows call, which sorts them once.
+
+    Returns:
+        A (len(METRICS), 3, n_settings) array of (count, mean, M2) moments per metric, with
+        settings in (period, sigma, window) order.
+    """
+    spotify_days, spotify_prepared = spotify_matrix
+    tiktok_days, tiktok_prepared = tiktok_matrix
+    n_songs = spotify_prepared.normalized.shape[0]
+    windows = np.asarray(windows, dtype=np.int64)
+    n_sigmas, n_windows = len(sigmas), len(windows)
+    per_period = n_sigmas * n_windows
+
+    moments = np.zeros((len(METRICS), 3, len(periods) * per_period))
+    for p, period in enumerate(periods):
+        s_groups, s_start, s_end, s_change = sweep_spikes(spotify_days, spotify_prepared, period, sigmas, baseline_window, robust)
+        t_groups, t_start, t_end, t_change = sweep_spikes(tiktok_days, tiktok_prepared, period, sigmas, baseline_window, robust)
+
+        window_index, groups, leads, spotify_index, tiktok_index = pair_spikes_windows(
+            s_groups, s_start, s_end, t_groups, t_start, t_end, windows
+        )
+        coefficients, delays = pair_metrics(
+            leads, s_change[spotify_index], t_change[tiktok_index], s_start[spotify_index], t_start[tiktok_index]
+        )
+
+        settings = groups // n_songs * n_windows + window_index
+        keep = ~np.isnan(coefficients)
+        columns = slice(p * per_period, (p + 1) * per_period)
+        for m, (leader, metric) in enumerate(METRICS):
+            selected = keep & ((leads == SPOTIFY) == (leader == 'spotify'))
+            values = coefficients if metric == 'coef' else delays.astype(np.float64)
+            moments[m, :, columns] = _moments(settings[selected], values[selected], per_period)
+    return moments
+
+def sweep_corpus(codes, periods, sigmas, windows, baseline_window: int = None, robust: bool = False):
+    # sweep_prepared for a list of song codes (used as both the Spotify and TikTok id)
+    return sweep_prepared(prepare_corpus('spotify_reach', codes), prepare_corpus('tiktok', codes),
+                          periods, sigmas, windows, baseline_window, robust)
+
+def _sweep_chunk(args):
+    # Worker entry point; like corpus._categorize_chunk, only the codes and the grid are pickled
+    return sweep_corpus(*args)
+
+def sweep(codes, periods=(2,), sigmas=(1.0,), windows=(20,), baseline_window: int = None, robust: bool = False,
+          workers: int = None, chunk_size: int = 500):
+    """
+    Aggregate C and t_d over a corpus for every (period, sigma, window_days) of a grid. The
+    series are loaded, aligned and normalized once per chunk of `chunk_size` songs. Chunks run
+    in `workers` processes (one per core by default), and their moments are merged exactly.
+
+    Returns:
+        A DataFrame with one row per setting: period, sigma and window_days, then the pair
+        count and the mean and sample standard deviation of the coefficients and delays for
+        each leader (spotify_pairs, spotify_coef_avg, spotify_coef_std, spotify_delay_avg, ...).
+        Empty averages and standard deviations of fewer than two pairs are 0, as in
+        categorize_data.aggregate, so a single-setting sweep gives the same numbers.
+    """
+    periods, sigmas, windows = list(periods), list(sigmas), list(windows)
+    workers = workers or os.cpu_count() or 1
+    chunks = [(codes[i:i + chunk_size], periods, sigmas, windows, baseline_window, robust)
+              for i in range(0, len(codes), chunk_size)]
+    if workers == 1 or len(chunks) <= 1:
+        results = list(map(_sweep_chunk, chunks))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            results = list(pool.map(_sweep_chunk, chunks))
+
+    n_settings = len(periods) * len(sigmas) * len(windows)
+    moments = np.zeros((len(METRICS), 3, n_settings))
+    for result in results:
+        moments = np.stack([merge_moments(total, chunk) for total, chunk in zip(moments, result)])
+
+    grid = np.array(np.meshgrid(periods, sigmas, windows, indexing='ij'), dtype=object).reshape(3, -1)
+    table = pd.DataFrame({
+        'period': grid[0].astype(np.int64),
+        'sigma': grid[1].astype(np.float64),
+        'window_days': grid[2].astype(np.int64),
+    })
+    for (leader, metric), (counts, means, m2) in zip(METRICS, moments):
+        if metric == 'coef':
+            table[f'{leader}_pairs'] = counts.astype(np.int64)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            stds = np.where(counts > 1, np.sqrt(m2 / (counts - 1)), 0.0)
+        table[f'{leader}_{metric}_avg'] = np.where(counts > 0, means, 0.0)
+        table[f'{leader}_{metric}_std'] = stds
+    return table
+
+def sensitivity_bands(table, quantiles=(0.05, 0.5, 0.95)):
+    """
+    Quantiles of each aggregate across the settings of a sweep table, one row per aggregate
+    (spotify_coef_avg, ...) and one column per quantile: the band a headline number moves in
+    over the grid.
+    """
+    columns = [column for column in table.columns if column.endswith(('_avg', '_std'))]
+    return table[columns].quantile(list(quantiles)).T
+
+def grid_values(spec: str, kind=float):
+    # 'start:stop:count' for an inclusive linspace, or a comma separated list
+    if ':' in spec:
+        start, stop, count = spec.split(':')
+        return [kind(value) for value in np.unique(np.linspace(float(start), float(stop), int(count)).astype(kind))]
+    return [kind(value) for value in spec.split(',')]
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep C and t_d over a grid of spike detection settings for every song in utils/songs.")
+    parser.add_argument('--periods', default='1:10:10', help="diff periods, 'start:stop:count' or a comma separated list")
+    parser.add_argument('--sigmas', default='0.5:3:10', help="threshold sigma multipliers")
+    parser.add_argument('--windows', default='5:50:10', help="pairing windows in days")
+    parser.add_argument('--baseline-window', type=int, default=None,
+                        help="spike thresholds over this many trailing days instead of the whole series")
+    parser.add_argument('--robust', action='store_true', help="median/MAD spike thresholds instead of mean/std")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument('--chunk-size', type=int, default=500, help="songs per worker task")
+    parser.add_argument('--out', help="write the table to this CSV file instead of printing it")
+    args = parser.parse_args()
+
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(current_dir, "songs")) as file:
+        codes = file.read().splitlines()
+
+    table = sweep(codes, grid_values(args.periods, int), grid_values(args.sigmas), grid_values(args.windows, int),
+                  args.baseline_window, args.robust, args.workers, args.chunk_size)
+    if args.out:
+        table.to_csv(args.out, index=False)
+        print(f"Wrote {len(table)} settings to {args.out}")
+    else:
+        print(table.to_string(index=False))
+    print(sensitivity_bands(table).to_string())
+
+# Run from src/: python -m utils.sweep --periods 1:10:10 --sigmas 0.5:3:10 --windows 5:50:10 --out sweep.csv
+if __name__ == "__main__":
+    main()
+# %%
@@ -0,0 +1,207 @@
+#%%
+import os
+import string
+import argparse
+from dataclasses import dataclass
+import numpy as np
+from utils.series_store import MS_PER_DAY, PLATFORMS, dataset_path, write_series_csv, write_series_store
+
+# Last day of the bundled corpus (2025-02-23). Synthetic series end here so a seed always
+# produces the same files
+END_TIMESTAMP = 1_740_268_800_000
+
+# (median starting level, spread of the starting level in log space) per platform
+BASE_LEVELS = {
+    'spotify_reach': (1_000_000, 1.5),
+    'tiktok': (50_000, 2.0),
+    'spotify_playlist': (500, 1.2),
+}
+
+MAX_LOG_LEVEL = np.log(1e12)
+
+@dataclass(frozen=True)
+class CorpusParams:
+    """
+    Shape of a synthetic corpus.
+
+    Each song gets spike events at `spike_rate` per day. TikTok starts an event with
+    probability `tiktok_lead` and Spotify otherwise; the other platform follows `lag_days`
+    (inclusive range) later with a jump of about `response` times the leader's. TikTok counts
+    are cumulative, while Spotify's jumps partly fade. Every platform then gets `noise` daily
+    log-noise, repeats the previous day's value with probability `stale_rate`, and loses runs
+    of days (mean length `gap_days`) that start with probability `gap_rate` per day.
+    """
+    days: int = 90
+    spike_rate: float = 1 / 30
+    tiktok_lead: float = 0.7
+    lag_days: tuple = (1, 14)
+    response: float = 0.6
+    noise: float = 0.01
+    stale_rate: float = 0.05
+    gap_rate: float = 0.01
+    gap_days: float = 3.0
+
+def song_codes(n_songs: int, seed: int = 0):
+    # Unique 8 character codes in the Songstats style
+    rng = np.random.default_rng([seed, 0])
+    alphabet = np.array(list(string.ascii_lowercase + string.digits))
+    codes = []
+    seen = set()
+    while len(codes) < n_songs:
+        for code in map(''.join, rng.choice(alphabet, size=(n_songs, 8))):
+            if code not in seen and len(codes) < n_songs:
+                seen.add(code)
+                codes.append(code)
+    return codes
+
+def song_events(seed: int, index: int, params: CorpusParams):
+    """
+    Spike events of one song, shared by its platforms.
+
+    Returns:
+        (days, tiktok_leads, lags, magnitudes, responses) arrays with one entry per event, where
+        magnitudes is the leader's relative jump and responses the follower's.
+    """
+    rng = np.random.default_rng([seed, 1, index])
+    n = rng.poisson(params.spike_rate * params.days)
+    days = np.sort(rng.integers(0, params.days, n))
+    tiktok_leads = rng.random(n) < params.tiktok_lead
+    lags = rng.integers(params.lag_days[0], params.lag_days[1] + 1, n)
+    magnitudes = rng.lognormal(np.log(0.15), 0.8, n)
+    responses = magnitudes * params.response * rng.lognormal(0, 0.5, n)
+    return days, tiktok_leads, lags, magnitudes, responses
+
+def platform_series(seed: int, index: int, platform: str, events, params: CorpusParams):
+    """Returns (timestamps, values) of one song on one platform, with gaps already removed."""
+    rng = np.random.default_rng([seed, 2 + list(PLATFORMS).index(platform), index])
+    days = params.days
+    t = np.arange(days)
+
+    median, spread = BASE_LEVELS[platform]
+    log_level = np.log(median) + spread * rng.standard_normal()
+    drift = rng.normal(0.001, 0.001)
+    log_series = log_level + np.cumsum(drift + params.noise * rng.standard_normal(days))
+
+    # The event's leader jumps on its start day; the follower jumps `lag` days later
+    event_days, tiktok_leads, lags, magnitudes, responses = events
+    leads = tiktok_leads if platform == 'tiktok' else ~tiktok_leads
+    start = np.where(leads, event_days, event_days + lags)
+    jump = np.log1p(np.where(leads, magnitudes, responses))
+    width = rng.integers(1, 4, len(start))
+    keep = start < days
+    start, jump, width = start[keep], jump[keep], width[keep]
+    if len(start):
+        # (events, days): each jump ramps in over `width` days
+        elapsed = t[None, :] - start[:, None]
+        ramp = np.clip((elapsed + 1) / width[:, None], 0, 1)
+        if platform != 'tiktok':
+            # Half of a Spotify jump fades with a two week time constant
+            ramp = ramp * (0.5 + 0.5 * np.exp(-np.maximum(elapsed, 0) / 14))
+        log_series = log_series + (jump[:, None] * ramp).sum(axis=0)
+
+    # Compounded jumps over long histories stay within realistic (and int64) counts
+    values = np.rint(np.exp(np.minimum(log_series, MAX_LOG_LEVEL)))
+    if platform == 'tiktok':
+        # Video counts never go down
+        values = np.maximum.accumulate(values)
+
+    # Stale days repeat the last fresh value
+    stale = rng.random(days) < params.stale_rate
+    stale[0] = False
+    values = values[np.maximum.accumulate(np.where(stale, 0, t))]
+
+    # Gaps drop whole runs of days
+    gap_starts = np.flatnonzero(rng.random(days) < params.gap_rate)
+    gap_lengths = rng.geometric(1 / params.gap_days, len(gap_starts))
+    coverage = np.zeros(days + 1, dtype=np.int64)
+    np.add.at(coverage, gap_starts, 1)
+    np.add.at(coverage, np.minimum(gap_starts + gap_lengths, days), -1)
+    present = np.cumsum(coverage[:-1]) == 0
+
+    timestamps = END_TIMESTAMP - (days - 1 - t[present]) * MS_PER_DAY
+    return timestamps.astype(np.int64), values[present]
+
+def song_metadata(index: int, code: str):
+    # (track_name, artist_name, avatar)
+    return f"Synthetic Track {index}", f"Synthetic Artist {index % 997}", f"https://example.com/avatars/{code}.jpg"
+
+def generate_corpus(n_songs: int, params: CorpusParams = CorpusParams(), seed: int = 0, platforms=PLATFORMS):
+    """
+    Yields (platform, code, (track_name, timestamps, values, artist_name, avatar)) for every
+    song, one platform at a time. A song's series only depend on the seed and its position,
+    so each platform can be generated (and written) without holding the others in memory.
+    """
+    codes = song_codes(n_songs, seed)
+    for platform in platforms:
+        for index, code in enumerate(codes):
+            timestamps, values = platform_series(seed, index, platform, song_events(seed, index, params), params)
+            track_name, artist_name, avatar = song_metadata(index, code)
+            yield platform, code, (track_name, timestamps, values, artist_name, avatar)
+
+def write_synthetic_corpus(data_dir: str, n_songs: int, params: CorpusParams = CorpusParams(), seed: int = 0,
+                           csv: bool = True, store: bool = True, store_dir: str = None):
+    """
+    Writes a synthetic corpus under data_dir in the same layout as the bundled one: the CSV
+    dataset folders, the packed stores (in data_dir/series_store unless store_dir is given)
+    and a `songs` file listing the codes.
+
+    Returns:
+        The song codes.
+    """
+    store_dir = store_dir or os.path.join(data_dir, 'series_store')
+    records = {}
+    current = None
+    for platform, code, record in generate_corpus(n_songs, params, seed):
+        if platform != current:
+            if store and records:
+                write_series_store(current, records, store_dir)
+            records = {}
+            current = platform
+        if csv:
+            track_name, timestamps, values, artist_name, avatar = record
+            write_series_csv(
+                dataset_path(platform, code, data_dir), track_name,
+                zip(timestamps.tolist(), values.astype(np.int64).tolist()), artist_name, avatar
+            )
+        if store:
+            records[code] = record
+    if store and records:
+        write_series_store(current, records, store_dir)
+
+    codes = song_codes(n_songs, seed)
+    os.makedirs(data_dir, exist_ok=True)
+    with open(os.path.join(data_dir, 'songs'), 'w') as f:
+        f.write('\n'.join(codes))
+    return codes
+
+def main():
+    defaults = CorpusParams()
+    parser = argparse.ArgumentParser(description="Write a seeded synthetic corpus in the dataset and store formats.")
+    parser.add_argument('data_dir', help="directory to write the corpus to")
+    parser.add_argument('--songs', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=defaults.days, help="history length per song")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--spike-rate', type=float, default=defaults.spike_rate, help="spike events per song per day")
+    parser.add_argument('--tiktok-lead', type=float, default=defaults.tiktok_lead, help="share of events TikTok starts")
+    parser.add_argument('--lag-days', type=int, nargs=2, default=defaults.lag_days, metavar=('MIN', 'MAX'))
+    parser.add_argument('--response', type=float, default=defaults.response, help="follower jump relative to the leader's")
+    parser.add_argument('--noise', type=float, default=defaults.noise, help="daily log-noise")
+    parser.add_argument('--stale-rate', type=float, default=defaults.stale_rate)
+    parser.add_argument('--gap-rate', type=float, default=defaults.gap_rate)
+    parser.add_argument('--gap-days', type=float, default=defaults.gap_days)
+    parser.add_argument('--no-csv', action='store_true', help="only write the packed stores")
+    parser.add_argument('--no-store', action='store_true', help="only write the CSV datasets")
+    args = parser.parse_args()
+
+    params = CorpusParams(
+        days=args.days, spike_rate=args.spike_rate, tiktok_lead=args.tiktok_lead, lag_days=tuple(args.lag_days),
+        response=args.response, noise=args.noise, stale_rate=args.stale_rate, gap_rate=args.gap_rate,
+        gap_days=args.gap_days
+    )
+    codes = write_synthetic_corpus(args.data_dir, args.songs, params, args.seed, csv=not args.no_csv, store=not args.no_store)
+    print(f"Wrote {len(codes)} songs x {args.days} days to {args.data_dir}")
+
+# Run from src/: python -m utils.synthetic_corpus /tmp/corpus --songs 10000 --days 1826
+if __name__ == "__main__":
+    main()
+# %%
@@ -1,59 +1,25 @@
 #%%
-from utils.song_graphs import (
-    get_spotify_reach_series,
-    get_tiktok_series,
-    find_spikes_in_normalized_series,
-    determine_causation
-)
+from utils.song_graphs import SongAnalysis, get_song_analysis
 from datetime import datetime
 import plotly.graph_objects as go
-import pandas as pd
 
-def generate_time_delay_graph(spotify_id, tiktok_id):
-    # Retrieve series data
-    spotify_data = get_spotify_reach_series(spotify_id)[1]
-    song_name = get_spotify_reach_series(spotify_id)[0]
-    tiktok_data = get_tiktok_series(tiktok_id)[1]
-
-    if spotify_data is None or tiktok_data is None:
+def generate_time_delay_graph(spotify_id, tiktok_id, analysis: SongAnalysis = None):
+    analysis = analysis or get_song_analysis(spotify_id, tiktok_id)
+    if analysis is None:
         print("Error fetching one or both data series.")
         return None
 
-    # Extract timestamps and values (assumes [timestamp, value] structure)
-    spotify_timestamps = [entry[0] for entry in spotify_data]
-    tiktok_timestamps = [entry[0] for entry in tiktok_data]
-    spotify_values = [entry[1] for entry in spotify_data]
-    tiktok_values = [entry[1] for entry in tiktok_data]
-
-    # Convert timestamps to datetime objects (assuming epoch in ms)
-    spotify_dates = pd.to_datetime(spotify_timestamps, unit='ms')
-    tiktok_dates = pd.to_datetime(tiktok_timestamps, unit='ms')
-
-    # Normalize the values
-    spotify_series = pd.Series(spotify_values)
-    tiktok_series = pd.Series(tiktok_values)
-    def min_max_normalize(lst):
-        min_val = min(lst)
-        max_val = max(lst)
-        return [(x - min_val) / (max_val - min_val + pow(1, -8)) for x in lst] # check for division by 0
-    spotify_normalized = pd.Series(min_max_normalize(spotify_series))
-    tiktok_normalized = pd.Series(min_max_normalize(tiktok_series))
-
-    # Find spikes
-    (spotify_spike_dates, spotify_spike_values), (tiktok_spike_dates, tiktok_spike_values) = find_spikes_in_normalized_series(spotify_id, tiktok_id)
-
-    causation = determine_causation(spotify_spike_dates, tiktok_spike_dates)
+    song_name = analysis.track_name
+    spotify_dates, spotify_normalized = analysis.spotify_dates, analysis.spotify_normalized
+    tiktok_dates, tiktok_normalized = analysis.tiktok_dates, analysis.tiktok_normalized
 
+    # (spotify spike start, tiktok spike start, delay) for each causation pair
     paired_spikes = []
-    for (start_spike, start_type, end_spike, end_type) in causation:
+    for (start_spike, start_type, end_spike, end_type), delay in zip(analysis.causation, analysis.delays):
         if start_type == 'spotify' and end_type == 'tiktok':
-            start_val = spotify_normalized.loc[spotify_dates == start_spike[0]].values[0]
-            end_val = tiktok_normalized.loc[tiktok_dates == end_spike[0]].values[0]
-            paired_spikes.append((start_spike[0], end_spike[0], abs(end_spike[0] - start_spike[0]).days))
+            paired_spikes.append((start_spike[0], end_spike[0], delay))
         elif start_type == 'tiktok' and end_type == 'spotify':
-            start_val = tiktok_normalized.loc[tiktok_dates == start_spike[0]].values[0]
-            end_val = spotify_normalized.loc[spotify_dates == end_spike[0]].values[0]
-            paired_spikes.append((end_spike[0], start_spike[0], abs(start_spike[0] - end_spike[0]).days))
+            paired_spikes.append((end_spike[0], start_spike[0], delay))
 
     # Create Plotly figure
     fig = go.Figure()
@@ -112,7 +78,7 @@ def generate_time_delay_graph(spotify_id, tiktok_id):
         )
         fig.add_trace(go.Scatter(
             x=[s_time, t_time],
-            y=[spotify_normalized.loc[spotify_dates == s_time].values[0], tiktok_normalized.loc[tiktok_dates == t_time].values[0]],
+            y=[analysis.value_at('spotify', s_time), analysis.value_at('tiktok', t_time)],
             mode='markers',
             marker=dict(color=['blue', 'red'], size=10),
             name='Critical Points'
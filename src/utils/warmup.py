@@ -0,0 +1,90 @@
+#%%
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+class Warmup:
+    """
+    Fills caches in the background by calling warm(key) for every key on a thread pool.
+    Once memory_used() reaches memory_budget bytes the remaining keys are skipped, so a
+    warm-up never evicts what it already cached. status() reports progress for a
+    readiness check.
+    """
+
+    def __init__(self, keys, warm, workers: int = 4, memory_budget: int = None, memory_used=None):
+        self.keys = list(keys)
+        self.warm = warm
+        self.workers = workers
+        self.memory_budget = memory_budget
+        self.memory_used = memory_used
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._executor = None
+        self.started = None
+        self.finished = None
+        self.warmed = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def _over_budget(self):
+        return self.memory_budget is not None and self.memory_used is not None and self.memory_used() >= self.memory_budget
+
+    def _run(self, key):
+        if self._over_budget():
+            outcome = 'skipped'
+        else:
+            try:
+                self.warm(key)
+                outcome = 'warmed'
+            except Exception as e:
+                print(f"Warm-up failed for {key}: {e}")
+                outcome = 'failed'
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+            if self.warmed + self.skipped + self.failed == len(self.keys):
+                self.finished = time.monotonic()
+                self._done.set()
+
+    def start(self):
+        """Starts warming in the background and returns immediately."""
+        self.started = time.monotonic()
+        if not self.keys:
+            self.finished = self.started
+            self._done.set()
+            return self
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='warmup')
+        for key in self.keys:
+            self._executor.submit(self._run, key)
+        # Let the workers exit once the queue drains without blocking the caller
+        self._executor.shutdown(wait=False)
+        return self
+
+    def wait(self, timeout: float = None):
+        """
+        Blocks until every key was processed and the pool's threads have exited, so it is
+        safe to fork afterwards. Returns False if the timeout ran out first.
+        """
+        if not self._done.wait(timeout):
+            return False
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        return True
+
+    @property
+    def ready(self):
+        return self.finished is not None
+
+    def status(self):
+        with self._lock:
+            done = self.warmed + self.skipped + self.failed
+            end = self.finished if self.finished is not None else time.monotonic()
+            return {
+                'ready': self.finished is not None,
+                'total': len(self.keys),
+                'done': done,
+                'warmed': self.warmed,
+                'skipped': self.skipped,
+                'failed': self.failed,
+                'seconds': round(end - self.started, 3) if self.started is not None else None,
+            }
+# %%
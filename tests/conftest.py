@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+# The modules import each other as utils.*, so src/ goes on the path as when running from it.
+# The root holds save_graphs.py
+sys.path[:0] = [os.path.join(ROOT, 'src'), ROOT]
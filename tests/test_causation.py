@@ -0,0 +1,51 @@
+import numpy as np
+from utils.causation import SPOTIFY, TIKTOK, pair_spikes_batch, pair_spikes_windows
+
+def reference_pairs(spotify, tiktok, window):
+    # The walk pair_spikes_batch documents, one spike at a time
+    spikes = sorted(
+        [(group, start, end, SPOTIFY, i) for i, (group, start, end) in enumerate(zip(*spotify))]
+        + [(group, start, end, TIKTOK, i) for i, (group, start, end) in enumerate(zip(*tiktok))]
+    )
+    pairs, used = [], set()
+    for first, second in zip(spikes, spikes[1:]):
+        group, start, end, platform, index = first
+        if second[0] != group or second[3] == platform or second[1] > end + window:
+            continue
+        if (group, start) in used or (group, second[1]) in used:
+            continue
+        used.update(((group, start), (group, second[1])))
+        spotify_index, tiktok_index = (index, second[4]) if platform == SPOTIFY else (second[4], index)
+        pairs.append((group, platform, spotify_index, tiktok_index))
+    return pairs
+
+def random_spikes(rng, groups: int = 4, days: int = 40):
+    # Sorted (groups, starts, ends) with distinct starts per group, as merged spike windows are
+    n = int(rng.integers(0, 30))
+    group, start = rng.integers(0, groups, n), rng.integers(0, days, n)
+    keys = np.unique(group * days + start)
+    group, start = keys // days, keys % days
+    return group, start, start + rng.integers(0, 4, len(keys))
+
+def test_batch_pairs_match_the_greedy_walk():
+    rng = np.random.default_rng(0)
+    for _ in range(3000):
+        spotify, tiktok = random_spikes(rng), random_spikes(rng)
+        window = int(rng.integers(0, 10))
+        groups, leads, spotify_index, tiktok_index = pair_spikes_batch(*spotify, *tiktok, window)
+        pairs = list(zip(groups.tolist(), leads.tolist(), spotify_index.tolist(), tiktok_index.tolist()))
+        assert pairs == reference_pairs(spotify, tiktok, window)
+
+def test_window_pairs_match_one_window_at_a_time():
+    rng = np.random.default_rng(1)
+    windows = [0, 3, 7, 20]
+    for _ in range(500):
+        spotify, tiktok = random_spikes(rng), random_spikes(rng)
+        window_index, *pairs = pair_spikes_windows(*spotify, *tiktok, windows)
+        for i, window in enumerate(windows):
+            for got, expected in zip(pairs, pair_spikes_batch(*spotify, *tiktok, window)):
+                assert np.array_equal(got[window_index == i], expected)
+
+def test_no_windows_give_no_pairs():
+    spotify = tiktok = (np.array([0]), np.array([5]), np.array([6]))
+    assert all(len(result) == 0 for result in pair_spikes_windows(*spotify, *tiktok, []))
@@ -0,0 +1,132 @@
+import os
+import time
+import asyncio
+import pytest
+import save_graphs
+import utils.series_store as series_store
+from utils.fake_songstats import FakeSongstats
+from utils.songstats_crawler import CrawlJournal, SongstatsCrawler, fetch_all
+
+BUNDLED_DIR = series_store.DATA_DIR
+CODES = ['o6czgimx', 'n5i60mse']
+SOURCES = ['spotify', 'tiktok']
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    # The crawl writes its CSVs here instead of into the bundled datasets it is served from
+    monkeypatch.setattr(series_store, 'DATA_DIR', str(tmp_path))
+    monkeypatch.setattr(series_store, 'STORE_DIR', str(tmp_path / 'series_store'))
+    return tmp_path
+
+def run_crawl(server, journal, incremental=False, codes=CODES):
+    return asyncio.run(save_graphs.crawl(codes, journal, incremental, base_url=server.base_url, backoff=0))
+
+def test_failed_requests_are_retried():
+    units = [(code, source) for code in CODES for source in SOURCES]
+    with FakeSongstats(failure_rate=0.5, seed=1, data_dir=BUNDLED_DIR) as server:
+        payloads = fetch_all(units, base_url=server.base_url, retries=20, backoff=0)
+    assert all(payloads[unit]['result'] == 'success' for unit in units)
+    assert sum(server.request_counts.values()) > len(units)
+
+def test_rate_limited_requests_wait_for_retry_after():
+    units = [(code, source) for code in CODES for source in SOURCES]
+    with FakeSongstats(rate_limit=1, data_dir=BUNDLED_DIR) as server:
+        start = time.monotonic()
+        payloads = fetch_all(units, base_url=server.base_url, rate_per_host=100, backoff=0)
+        elapsed = time.monotonic() - start
+    assert all(payloads[unit]['result'] == 'success' for unit in units)
+    assert server.status_counts[429] > 0
+    # Retry-After: 1 pushes the host's next slot back, so the units can't all finish in a second
+    assert elapsed >= 1
+
+def test_malformed_bodies_are_retried_then_failed():
+    units = [(code, source) for code in CODES for source in SOURCES]
+    with FakeSongstats(malformed_rate=0.5, seed=2, data_dir=BUNDLED_DIR) as server:
+        payloads = fetch_all(units, base_url=server.base_url, retries=20, backoff=0)
+    assert all(payloads[unit]['result'] == 'success' for unit in units)
+
+    # Every body cut short: the crawl still finishes, with each unit counted as failed
+    async def crawl_all(server):
+        crawler = SongstatsCrawler(base_url=server.base_url, retries=2, backoff=0)
+        results = [result async for result in crawler.crawl(units)]
+        return crawler, results
+    with FakeSongstats(malformed_rate=1.0, data_dir=BUNDLED_DIR) as server:
+        crawler, results = asyncio.run(crawl_all(server))
+    assert len(results) == len(units) and all(payload is None for _, _, payload in results)
+    assert crawler.failed == len(units) and crawler.failed_units == set(units)
+    assert sum(server.request_counts.values()) == 3 * len(units)
+
+def test_crawl_resumes_from_the_journal(data_dir):
+    journal = CrawlJournal(str(data_dir / 'journal.jsonl'))
+    journal.record(CODES[0], 'spotify', changed=[])
+    with FakeSongstats(data_dir=BUNDLED_DIR) as server:
+        crawler = run_crawl(server, journal)
+    journal.close()
+
+    # The unit already in the journal isn't fetched again; every other one is, once
+    assert (CODES[0], 'spotify') not in server.request_counts
+    assert sum(server.request_counts.values()) == len(CODES) * len(SOURCES) - 1 == crawler.requests_sent
+    assert len(CrawlJournal(journal.path)) == len(CODES) * len(SOURCES)
+    assert os.path.exists(series_store.dataset_path('tiktok', CODES[0]))
+
+def test_incremental_crawl_appends_only_new_points(data_dir):
+    platform = 'tiktok'
+    track_name, timestamps, values, artist_name, avatar = series_store.read_series_csv(
+        series_store.dataset_path(platform, CODES[0], BUNDLED_DIR))
+    csv_path = series_store.dataset_path(platform, CODES[0])
+    series_store.write_series_csv(csv_path, track_name, list(zip(timestamps[:-5].tolist(), values[:-5].tolist())),
+                                  artist_name, avatar)
+
+    journal = CrawlJournal(str(data_dir / 'journal.jsonl'))
+    with FakeSongstats(data_dir=BUNDLED_DIR) as server:
+        run_crawl(server, journal, incremental=True, codes=CODES[:1])
+    journal.close()
+
+    assert series_store.read_series_csv(csv_path)[1].tolist() == timestamps.tolist()
+    changed = {unit: entry['changed'] for unit, entry in CrawlJournal(journal.path).entries.items()}
+    assert platform in changed[(CODES[0], 'tiktok')]
+
+    # A second pass has nothing new to append
+    journal = CrawlJournal(str(data_dir / 'again.jsonl'))
+    with FakeSongstats(data_dir=BUNDLED_DIR) as server:
+        run_crawl(server, journal, incremental=True, codes=CODES[:1])
+    journal.close()
+    assert platform not in journal.entries[(CODES[0], 'tiktok')]['changed']
+
+def test_incremental_crawl_appends_to_the_store(data_dir):
+    platform = 'tiktok'
+    track_name, timestamps, values, artist_name, avatar = series_store.read_series_csv(
+        series_store.dataset_path(platform, CODES[0], BUNDLED_DIR))
+    series_store.write_series_csv(series_store.dataset_path(platform, CODES[0]), track_name,
+                                  list(zip(timestamps[:-5].tolist(), values[:-5].tolist())), artist_name, avatar)
+    series_store.build_series_store(platform)
+    packed = series_store.file_signature(series_store.store_path(platform))
+
+    journal = CrawlJournal(str(data_dir / 'journal.jsonl'))
+    with FakeSongstats(data_dir=BUNDLED_DIR) as server:
+        run_crawl(server, journal, incremental=True, codes=CODES[:1])
+    journal.close()
+    # Only the new points are journaled, and they are appended without repacking the store
+    assert len(journal.entries[(CODES[0], 'tiktok')]['written'][platform][1]) == 5
+    save_graphs.update_stores(journal)
+
+    assert series_store.file_signature(series_store.store_path(platform)) == packed
+    stored = series_store.SeriesStore(platform).series(CODES[0])
+    assert stored[0].tolist() == timestamps.tolist() and stored[1].tolist() == values.tolist()
+
+def test_full_refresh_replaces_the_stored_series(data_dir):
+    platform = 'tiktok'
+    track_name, timestamps, values, artist_name, avatar = series_store.read_series_csv(
+        series_store.dataset_path(platform, CODES[0], BUNDLED_DIR))
+    # A stale store entry, with points the refresh no longer has
+    series_store.write_series_store(platform, {CODES[0]: (track_name, timestamps - 10**9, values * 2, artist_name, avatar)})
+
+    journal = CrawlJournal(str(data_dir / 'journal.jsonl'))
+    with FakeSongstats(data_dir=BUNDLED_DIR) as server:
+        run_crawl(server, journal, codes=CODES[:1])
+    journal.close()
+    save_graphs.update_stores(journal)
+
+    csv = series_store.read_series_csv(series_store.dataset_path(platform, CODES[0]))
+    stored = series_store.SeriesStore(platform).series(CODES[0])
+    assert stored[0].tolist() == csv[1].tolist() and stored[1].tolist() == csv[2].tolist()
@@ -0,0 +1,68 @@
+import numpy as np
+from utils.rolling import IndexableSkiplist, RollingMedian
+from utils.spikes import batch_robust_thresholds, rolling_robust_thresholds
+
+def test_skiplist_matches_sorted_list():
+    rng = np.random.default_rng(0)
+    skiplist, reference = IndexableSkiplist(50), []
+    for value in rng.integers(0, 20, 2000).astype(float):
+        if reference and rng.random() < 0.4:
+            removed = reference.pop(rng.integers(len(reference)))
+            skiplist.remove(removed)
+        else:
+            skiplist.insert(value)
+            reference.append(value)
+        assert [skiplist[i] for i in range(len(skiplist))] == sorted(reference)
+        assert np.allclose([skiplist.prefix_sum(i) for i in range(len(skiplist) + 1)],
+                           np.concatenate(([0.0], np.cumsum(sorted(reference)))))
+
+def test_median_and_mad_match_numpy():
+    # 200 random windows, half of them drawn from few distinct values so ties are common
+    rng = np.random.default_rng(1)
+    for case in range(200):
+        window = int(rng.integers(1, 40))
+        if case % 2:
+            values = rng.integers(0, 5, window + 30).astype(float)
+        else:
+            values = rng.normal(size=window + 30)
+        rolling = RollingMedian(window)
+        for end, value in enumerate(values, 1):
+            rolling.push(value)
+            current = values[max(0, end - window):end]
+            median = np.median(current)
+            assert rolling.median() == median
+            assert rolling.mad() == np.median(np.abs(current - median))
+            assert np.isclose(rolling.mean_absolute_deviation(), np.mean(np.abs(current - median)))
+
+def test_empty_window_is_nan():
+    rolling = RollingMedian(5)
+    assert np.isnan(rolling.median()) and np.isnan(rolling.mad())
+
+def stale_series(rng, n: int):
+    # Zero-filled and repeated stretches, as stale days leave them, so the MAD is often 0
+    changes = rng.normal(size=n) * (rng.random(n) < 0.3)
+    changes[rng.random(n) < 0.1] = 0.25
+    return changes
+
+def test_mean_absolute_deviation_matches_numpy_where_the_mad_is_zero():
+    rng = np.random.default_rng(2)
+    zero_mad = 0
+    for case in range(200):
+        window = int(rng.integers(2, 40))
+        values = stale_series(rng, window + 60)
+        rolling = RollingMedian(window)
+        for end, value in enumerate(values, 1):
+            rolling.push(value)
+            current = values[max(0, end - window):end]
+            median = np.median(current)
+            zero_mad += rolling.mad(median) == 0
+            assert np.isclose(rolling.mean_absolute_deviation(median), np.mean(np.abs(current - median)), atol=1e-12)
+    assert zero_mad > 1000
+
+def test_rolling_thresholds_match_the_batch_path():
+    rng = np.random.default_rng(3)
+    for case in range(50):
+        window = int(rng.integers(2, 40))
+        changes = stale_series(rng, 300)
+        batch = batch_robust_thresholds(changes[None], np.ones((1, len(changes)), dtype=bool), window)[0]
+        assert np.allclose(rolling_robust_thresholds(changes, window), batch, equal_nan=True, atol=1e-12)
@@ -0,0 +1,95 @@
+import os
+import numpy as np
+import pytest
+import utils.series_store as series_store
+from utils.series_store import (SeriesStore, append_series_store, compact_series_store, file_signature,
+                                open_series_store, store_path, write_series_store)
+
+PLATFORM = 'tiktok'
+
+@pytest.fixture(autouse=True)
+def store_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(series_store, 'STORE_DIR', str(tmp_path))
+    return tmp_path
+
+def random_record(rng, code, start_day=0, days=None):
+    days = int(rng.integers(0, 30)) if days is None else days
+    timestamps = (start_day + np.cumsum(rng.integers(1, 3, days))) * series_store.MS_PER_DAY
+    return f"track {code}", timestamps.astype(np.int64), rng.normal(size=days), f"artist {code}", f"avatar {code}"
+
+def apply(reference, appends, replace=False):
+    # What append_series_store documents, on plain arrays
+    for code, (track_name, timestamps, values, artist_name, avatar) in appends.items():
+        if not len(timestamps):
+            continue
+        if code in reference and not replace:
+            keep = np.searchsorted(reference[code][1], timestamps[0])
+            timestamps = np.concatenate((reference[code][1][:keep], timestamps))
+            values = np.concatenate((reference[code][2][:keep], values))
+        reference[code] = (track_name, timestamps, values, artist_name, avatar)
+
+def assert_store_matches(reference):
+    store = SeriesStore(PLATFORM)
+    assert sorted(store.codes) == sorted(reference)
+    for code, (track_name, timestamps, values, artist_name, avatar) in reference.items():
+        stored = store.record(code)
+        assert stored[0] == track_name and stored[3:] == (artist_name, avatar)
+        assert np.array_equal(stored[1], timestamps) and np.array_equal(stored[2], values)
+    return store
+
+def test_appends_match_a_rebuild(monkeypatch):
+    rng = np.random.default_rng(0)
+    reference = {f"song{i}": random_record(rng, f"song{i}") for i in range(20)}
+    write_series_store(PLATFORM, reference)
+    for round in range(30):
+        # Compact now and then; otherwise let the tail grow
+        monkeypatch.setattr(series_store, 'COMPACT_RATIO', 0.05 if round % 10 == 9 else 100.0)
+        before = SeriesStore(PLATFORM)
+        versions = {code: before.version(code) for code in before.codes}
+        codes = rng.choice(24, int(rng.integers(1, 8)), replace=False)
+        appends = {}
+        for i in codes:
+            code = f"song{i}"
+            last_day = reference[code][1][-1] // series_store.MS_PER_DAY if code in reference and len(reference[code][1]) else 0
+            # Some appends overlap the stored points, as a re-run after a crash does
+            appends[code] = random_record(rng, code, int(last_day) - int(rng.integers(0, 4)), int(rng.integers(0, 5)))
+        replace = round % 7 == 3
+        append_series_store(PLATFORM, appends, replace=replace)
+        apply(reference, appends, replace)
+
+        after = assert_store_matches(reference)
+        changed = {code for code, record in appends.items() if len(record[1])}
+        for code in after.codes:
+            if code in versions and code not in changed:
+                assert after.version(code) == versions[code]
+            elif code in versions:
+                assert after.version(code) != versions[code]
+
+def test_append_leaves_the_packed_file_alone():
+    rng = np.random.default_rng(1)
+    reference = {f"song{i}": random_record(rng, f"song{i}", days=50) for i in range(10)}
+    write_series_store(PLATFORM, reference)
+    packed = file_signature(store_path(PLATFORM))
+    store = open_series_store(PLATFORM)
+
+    appends = {'song3': random_record(rng, 'song3', 200, 1), 'new': random_record(rng, 'new', 0, 3)}
+    assert append_series_store(PLATFORM, appends) == 2
+    apply(reference, appends)
+    assert file_signature(store_path(PLATFORM)) == packed
+    # Readers pick the tail up
+    assert open_series_store(PLATFORM) is not store
+    assert_store_matches(reference)
+
+def test_compaction_keeps_points_and_versions():
+    rng = np.random.default_rng(2)
+    reference = {f"song{i}": random_record(rng, f"song{i}", days=40) for i in range(10)}
+    write_series_store(PLATFORM, reference)
+    appends = {'song1': random_record(rng, 'song1', 100, 2)}
+    append_series_store(PLATFORM, appends)
+    apply(reference, appends)
+    version = SeriesStore(PLATFORM).version('song1')
+
+    compact_series_store(PLATFORM)
+    store = assert_store_matches(reference)
+    assert not store.has_tail and store.version('song1') == version
+    assert not any(os.path.exists(path) for path in series_store.tail_paths(PLATFORM))